@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    The benchmarks run offline, without the local `constants` module (ROOT) that a real install provides.
+    When it is absent, ROOT is a temporary directory for the run: a `constants.py` is written there and put on
+    sys.path and PYTHONPATH, so commands the benchmarks start in fresh interpreters (benchmarks.startup) find it.
+"""
+
+import importlib.util
+import tempfile
+import atexit
+import shutil
+import sys
+import os
+
+
+if 'constants' not in sys.modules and importlib.util.find_spec('constants') is None:
+    ROOT = tempfile.mkdtemp(prefix='benchmark-root-')
+    atexit.register(shutil.rmtree, ROOT, ignore_errors=True)
+    with open(os.path.join(ROOT, 'constants.py'), 'w') as f:
+        f.write(f'ROOT = {ROOT!r}\n')
+
+    sys.path.insert(0, ROOT)
+    os.environ['PYTHONPATH'] = os.pathsep.join(p for p in [ROOT, os.environ.get('PYTHONPATH')] if p)
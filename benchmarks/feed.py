@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from benchmarks import synthetic
+import threading
+import hashlib
+import base64
+import socket
+import struct
+import json
+import time
+
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class StandInFeed:
+    """
+    Local stand-in for Finnhub's trade websocket (wss://ws.finnhub.io)
+    ---> accepts {'type': 'subscribe' | 'unsubscribe', 'symbol': ...} and sends {'type': 'trade', 'data': [...]}
+    ---> every `interval` seconds each subscription gets `trades_per_tick` trades at benchmarks.synthetic prices
+    ---> the feed's clock runs `speed` times faster than real time, so minute bars fill in seconds
+    ---> `publish` sends exact trades (for tests); `drop` closes every connection (to exercise reconnects)
+
+    :param interval: seconds between ticks (None: only `publish` sends trades)
+    :param trades_per_tick
+    :param speed
+    :param ping_every: ticks between pings
+    :param port
+    """
+
+    def __init__(self, interval=0.05, trades_per_tick=1, speed=60.0, ping_every=100, port=0):
+        self.interval = interval
+        self.trades_per_tick = trades_per_tick
+        self.speed = speed
+        self.ping_every = ping_every
+        self.sent = 0
+        self.connections = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start = time.time()
+
+        feed = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                feed._serve(self)
+
+        ThreadingTCPServer.allow_reuse_address = True
+        self.server = ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.threads = []
+
+    @property
+    def url(self):
+        return f'ws://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.server.serve_forever, daemon=True)]
+        if self.interval is not None:
+            self.threads.append(threading.Thread(target=self._tick, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.drop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def now(self):
+        """
+        The feed's (accelerated) clock in unix seconds
+
+        :return:
+        """
+
+        return self._start + (time.time() - self._start) * self.speed
+
+    def publish(self, symbol, price, volume=1.0, t=None):
+        """
+        Send one trade to every subscriber of `symbol`
+
+        :param symbol
+        :param price
+        :param volume
+        :param t: unix seconds (the feed's clock if None)
+        :return:
+        """
+
+        t = t if t is not None else self.now()
+        self._broadcast({symbol: [{'s': symbol, 'p': price, 't': int(t * 1000), 'v': volume, 'c': None}]})
+
+    def drop(self):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # ----------------- SERVER -----------------
+    def _serve(self, handler):
+        request = handler.rfile.readline().decode()
+        headers = {}
+        for line in iter(handler.rfile.readline, b'\r\n'):
+            if line == b'':
+                return
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'token=' not in request or 'sec-websocket-key' not in headers:
+            handler.wfile.write(b'HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\n\r\n')
+            return
+
+        handler.wfile.write((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f"Sec-WebSocket-Accept: {accept_key(headers['sec-websocket-key'])}\r\n\r\n"
+        ).encode())
+
+        with self._lock:
+            self._clients[handler] = {'symbols': set(), 'lock': threading.Lock()}
+            self.connections += 1
+        try:
+            while not self._stop.is_set():
+                _, opcode, payload = read_frame(handler.rfile)
+                if opcode == OP_CLOSE:
+                    break
+                if opcode == OP_PING:
+                    self._send(handler, OP_PONG, payload)
+                if opcode != OP_TEXT:
+                    continue
+
+                message = json.loads(payload)
+                with self._lock:
+                    symbols = self._clients[handler]['symbols']
+                    if message.get('type') == 'subscribe':
+                        symbols.add(message['symbol'])
+                    elif message.get('type') == 'unsubscribe':
+                        symbols.discard(message['symbol'])
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.pop(handler, None)
+
+    def _tick(self):
+        ticks = 0
+        while not self._stop.wait(self.interval):
+            ticks += 1
+            with self._lock:
+                symbols = set().union(*[c['symbols'] for c in self._clients.values()])
+
+            now = self.now()
+            self._broadcast({
+                symbol: [
+                    {
+                        's': symbol,
+                        'p': synthetic.price(symbol, now + i),
+                        't': int((now + i) * 1000),
+                        'v': float(synthetic.seed(symbol, now, i) % 100),
+                        'c': None
+                    }
+                    for i in range(self.trades_per_tick)
+                ]
+                for symbol in symbols
+            })
+
+            if self.ping_every and ticks % self.ping_every == 0:
+                with self._lock:
+                    clients = list(self._clients)
+                for client in clients:
+                    self._send(client, OP_PING, b'')
+
+    def _broadcast(self, trades):
+        with self._lock:
+            clients = [(client, set(state['symbols'])) for client, state in self._clients.items()]
+
+        for client, symbols in clients:
+            data = [trade for symbol in symbols for trade in trades.get(symbol, [])]
+            if len(data) > 0:
+                self._send(client, OP_TEXT, json.dumps({'type': 'trade', 'data': data}).encode())
+                with self._lock:
+                    self.sent += len(data)
+
+    def _send(self, client, opcode, payload):
+        state = self._clients.get(client)
+        if state is None:
+            return
+        try:
+            with state['lock']:
+                client.wfile.write(frame(opcode, payload))
+        except (OSError, ValueError):
+            pass
+
+
+# ----------------- WEBSOCKET FRAMES (server side) -----------------
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def frame(opcode, payload):
+    """
+    One final, unmasked frame (servers do not mask)
+
+    :param opcode
+    :param payload
+    :return:
+    """
+
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+def read_frame(rfile):
+    """
+    Read one (client, so masked) frame from a buffered binary stream
+
+    :param rfile
+    :return: fin, opcode, unmasked payload
+    """
+
+    head = _read_exact(rfile, 2)
+    fin, opcode = head[0] & 0x80, head[0] & 0x0F
+    masked, n = head[1] & 0x80, head[1] & 0x7F
+    if n == 126:
+        n = struct.unpack('!H', _read_exact(rfile, 2))[0]
+    elif n == 127:
+        n = struct.unpack('!Q', _read_exact(rfile, 8))[0]
+
+    mask = _read_exact(rfile, 4) if masked else None
+    payload = _read_exact(rfile, n)
+    if mask is None:
+        return bool(fin), opcode, payload
+
+    # XOR with the repeated 4-byte key, done as one big integer rather than byte by byte
+    key = (mask * (n // 4 + 1))[:n]
+    return bool(fin), opcode, (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+def _read_exact(rfile, n):
+    data = rfile.read(n)
+    if len(data) < n:
+        raise ConnectionError('WebSocket connection closed')
+    return data
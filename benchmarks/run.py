@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Offline benchmarks of the report pipeline against a local stand-in server.
+
+        python -m benchmarks.run                          # all stages, results appended to benchmarks/results.jsonl
+        python -m benchmarks.run --latency 0.05 --calls-per-minute 300
+        python -m benchmarks.run --baseline 1a2b3c4       # exit 1 if a stage is >20% slower than that commit
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.server import StandInServer
+from benchmarks.standin import StandInClient
+from quote_provider import get_provider
+from benchmarks import synthetic
+from datetime import datetime
+import candle_store
+import subprocess
+import statistics
+import argparse
+import tempfile
+import finnhub
+import shutil
+import json
+import time
+import sys
+import os
+
+
+KEY = 'benchmark'
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+
+
+# ----------------- STAGES -----------------
+def stage_holdings(client):
+    from robinhood import load_portfolio
+
+    return lambda: load_portfolio(client)
+
+
+def stage_replay(client):
+    from replay import replay
+
+    transactions = synthetic.transactions()
+    return lambda: replay(transactions)
+
+
+def stage_candles(client):
+    symbols = synthetic.STOCKS + synthetic.ETFS
+    cold = {'dir': None}
+
+    def run():
+        # Fresh store per repeat, then a second pass that should be served from disk
+        if cold['dir'] is not None:
+            shutil.rmtree(cold['dir'], ignore_errors=True)
+        cold['dir'] = tempfile.mkdtemp(prefix='candles-')
+        candle_store._store = candle_store.CandleStore(cold['dir'])
+        for symbol in symbols:
+            finnhub.candles(KEY, symbol, years=3)
+        for symbol in symbols:
+            finnhub.candles(KEY, symbol, years=3)
+
+    return run
+
+
+def stage_news(client):
+    from robinhood import portfolio_news
+
+    return lambda: portfolio_news(client, synthetic.STOCKS)
+
+
+def stage_assembly(client):
+    from robinhood import news_html, fetch_news, get_quotes_by_ids
+    from charts import tile_data, tiles_script
+    import pandas as pd
+
+    news = pd.concat([fetch_news(client, t) for t in synthetic.STOCKS]).drop_duplicates(subset='url')
+    quotes = get_quotes_by_ids(client, [i for ids in news.related_instruments for i in ids])
+    now = int(time.time())
+    bars = {
+        s: synthetic.candle_response(s, now - 5 * 86400, now, '1', crypto=True) for s in synthetic.STOCKS
+    }
+
+    # ---> returns the markup, so its size is recorded with the timings
+    def run():
+        tiles = tiles_script([
+            tile_data(i, b['t'][-480:], b['c'][-480:], 'darkgreen') for i, b in enumerate(bars.values())
+        ])
+        return tiles + news_html(news, quotes)
+
+    return run
+
+
+def stage_quotes(client):
+    symbols = synthetic.STOCKS + synthetic.ETFS
+    ids = [synthetic.instrument_id(s) for s in symbols]
+    provider = get_provider(KEY, client)
+
+    # ---> the report's quote paths asking for the same symbols at once: BigNumbers and the ticker toggle,
+    #      related-instrument quotes by id, and the crypto marks (one request per symbol when coalesced)
+    def run():
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            jobs = [pool.submit(finnhub.quotes, KEY, symbols) for _ in range(2)] + [
+                pool.submit(provider.quotes_by_ids, ids),
+                pool.submit(provider.quotes, synthetic.CRYPTO, 'crypto')
+            ]
+            for job in jobs:
+                job.result()
+
+    return run
+
+
+STAGES = {
+    'holdings': stage_holdings,
+    'replay': stage_replay,
+    'candles': stage_candles,
+    'news': stage_news,
+    'assembly': stage_assembly,
+    'quotes': stage_quotes
+}
+
+
+# ----------------- RUNNER -----------------
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def measure(server, setup, client, repeats):
+    """
+    Time `repeats` runs of a stage, counting the stand-in requests each one makes
+    ---> a stage that returns markup also records its size in bytes
+
+    :param server
+    :param setup
+    :param client
+    :param repeats
+    :return:
+    """
+
+    run = setup(client)
+    seconds = []
+    server.reset()
+    for _ in range(repeats):
+        # ---> every repeat starts without memoised quotes, so it measures requests rather than the memo
+        get_provider().clear()
+        start = time.perf_counter()
+        output = run()
+        seconds.append(time.perf_counter() - start)
+
+    stats = {
+        'median': round(statistics.median(seconds), 6),
+        'min': round(min(seconds), 6),
+        'requests': sum(server.hits.values()) / repeats,
+        'throttled': server.throttled / repeats
+    }
+    if isinstance(output, str):
+        stats['bytes'] = len(output.encode())
+    return stats
+
+
+def compare(results, baseline, threshold):
+    """
+    Stages slower than the latest recorded run of `baseline` by more than `threshold`
+
+    :param results
+    :param baseline
+    :param threshold
+    :return:
+    """
+
+    previous = None
+    if os.path.exists(RESULTS):
+        with open(RESULTS) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['commit'] == baseline:
+                    previous = entry
+    if previous is None:
+        print(f'No recorded results for {baseline}')
+        return []
+
+    regressions = []
+    for stage, stats in results['stages'].items():
+        before = previous['stages'].get(stage)
+        if before is not None and stats['median'] > before['median'] * (1 + threshold):
+            regressions.append([stage, before['median'], stats['median']])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline report pipeline benchmarks')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help='stand-in latency per request (s)')
+    parser.add_argument('--calls-per-minute', type=int, default=None, help='stand-in rate limit')
+    parser.add_argument('--client-calls-per-minute', type=int, default=100000, help='FinnhubClient quota')
+    parser.add_argument('--baseline', default=None, help='commit to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    with StandInServer(latency=args.latency, calls_per_minute=args.calls_per_minute) as server:
+        finnhub._clients[KEY] = finnhub.FinnhubClient(
+            KEY,
+            calls_per_minute=args.client_calls_per_minute,
+            base_url=server.finnhub_url,
+            backoff=0.1
+        )
+        client = StandInClient(server.url)
+
+        results = {
+            'commit': commit(),
+            'time': str(datetime.today()),
+            'config': {
+                'repeats': args.repeats,
+                'latency': args.latency,
+                'calls_per_minute': args.calls_per_minute
+            },
+            'stages': {}
+        }
+        for stage in args.stages:
+            results['stages'][stage] = measure(server, STAGES[stage], client, args.repeats)
+            stats = results['stages'][stage]
+            print(f"{stage:>10}  median {stats['median']:.4f}s  min {stats['min']:.4f}s  "
+                  f"requests {stats['requests']:.0f}  throttled {stats['throttled']:.0f}"
+                  + (f"  {stats['bytes'] / 1024:,.0f} KB" if 'bytes' in stats else ''))
+
+    regressions = []
+    if args.baseline is not None:
+        regressions = compare(results, args.baseline, args.threshold)
+        for stage, before, after in regressions:
+            print(f'REGRESSION {stage}: {before:.4f}s -> {after:.4f}s')
+
+    if not args.no_save:
+        with open(RESULTS, 'a+') as f:
+            f.write(json.dumps(results) + '\n')
+
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Time and peak memory of each pipeline stage versus portfolio size.
+
+        python -m benchmarks.scaling                                  # default size ladder
+        python -m benchmarks.scaling --sizes 100x3x10000 1000x10x100000 --output scaling.json
+
+    A size is HOLDINGSxYEARSxTRADES.
+"""
+
+from types import SimpleNamespace
+from benchmarks import synthetic
+from replay import replay, replay_loop
+from snapshots import valuation
+from panel import PricePanel
+import pandas as pd
+import tracemalloc
+import argparse
+import datetime
+import json
+import time
+
+
+DEFAULT_SIZES = ['10x1x1000', '100x3x10000', '300x5x30000', '1000x10x100000']
+
+
+# ----------------- STAGE INPUTS -----------------
+def client_for(account):
+    """
+    In-process stand-in for robin_stocks serving a generated account (no HTTP, so only our code is timed)
+
+    :param account
+    :return:
+    """
+
+    return SimpleNamespace(
+        account=SimpleNamespace(
+            build_holdings=lambda: account['holdings'],
+            get_bank_transfers=lambda: account['bank_transfers'],
+            get_referrals=lambda: account['referrals']
+        ),
+        crypto=SimpleNamespace(
+            get_crypto_positions=lambda: account['crypto_positions']
+        ),
+        profiles=SimpleNamespace(
+            load_portfolio_profile=lambda: account['profile']
+        )
+    )
+
+
+def prepare_transactions(account):
+    """
+    Same cleaning reverse_engineer applies: exports + referrals + bank transfers, dated and sorted
+
+    :param account
+    :return:
+    """
+
+    trades = pd.concat([account['stock_orders'], account['crypto_orders']])
+
+    referral_stock = pd.DataFrame([
+        [s[2], s[10], '', 'buy', 0.0, s[3], s[4]]
+        for r in account['referrals'] for s in pd.DataFrame(r['reward']['stocks']).values
+    ])
+    referral_cash = pd.DataFrame([
+        ['Cash', s[10], '', 'deposit', 0.0, 1.0, s[4]]
+        for r in account['referrals'] for s in pd.DataFrame(r['reward']['cash']).values
+    ])
+    referrals = pd.concat([referral_stock, referral_cash])
+    referrals.columns = trades.columns
+
+    transfers = pd.DataFrame(account['bank_transfers']).apply(
+        lambda x: pd.Series(['Cash', x.iloc[15], None, x.iloc[7], x.iloc[9], 1, x.iloc[6]]),
+        axis=1
+    )
+    transfers.columns = trades.columns
+
+    transactions = pd.concat([trades, referrals, transfers])
+    transactions['date'] = pd.to_datetime(
+        pd.Series(transactions['date'].str[:10]),
+        format='%Y-%m-%d'
+    ).dt.date
+    transactions = transactions.sort_values(by='date').reset_index(drop=True)
+    for column in ['fees', 'quantity', 'average_price']:
+        transactions[column] = transactions[column].astype(float)
+
+    return transactions
+
+
+def candle_series(account):
+    f = int(time.mktime(account['start'].timetuple()))
+    t = int(time.mktime(account['end'].timetuple()))
+    return [
+        synthetic.candle_response(symbol, f, t, 'D') for symbol in account['equities']
+    ]
+
+
+# ----------------- STAGES -----------------
+def stage_holdings(account, state):
+    from robinhood import load_portfolio
+
+    client = client_for(account)
+    return lambda: load_portfolio(client)
+
+
+def stage_transactions(account, state):
+    def run():
+        state['transactions'] = prepare_transactions(account)
+
+    return run
+
+
+def stage_replay(account, state):
+    transactions = state.get('transactions')
+    if transactions is None:
+        transactions = state['transactions'] = prepare_transactions(account)
+
+    def run():
+        state['weights'] = replay(transactions, account['start'], account['end'])
+
+    return run
+
+
+def stage_replay_loop(account, state):
+    transactions = state.get('transactions')
+    if transactions is None:
+        transactions = state['transactions'] = prepare_transactions(account)
+
+    return lambda: replay_loop(transactions, transactions.iloc[0]['date'], account['end'])
+
+
+def stage_price_panel(account, state):
+    # The date-keyed panel historical_prices builds from per-symbol candle responses
+    responses = candle_series(account)
+    symbols = account['equities']
+
+    def run():
+        panel = PricePanel.from_candles({
+            symbol: pd.DataFrame(r) for symbol, r in zip(symbols, responses)
+        })
+        state['prices'] = panel.frame()
+
+    return run
+
+
+def stage_valuation(account, state):
+    # The valuation SnapshotStore runs on a full rebuild
+    if 'weights' not in state:
+        stage_replay(account, state)()
+    if 'prices' not in state:
+        stage_price_panel(account, state)()
+    quantities = state['weights'].copy()
+    quantities.index = quantities.index.date
+
+    return lambda: valuation(quantities, state['prices'], account['equities'], account['crypto'])
+
+
+STAGES = {
+    'holdings': stage_holdings,
+    'transactions': stage_transactions,
+    'replay': stage_replay,
+    'replay_loop': stage_replay_loop,
+    'price_panel': stage_price_panel,
+    'valuation': stage_valuation
+}
+
+
+# ----------------- REPORT -----------------
+def measure(run):
+    """
+    Wall time of one run, then peak traced memory of a second run
+
+    :param run
+    :return: seconds, peak MiB
+    """
+
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak / 2 ** 20
+
+
+def parse_size(size):
+    holdings, years, trades = size.lower().split('x')
+    return int(holdings), float(years), int(trades)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pipeline scaling report on synthetic portfolios')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help='HOLDINGSxYEARSxTRADES')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--loop-max-trades', type=int, default=20000, help='skip replay_loop above this size')
+    parser.add_argument('--output', default=None, help='write the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = []
+    print(f"{'size':>18} {'stage':>14} {'seconds':>10} {'peak MiB':>10}")
+    for size in args.sizes:
+        holdings, years, trades = parse_size(size)
+        account = synthetic.portfolio(
+            holdings=holdings, years=years, trades=trades, end=datetime.date.today()
+        )
+        state = {}
+        for stage in args.stages:
+            if stage == 'replay_loop' and trades > args.loop_max_trades:
+                continue
+            seconds, peak = measure(STAGES[stage](account, state))
+            report.append({
+                'holdings': holdings, 'years': years, 'trades': trades,
+                'stage': stage, 'seconds': round(seconds, 6), 'peak_mib': round(peak, 3)
+            })
+            print(f'{size:>18} {stage:>14} {seconds:>10.4f} {peak:>10.2f}')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from collections import deque
+from benchmarks import synthetic
+import threading
+import json
+import time
+
+
+# ----------------- STAND-IN SERVER -----------------
+class StandInServer:
+    """
+    Local HTTP stand-in for the Finnhub and Robinhood endpoints the report uses
+    ---> answers are generated by benchmarks.synthetic
+    ---> every request waits `latency` seconds; past `calls_per_minute` it answers 429 with Retry-After
+
+    Finnhub routes live under /api/v1 (point FinnhubClient.base_url at `finnhub_url`);
+    Robinhood routes live under /rh (see benchmarks.standin.StandInClient).
+
+    :param latency
+    :param calls_per_minute
+    :param news_articles
+    :param port
+    """
+
+    def __init__(self, latency=0.0, calls_per_minute=None, news_articles=10, port=0):
+        self.latency = latency
+        self.calls_per_minute = calls_per_minute
+        self.news_articles = news_articles
+        self.hits = {}
+        self.throttled = 0
+        self._window = deque()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    @property
+    def finnhub_url(self):
+        return f'{self.url}/api/v1'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self.hits = {}
+            self.throttled = 0
+            self._window.clear()
+
+    def _allow(self):
+        if self.calls_per_minute is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            while len(self._window) > 0 and now - self._window[0] > 60:
+                self._window.popleft()
+            if len(self._window) >= self.calls_per_minute:
+                self.throttled += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def _handle(self, request):
+        parsed = urlparse(request.path)
+        path = parsed.path
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        params.pop('token', None)
+
+        with self._lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if not self._allow():
+            self._send(request, 429, {'error': 'API limit reached. Please try again later.'}, {'Retry-After': '1'})
+            return
+
+        try:
+            body = self._synthetic(path, params)
+        except KeyError as e:
+            self._send(request, 400, {'error': f'missing parameter {e}'})
+            return
+
+        if body is None:
+            self._send(request, 404, {'error': f'unknown route {path}'})
+        else:
+            self._send(request, 200, body)
+
+    def _synthetic(self, path, params):
+        # ----- Finnhub -----
+        if path == '/api/v1/quote':
+            return synthetic.quote_response(params['symbol'])
+        if path in ('/api/v1/stock/candle', '/api/v1/crypto/candle'):
+            return synthetic.candle_response(
+                params['symbol'], int(params['from']), int(params['to']), params['resolution'],
+                crypto=path.startswith('/api/v1/crypto')
+            )
+        if path == '/api/v1/stock/profile2':
+            return synthetic.profile_response(params['symbol'])
+        if path == '/api/v1/crypto/exchange':
+            return synthetic.crypto_exchanges_response()
+        if path == '/api/v1/crypto/symbol':
+            return synthetic.crypto_symbols_response(params['exchange'])
+
+        # ----- Robinhood -----
+        if path == '/rh/holdings':
+            return synthetic.holdings_response()
+        if path == '/rh/crypto/positions':
+            return synthetic.crypto_positions_response()
+        if path == '/rh/portfolio_profile':
+            return synthetic.portfolio_profile_response()
+        if path.startswith('/rh/news/'):
+            return synthetic.news_response(path.rsplit('/', 1)[1], articles=self.news_articles)
+        if path == '/rh/marketdata/quotes':
+            by_id = {synthetic.instrument_id(s): s for s in synthetic.STOCKS + synthetic.ETFS}
+            return {
+                'results': [
+                    synthetic.stock_quote_response(by_id[i]) if i in by_id else None
+                    for i in params['ids'].split(',')
+                ]
+            }
+        if path == '/rh/quotes':
+            return {'results': [synthetic.stock_quote_response(s) for s in params['symbols'].split(',')]}
+        if path.startswith('/rh/crypto/quotes/'):
+            return synthetic.crypto_quote_response(path.rsplit('/', 1)[1])
+
+        return None
+
+    @staticmethod
+    def _send(request, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            request.send_header(k, v)
+        request.end_headers()
+        request.wfile.write(payload)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from types import SimpleNamespace
+import requests
+
+
+class StandInClient:
+    """
+    Drop-in for the `robin_stocks.robinhood` module, backed by a StandInServer
+    ---> exposes only the calls the report makes (account, crypto, profiles, stocks, markets, helper)
+
+    :param base_url: StandInServer.url
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+        self.account = SimpleNamespace(
+            build_holdings=lambda: self._get('/rh/holdings')
+        )
+        self.crypto = SimpleNamespace(
+            get_crypto_positions=lambda: self._get('/rh/crypto/positions'),
+            get_crypto_quote=lambda symbol: self._get(f'/rh/crypto/quotes/{symbol}')
+        )
+        self.profiles = SimpleNamespace(
+            load_portfolio_profile=lambda: self._get('/rh/portfolio_profile')
+        )
+        self.stocks = SimpleNamespace(
+            get_news=lambda ticker: self._get(f'/rh/news/{ticker}'),
+            get_quotes=lambda symbols: self._get('/rh/quotes', {'symbols': symbols})['results']
+        )
+        self.helper = SimpleNamespace(
+            request_get=self._request_get
+        )
+
+    def _get(self, path, params=None):
+        with self.session.get(f'{self.base_url}{path}', params=params) as r:
+            r.raise_for_status()
+            return r.json()
+
+    def _request_get(self, url, data_type='regular', payload=None, jsonify_data=True):
+        # Robinhood URLs are re-rooted onto the stand-in: https://api.robinhood.com/x/y/ -> /rh/x/y
+        path = '/rh/' + url.split('.com/', 1)[1].strip('/')
+        data = self._get(path, payload)
+        if data_type == 'results':
+            return data.get('results')
+        return data
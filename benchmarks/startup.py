@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Start-up cost of the command-line entry point (fresh interpreter per run, against the stand-in server).
+
+        python -m benchmarks.startup
+        python -m benchmarks.startup --repeats 10 --max-seconds 1.0     # exit 1 if quote/backfill are slower
+"""
+
+from benchmarks.server import StandInServer
+import subprocess
+import statistics
+import argparse
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+
+# Modules that cron-style commands (quote, backfill) must not import
+HEAVY = ['plotly', 'datapane', 'altair', 'robin_stocks', 'pandas_datareader']
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def commands(url, store):
+    return {
+        'help': ['--help'],
+        'quote': ['--key', 'benchmark', '--finnhub-url', url, 'quote', 'AAPL', 'MSFT', 'SPY'],
+        'backfill': [
+            '--key', 'benchmark', '--finnhub-url', url, 'backfill', 'AAPL', 'MSFT', '--crypto', 'BTC',
+            '--store', store
+        ]
+    }
+
+
+def run(argv):
+    """
+    One fresh `python -X importtime -m portfolio_analysis ...`
+
+    :param argv
+    :return: wall seconds, import seconds, top-level modules imported
+    """
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'portfolio_analysis'] + argv,
+        cwd=REPO,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    seconds = time.perf_counter() - start
+
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    imports, modules = 0, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        imports += int(self_us)
+        modules.add(name.strip().split('.')[0])
+
+    return seconds, imports / 1e6, modules, proc.returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Command-line start-up benchmark')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None, help='fail if quote/backfill median exceeds this')
+    args = parser.parse_args(argv)
+
+    failed = False
+    store = tempfile.mkdtemp(prefix='startup-candles-')
+    try:
+        with StandInServer() as server:
+            print(f"{'command':>10} {'median s':>10} {'imports s':>10}  heavy modules")
+            for name, argv_ in commands(server.finnhub_url, store).items():
+                results = [run(argv_) for _ in range(args.repeats)]
+                median = statistics.median(r[0] for r in results)
+                imports = statistics.median(r[1] for r in results)
+                heavy = sorted(set(HEAVY) & results[-1][2])
+                errors = [r[3] for r in results if r[3] != 0]
+                print(f"{name:>10} {median:>10.3f} {imports:>10.3f}  {', '.join(heavy) or '-'}"
+                      + (f'  (exit {errors[0]})' if len(errors) > 0 else ''))
+
+                if name != 'help' and (
+                    len(heavy) > 0 or len(errors) > 0
+                    or (args.max_seconds is not None and median > args.max_seconds)
+                ):
+                    failed = True
+    finally:
+        shutil.rmtree(store, ignore_errors=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
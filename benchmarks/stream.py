@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Streaming quotes against the stand-in trade feed: ingest rate, and the cost of an intraday dashboard
+    refresh (tiles + BigNumbers) served from memory, which must make no REST calls.
+
+        python -m benchmarks.stream
+        python -m benchmarks.stream --seconds 10 --interval 0.01 --trades-per-tick 5
+"""
+
+from benchmarks.server import StandInServer
+from benchmarks.feed import StandInFeed
+from benchmarks import synthetic
+from charts import tile_data, tiles_script
+from streaming import QuoteStream
+import candle_store
+import statistics
+import argparse
+import tempfile
+import finnhub
+import shutil
+import time
+import sys
+
+
+KEY = 'benchmark'
+
+
+def refresh(stream, symbols):
+    """
+    One dashboard refresh: every tile's chart data and every quote, from the stream's memory
+
+    :param stream
+    :param symbols
+    :return: tiles markup, quotes
+    """
+
+    tiles = []
+    for i, symbol in enumerate(symbols):
+        bars = stream.candles(symbol)
+        if len(bars) > 0:
+            color = 'darkgreen' if bars['c'].iloc[-1] >= bars['c'].iloc[0] else 'darkred'
+            tiles.append(tile_data(i, bars['t'], bars['c'], color))
+    return tiles_script(tiles), stream.quotes(symbols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streaming quote benchmark')
+    parser.add_argument('--seconds', type=float, default=5, help='how long to stream before measuring')
+    parser.add_argument('--interval', type=float, default=0.02, help='feed tick (s)')
+    parser.add_argument('--trades-per-tick', type=int, default=2)
+    parser.add_argument('--refreshes', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    symbols = synthetic.STOCKS + synthetic.ETFS
+    store = tempfile.mkdtemp(prefix='stream-candles-')
+    candle_store._store = candle_store.CandleStore(store)
+    failed = False
+    try:
+        with StandInServer() as server, StandInFeed(args.interval, args.trades_per_tick) as feed:
+            finnhub._clients[KEY] = finnhub.FinnhubClient(KEY, base_url=server.finnhub_url)
+
+            stream = QuoteStream(KEY, symbols, url=feed.url)
+            start = time.perf_counter()
+            stream.seed()
+            seed_seconds = time.perf_counter() - start
+            seed_calls = sum(server.hits.values())
+
+            with stream:
+                stream.connected.wait(5)
+                server.reset()
+                time.sleep(args.seconds)
+                ingested = stream.trades
+
+                seconds = []
+                for _ in range(args.refreshes):
+                    start = time.perf_counter()
+                    refresh(stream, symbols)
+                    seconds.append(time.perf_counter() - start)
+                rest_calls = sum(server.hits.values())
+
+            print(f'symbols          {len(symbols)}')
+            print(f'seed             {seed_seconds:.3f}s  ({seed_calls} REST calls, once)')
+            print(f'ingested         {ingested} trades  ({ingested / args.seconds:,.0f}/s, feed sent {feed.sent})')
+            print(f'bars per symbol  {statistics.median(len(stream.bars[s]) for s in symbols):.0f}')
+            print(f'refresh          median {statistics.median(seconds) * 1000:.2f}ms  '
+                  f'max {max(seconds) * 1000:.2f}ms  REST calls {rest_calls}')
+            failed = rest_calls > 0 or ingested == 0
+    finally:
+        shutil.rmtree(store, ignore_errors=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+import pandas as pd
+import numpy as np
+import datetime
+import zlib
+import math
+import time
+
+
+STOCKS = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA', 'NVDA', 'JPM', 'DIS', 'NFLX', 'AMD']
+ETFS = ['SPY', 'QQQ', 'VTI', 'ARKK']
+CRYPTO = ['BTC', 'ETH', 'DOGE']
+
+RESOLUTION_SECONDS = {
+    '1': 60, '5': 300, '15': 900, '30': 1800, '60': 3600, 'D': 86400, 'W': 7 * 86400, 'M': 30 * 86400
+}
+
+
+def seed(*parts):
+    """
+    Stable integer seed from any labels (same across runs and processes)
+
+    :param parts
+    :return:
+    """
+
+    return zlib.crc32('|'.join(map(str, parts)).encode())
+
+
+def price(symbol, t):
+    """
+    Deterministic price of a symbol at unix time t
+    ---> a function of (symbol, t) only, so overlapping or chunked candle requests always agree
+
+    :param symbol
+    :param t
+    :return:
+    """
+
+    h = seed(symbol) % 1000
+    base = 20 + h / 5
+    return round(base * math.exp(
+        0.25 * math.sin(t / 4.0e6 + h) + 0.05 * math.sin(t / 3.0e5 + h / 7) + 0.01 * math.sin(t / 3.7e3 + h)
+    ), 4)
+
+
+# ----------------- FINNHUB -----------------
+def candle_times(f, t, resolution, crypto=False):
+    """
+    Bar open times in [f, t]
+    ---> stocks trade weekdays only (intraday bars 14:30-21:00 UTC); crypto trades around the clock
+
+    :param f
+    :param t
+    :param resolution
+    :param crypto
+    :return:
+    """
+
+    step = RESOLUTION_SECONDS[str(resolution)]
+    first = f - f % step + (step if f % step else 0)
+    times = []
+    for ts in range(first, t + 1, step):
+        if not crypto:
+            moment = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+            if moment.weekday() >= 5:
+                continue
+            if step < 86400 and not (14 * 60 + 30) <= moment.hour * 60 + moment.minute < 21 * 60:
+                continue
+        times.append(ts)
+
+    return times
+
+
+def candle_response(symbol, f, t, resolution, crypto=False):
+    """
+    Finnhub /stock/candle or /crypto/candle response body
+
+    :param symbol
+    :param f
+    :param t
+    :param resolution
+    :param crypto
+    :return:
+    """
+
+    times = candle_times(f, t, resolution, crypto)
+    if len(times) == 0:
+        return {'s': 'no_data'}
+
+    step = RESOLUTION_SECONDS[str(resolution)]
+    closes = [price(symbol, ts + step) for ts in times]
+    opens = [price(symbol, ts) for ts in times]
+
+    return {
+        'c': closes,
+        'h': [max(o, c) * 1.002 for o, c in zip(opens, closes)],
+        'l': [min(o, c) * 0.998 for o, c in zip(opens, closes)],
+        'o': opens,
+        's': 'ok',
+        't': times,
+        'v': [float(seed(symbol, ts) % 100000) for ts in times]
+    }
+
+
+def quote_response(symbol, now=None):
+    """
+    Finnhub /quote response body
+
+    :param symbol
+    :param now
+    :return:
+    """
+
+    now = int(now if now is not None else time.time())
+    c, pc = price(symbol, now), price(symbol, now - 86400)
+
+    return {
+        'c': c,
+        'd': round(c - pc, 4),
+        'dp': round((c / pc - 1) * 100, 4),
+        'h': round(max(c, pc) * 1.01, 4),
+        'l': round(min(c, pc) * 0.99, 4),
+        'o': pc,
+        'pc': pc,
+        't': now
+    }
+
+
+def profile_response(symbol):
+    return {
+        'country': 'US', 'currency': 'USD', 'exchange': 'NASDAQ', 'ipo': '1990-01-01',
+        'marketCapitalization': float(seed(symbol) % 10 ** 6), 'name': f'{symbol} Inc', 'phone': '',
+        'shareOutstanding': float(seed(symbol, 'shares') % 10 ** 4), 'ticker': symbol,
+        'weburl': f'https://{symbol.lower()}.example.com', 'logo': '', 'finnhubIndustry': 'Technology'
+    }
+
+
+def crypto_exchanges_response():
+    return ['BINANCE', 'COINBASE', 'KRAKEN', 'GEMINI']
+
+
+def crypto_symbols_response(exchange, crypto=CRYPTO):
+    quote_currency = 'USDT' if exchange == 'BINANCE' else 'USD'
+    return [
+        {
+            'description': f'{exchange.title()} {code}{quote_currency}',
+            'displaySymbol': f'{code}/{quote_currency}',
+            'symbol': f'{exchange}:{code}{quote_currency}'
+        }
+        for code in crypto
+    ]
+
+
+# ----------------- ROBINHOOD -----------------
+def instrument_id(symbol):
+    return f'{seed(symbol, "instrument"):08x}-0000-4000-8000-{seed(symbol):012x}'
+
+
+def holdings_response(stocks=STOCKS, etfs=ETFS):
+    """
+    robin_stocks account.build_holdings() output
+
+    :param stocks
+    :param etfs
+    :return:
+    """
+
+    now = int(time.time())
+    holdings = {}
+    for symbol, type_ in [(s, 'stock') for s in stocks] + [(s, 'etp') for s in etfs]:
+        quantity = 1 + seed(symbol, 'qty') % 50
+        p = price(symbol, now)
+        holdings[symbol] = {
+            'price': f'{p:.6f}',
+            'quantity': f'{quantity:.8f}',
+            'average_buy_price': f'{p * 0.9:.4f}',
+            'equity': f'{p * quantity:.2f}',
+            'percent_change': '11.11',
+            'intraday_percent_change': '0.50',
+            'equity_change': f'{p * quantity * 0.1:.6f}',
+            'type': type_,
+            'name': f'{symbol} Inc',
+            'id': instrument_id(symbol),
+            'pe_ratio': '20.0',
+            'percentage': '1.00'
+        }
+
+    return holdings
+
+
+def crypto_positions_response(crypto=CRYPTO):
+    return [
+        {
+            'currency': {'code': code, 'name': code, 'id': instrument_id(code)},
+            'quantity': f'{(1 + seed(code, "qty") % 100) / 10:.8f}',
+            'quantity_available': f'{(1 + seed(code, "qty") % 100) / 10:.8f}',
+            'cost_bases': [],
+            'id': instrument_id(code)
+        }
+        for code in crypto
+    ]
+
+
+def portfolio_profile_response(stocks=STOCKS, etfs=ETFS):
+    now = int(time.time())
+    value = sum(
+        price(s, now) * (1 + seed(s, 'qty') % 50) for s in list(stocks) + list(etfs)
+    )
+
+    return {
+        'start_date': '2019-06-03',
+        'market_value': f'{value:.4f}',
+        'last_core_market_value': f'{value * 0.99:.4f}',
+        'withdrawable_amount': '1234.5600',
+        'equity': f'{value + 1234.56:.4f}'
+    }
+
+
+def news_response(ticker, articles=10, shared=0.3, now=None):
+    """
+    robin_stocks stocks.get_news(ticker) output
+    ---> a `shared` fraction of stories are wire stories returned for every ticker (same URL and id)
+
+    :param ticker
+    :param articles
+    :param shared
+    :param now
+    :return:
+    """
+
+    now = now if now is not None else datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    news = []
+    for i in range(articles):
+        wire = seed(ticker, i) % 100 < shared * 100
+        key = f'wire-{i}' if wire else f'{ticker}-{i}'
+        published = now - datetime.timedelta(hours=i * 3)
+        news.append({
+            'api_source': 'cision',
+            'author': '',
+            'num_clicks': 0,
+            'preview_image_url': f'https://images.example.com/{key}.jpg',
+            'published_at': published.isoformat().replace('+00:00', 'Z'),
+            'relay_url': f'https://news.example.com/relay/{key}',
+            'source': 'Example Wire' if wire else f'{ticker} Daily',
+            'summary': '',
+            'title': f'Story {key}',
+            'updated_at': published.isoformat().replace('+00:00', 'Z'),
+            'url': f'https://news.example.com/{key}',
+            'uuid': f'{seed(key):08x}-0000-4000-8000-000000000000',
+            'related_instruments': [instrument_id('SPY'), instrument_id(ticker)],
+            'preview_text': f'Text size\n\nSomething happened to {ticker}.',
+            'currency_id': None
+        })
+
+    return news
+
+
+def stock_quote_response(symbol):
+    now = int(time.time())
+
+    return {
+        'symbol': symbol,
+        'last_trade_price': f'{price(symbol, now):.6f}',
+        'previous_close': f'{price(symbol, now - 86400):.6f}',
+        'instrument_id': instrument_id(symbol)
+    }
+
+
+def crypto_quote_response(code):
+    now = int(time.time())
+
+    return {
+        'symbol': f'{code}USD',
+        'mark_price': f'{price(code, now):.6f}',
+        'ask_price': f'{price(code, now) * 1.001:.6f}',
+        'bid_price': f'{price(code, now) * 0.999:.6f}',
+        'id': instrument_id(code)
+    }
+
+
+# ----------------- TRANSACTIONS -----------------
+def transactions(symbols=STOCKS + ETFS, trades=2000, years=3, transfers=0.1, referrals=0.02, end=None, seed_=0):
+    """
+    Cleaned transactions in the layout reverse_engineer hands to the replay engine
+    ---> symbol, date, order_type, side, fees, quantity, average_price; sorted by date
+    ---> a `transfers` share are bank deposits/withdrawals and a `referrals` share are stock referrals
+
+    :param symbols
+    :param trades
+    :param years
+    :param transfers
+    :param referrals
+    :param end
+    :param seed_
+    :return:
+    """
+
+    rng = np.random.default_rng(seed_)
+    end = end if end is not None else datetime.date.today()
+    start = end - datetime.timedelta(days=int(years * 365))
+    days = (end - start).days
+
+    dates = [start + datetime.timedelta(days=int(d)) for d in np.sort(rng.integers(0, days + 1, trades))]
+    kind = rng.random(trades)
+    picks = rng.integers(0, len(symbols), trades)
+    quantities = np.round(rng.random(trades) * 5, 6)
+
+    rows = []
+    for date, k, pick, quantity in zip(dates, kind, picks, quantities):
+        moment = int(time.mktime(date.timetuple()))
+        if k < transfers:
+            rows.append(['Cash', date, None, 'withdraw' if k < transfers / 4 else 'deposit', 0.0, 1.0,
+                         float(round(50 + 500 * k / transfers, 2))])
+        elif k < transfers + referrals:
+            symbol = symbols[pick]
+            rows.append([symbol, date, '', 'buy', 0.0, 1.0, price(symbol, moment)])
+        else:
+            symbol = symbols[pick]
+            rows.append([symbol, date, 'market', 'sell' if k > 0.8 else 'buy', 0.0, float(quantity),
+                         price(symbol, moment)])
+
+    return pd.DataFrame(
+        rows,
+        columns=['symbol', 'date', 'order_type', 'side', 'fees', 'quantity', 'average_price']
+    )
+
+
+# ----------------- LARGE PORTFOLIOS -----------------
+def symbols_(count, prefix='S'):
+    """
+    `count` distinct made-up tickers (S0000, S0001, ...)
+
+    :param count
+    :param prefix
+    :return:
+    """
+
+    width = max(4, len(str(count - 1)))
+    return [f'{prefix}{i:0{width}d}' for i in range(count)]
+
+
+def order_export(symbols, trades, start, end, rng, crypto=False):
+    """
+    Frame shaped like robin_stocks' export_completed_stock_orders / export_completed_crypto_orders CSVs
+
+    :param symbols
+    :param trades
+    :param start
+    :param end
+    :param rng
+    :param crypto
+    :return:
+    """
+
+    f, t = int(time.mktime(start.timetuple())), int(time.mktime(end.timetuple()))
+    moments = np.sort(rng.integers(f, t, trades))
+    picks = rng.integers(0, len(symbols), trades)
+    sides = np.where(rng.random(trades) < 0.7, 'buy', 'sell')
+
+    return pd.DataFrame({
+        'symbol': [f'{symbols[p]}USD' if crypto else symbols[p] for p in picks],
+        'date': [
+            datetime.datetime.fromtimestamp(int(m), datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            for m in moments
+        ],
+        'order_type': np.where(rng.random(trades) < 0.8, 'market', 'limit'),
+        'side': sides,
+        'fees': 0.0,
+        'quantity': np.round(rng.random(trades) * (0.5 if crypto else 10), 6),
+        'average_price': [price(symbols[p], int(m)) for p, m in zip(picks, moments)]
+    })
+
+
+def bank_transfers(count, start, end, rng):
+    """
+    robin_stocks account.get_bank_transfers() output
+    ---> reverse_engineer reads it positionally: amount [6], direction [7], fees [9], date [15]
+
+    :param count
+    :param start
+    :param end
+    :param rng
+    :return:
+    """
+
+    f, t = int(time.mktime(start.timetuple())), int(time.mktime(end.timetuple()))
+    transfers = []
+    for i, m in enumerate(np.sort(rng.integers(f, t, count))):
+        stamp = datetime.datetime.fromtimestamp(int(m), datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        transfers.append({
+            'id': f'transfer-{i}',
+            'ref_id': f'ref-{i}',
+            'url': f'https://api.robinhood.com/ach/transfers/transfer-{i}/',
+            'cancel': None,
+            'ach_relationship': 'https://api.robinhood.com/ach/relationships/1/',
+            'account': 'https://api.robinhood.com/accounts/1/',
+            'amount': f'{float(round(50 + rng.random() * 950, 2)):.2f}',
+            'direction': 'withdraw' if rng.random() < 0.15 else 'deposit',
+            'state': 'completed',
+            'fees': '0.00',
+            'status_description': '',
+            'scheduled': False,
+            'expected_landing_date': stamp[:10],
+            'early_access_amount': '0.00',
+            'created_at': stamp,
+            'updated_at': stamp,
+            'rhs_state': 'submitted',
+            'expected_sweep_at': None,
+            'expected_landing_datetime': stamp,
+            'investment_schedule_id': None
+        })
+
+    return transfers
+
+
+def referrals_(count, symbols, start, end, rng):
+    """
+    robin_stocks account.get_referrals() output
+    ---> get_referrals reads stock rewards positionally (symbol [2], quantity [3], cost basis [4], date [10])
+         and cash rewards' amount [4] and date [10]
+
+    :param count
+    :param symbols
+    :param start
+    :param end
+    :param rng
+    :return:
+    """
+
+    f, t = int(time.mktime(start.timetuple())), int(time.mktime(end.timetuple()))
+    referrals = []
+    for i, m in enumerate(rng.integers(f, t, count)):
+        stamp = datetime.datetime.fromtimestamp(int(m), datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        symbol = symbols[int(rng.integers(0, len(symbols)))]
+        stock = {
+            'id': f'reward-{i}', 'instrument_url': '', 'symbol': symbol, 'quantity': '1.0000',
+            'cost_basis': f'{price(symbol, int(m)):.2f}', 'state': 'granted', 'direction': 'to',
+            'payment_instrument': 'stock', 'payment_id': '', 'cost_basis_type': 'market',
+            'created_at': stamp
+        }
+        cash = {
+            'id': f'cash-{i}', 'instrument_url': '', 'symbol': '', 'quantity': '',
+            'amount': '5.00', 'state': 'granted', 'direction': 'to',
+            'payment_instrument': 'cash', 'payment_id': '', 'cost_basis_type': '',
+            'created_at': stamp
+        }
+        referrals.append({
+            'id': f'referral-{i}',
+            'reward': {
+                'stocks': [stock] if i % 2 == 0 else [],
+                'cash': [cash] if i % 2 == 1 else []
+            }
+        })
+
+    return referrals
+
+
+def portfolio(holdings=1000, years=10, trades=100000, crypto_share=0.05, transfers=None, referrals=None,
+              end=None, seed_=0):
+    """
+    A whole synthetic account in the shapes the report pipeline consumes
+    ---> stock/crypto order exports, bank transfers, referrals, build_holdings output,
+         crypto positions, portfolio profile and the symbols each candle request is for
+
+    :param holdings: number of distinct symbols
+    :param years
+    :param trades
+    :param crypto_share
+    :param transfers: defaults to ~2% of trades
+    :param referrals: defaults to ~0.2% of trades
+    :param end
+    :param seed_
+    :return:
+    """
+
+    rng = np.random.default_rng(seed_)
+    end = end if end is not None else datetime.date.today()
+    start = end - datetime.timedelta(days=int(years * 365))
+
+    crypto_count = max(1, int(holdings * crypto_share))
+    equities = symbols_(holdings - crypto_count)
+    crypto = symbols_(crypto_count, prefix='C')
+    crypto_trades = int(trades * crypto_share)
+
+    return {
+        'start': start,
+        'end': end,
+        'equities': equities,
+        'crypto': crypto,
+        'stock_orders': order_export(equities, trades - crypto_trades, start, end, rng),
+        'crypto_orders': order_export(crypto, max(1, crypto_trades), start, end, rng, crypto=True),
+        'bank_transfers': bank_transfers(transfers if transfers is not None else max(1, trades // 50), start, end, rng),
+        'referrals': referrals_(referrals if referrals is not None else max(2, trades // 500), equities, start, end, rng),
+        'holdings': holdings_response(stocks=equities[:len(equities) * 3 // 4], etfs=equities[len(equities) * 3 // 4:]),
+        'crypto_positions': crypto_positions_response(crypto),
+        'profile': portfolio_profile_response(stocks=equities[:50], etfs=[])
+    }
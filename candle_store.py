@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from constants import ROOT
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pandas as pd
+import numpy as np
+import datetime
+import time
+import os
+
+
+COLUMNS = ['c', 'h', 'l', 'o', 't', 'v']
+INTRADAY = {'1', '5', '15', '30', '60'}
+INTRADAY_RETENTION_DAYS = 30
+
+# Seconds after a bar opens before it is treated as final (and so never re-downloaded)
+SETTLE = {
+    'D': 86400,
+    'W': 7 * 86400,
+    'M': 31 * 86400
+}
+
+# A re-downloaded final bar whose close differs from the cached one by more than this (relative) means the
+# provider revised its history (e.g. split-adjusted it), so the cached window is downloaded again
+REVISION_RTOL = 1e-4
+
+
+class CandleStore:
+    """
+    Local Parquet cache of Finnhub candles, one file per (type, resolution, symbol)
+    ---> the file's schema metadata records the [from, to] window already downloaded
+    ---> only the uncovered head/tail of a request goes to the network
+    ---> a head/tail download overlaps the cached bars it joins; if their closes changed (a split or other
+         corporate action), the whole covered window is downloaded again and the file rewritten
+    ---> daily bars that already reach the latest settled session (per market_calendar) are not re-requested
+    ---> intraday resolutions keep a rolling window of `intraday_retention_days`
+
+    :param root
+    :param intraday_retention_days
+    :param calendar: market_calendar.TradingCalendar (the one under ROOT/Input if None)
+    """
+
+    def __init__(self, root=None, intraday_retention_days=INTRADAY_RETENTION_DAYS, calendar=None):
+        self.root = root if root is not None else os.path.join(ROOT, 'Input', 'candles')
+        self.intraday_retention_days = intraday_retention_days
+        self.calendar = calendar
+        self.revisions = 0
+
+    def path(self, symbol, type_, resolution):
+        """
+
+        :param symbol
+        :param type_
+        :param resolution
+        :return:
+        """
+
+        name = symbol.replace(':', '_').replace('/', '_')
+        return os.path.join(self.root, type_, str(resolution), f'{name}.parquet')
+
+    def read(self, symbol, type_, resolution):
+        """
+
+        :param symbol
+        :param type_
+        :param resolution
+        :return: cached candles, covered_from, covered_to (all None if nothing is cached)
+        """
+
+        path = self.path(symbol, type_, resolution)
+        if not os.path.exists(path):
+            return None, None, None
+
+        table = pq.read_table(path)
+        meta = table.schema.metadata or {}
+        try:
+            covered_from = int(meta[b'covered_from'])
+            covered_to = int(meta[b'covered_to'])
+        except (KeyError, ValueError):
+            return None, None, None
+
+        return table.to_pandas(), covered_from, covered_to
+
+    def write(self, symbol, type_, resolution, df, covered_from, covered_to):
+        """
+        Atomically replace the cached file (write to a temp file, then rename)
+
+        :param symbol
+        :param type_
+        :param resolution
+        :param df
+        :param covered_from
+        :param covered_to
+        :return:
+        """
+
+        path = self.path(symbol, type_, resolution)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        table = pa.Table.from_pandas(
+            df[COLUMNS].reset_index(drop=True),
+            preserve_index=False
+        )
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'covered_from': str(covered_from).encode(),
+            b'covered_to': str(covered_to).encode()
+        })
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def get(self, symbol, type_, resolution, f, t, fetch):
+        """
+        Candles for [f, t], downloading only what the cache does not cover
+
+        :param symbol
+        :param type_
+        :param resolution
+        :param f: unix start
+        :param t: unix end
+        :param fetch: callable(f, t) -> DataFrame of Finnhub candles or None
+        :return: DataFrame shaped like the Finnhub response, or None if there are no candles
+        """
+
+        resolution = str(resolution)
+        cached, covered_from, covered_to = self.read(symbol, type_, resolution)
+        cutoff = self._cutoff(resolution)
+
+        if cached is None:
+            missing = [(f, t)]
+        else:
+            # ---> each download starts / ends on a bar that was already final when cached
+            final = cached.loc[cached['t'] <= covered_to, 't']
+            missing = []
+            if f < covered_from:
+                missing.append((f, int(final.iloc[0]) if len(final) > 0 else covered_from))
+            if t > covered_to and not self._current(final, type_, resolution):
+                missing.append((int(final.iloc[-1]) if len(final) > 0 else covered_to, t))
+
+        if len(missing) == 0:
+            return self._window(cached, f, t)
+
+        fetched = []
+        for f_, t_ in missing:
+            df = fetch(f_, t_)
+            if df is not None and 't' in df:
+                fetched.append(df[COLUMNS])
+
+        frames = fetched if cached is None else [cached] + fetched
+        if cached is not None and self._revised(cached.loc[cached['t'] <= covered_to], fetched):
+            # ---> history changed under the cache: the covered window is replaced, not patched
+            self.revisions += 1
+            df = fetch(min(f, covered_from), max(t, covered_to))
+            frames = [] if df is None or 't' not in df else [df[COLUMNS]]
+
+        candles_ = self._merge(frames)
+
+        # Bars that may still change (e.g. today's daily bar) are not counted as covered
+        settled = min(t, int(time.time()) - SETTLE.get(resolution, 60 * int(resolution) if resolution.isdigit() else 0))
+        new_from = f if cached is None else min(f, covered_from)
+        new_to = settled if cached is None else max(covered_to, settled)
+
+        # Rolling window for intraday bars; anything older than the cutoff is served but not kept
+        stored = candles_
+        if cutoff is not None:
+            stored = candles_.loc[candles_['t'] >= cutoff]
+            new_from = max(new_from, cutoff)
+
+        if new_to >= new_from:
+            self.write(symbol, type_, resolution, stored, new_from, new_to)
+
+        return self._window(candles_, f, t)
+
+    def compact(self):
+        """
+        Walk the store, de-duplicating every file and evicting intraday bars past retention
+        ---> files left with no bars are removed
+
+        :return: number of files removed
+        """
+
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+
+        for type_ in os.listdir(self.root):
+            for resolution in os.listdir(os.path.join(self.root, type_)):
+                directory = os.path.join(self.root, type_, resolution)
+                cutoff = self._cutoff(resolution)
+                for file in os.listdir(directory):
+                    if not file.endswith('.parquet'):
+                        continue
+                    path = os.path.join(directory, file)
+                    table = pq.read_table(path)
+                    meta = table.schema.metadata or {}
+                    df = self._merge([table.to_pandas()])
+                    covered_from = int(meta.get(b'covered_from', 0))
+                    covered_to = int(meta.get(b'covered_to', 0))
+                    if cutoff is not None:
+                        df = df.loc[df['t'] >= cutoff]
+                        covered_from = max(covered_from, cutoff)
+
+                    if len(df) == 0 or covered_to < covered_from:
+                        os.remove(path)
+                        removed += 1
+                        continue
+
+                    symbol = file[:-len('.parquet')]
+                    self.write(symbol, type_, resolution, df, covered_from, covered_to)
+
+        return removed
+
+    def _revised(self, final, fetched):
+        """
+        Whether re-downloaded bars disagree with the final bars cached for the same times
+
+        :param final: cached bars that were final when written
+        :param fetched: newly downloaded frames
+        :return:
+        """
+
+        if len(final) == 0 or len(fetched) == 0:
+            return False
+
+        overlap = final[['t', 'c']].merge(self._merge(fetched)[['t', 'c']], on='t', suffixes=('_cached', ''))
+        return not np.allclose(overlap['c'], overlap['c_cached'], rtol=REVISION_RTOL, atol=0.0)
+
+    def _current(self, final, type_, resolution):
+        """
+        Whether the final daily bars already include the latest settled session
+        ---> a daily bar settles a day after it opens (SETTLE), so the latest settled session is the last open
+             day before today (UTC); crypto trades every day
+
+        :param final: times of the cached bars that were final when written
+        :param type_
+        :param resolution
+        :return:
+        """
+
+        if resolution != 'D' or len(final) == 0:
+            return False
+
+        yesterday = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=1)
+        latest = yesterday
+        if type_ != 'crypto':
+            if self.calendar is None:
+                from market_calendar import TradingCalendar
+
+                self.calendar = TradingCalendar()
+            sessions = self.calendar.trading_days(yesterday - datetime.timedelta(days=14), yesterday)
+            latest = sessions[-1] if len(sessions) > 0 else yesterday
+
+        last = datetime.datetime.fromtimestamp(int(final.iloc[-1]), datetime.timezone.utc).date()
+        return last >= latest
+
+    def _cutoff(self, resolution):
+        if str(resolution) not in INTRADAY:
+            return None
+        return int(time.time()) - self.intraday_retention_days * 86400
+
+    @staticmethod
+    def _merge(frames):
+        if len(frames) == 0:
+            return pd.DataFrame(columns=COLUMNS)
+
+        df = pd.concat(frames)
+        df = df.drop_duplicates(
+            subset='t',
+            keep='last'
+        ).sort_values(
+            by='t'
+        ).reset_index(
+            drop=True
+        )
+        df['t'] = df['t'].astype('int64')
+        for column in ['c', 'h', 'l', 'o', 'v']:
+            df[column] = df[column].astype('float64')
+        return df
+
+    @staticmethod
+    def _window(df, f, t):
+        df = df.loc[(df['t'] >= f) & (df['t'] <= t)].reset_index(drop=True)
+        if len(df) == 0:
+            return None
+
+        df.insert(4, 's', 'ok')
+        return df
+
+
+_store = None
+
+
+def get_store():
+    """
+    Shared store under ROOT/Input/candles (created on first use)
+
+    :return:
+    """
+
+    global _store
+    if _store is None:
+        _store = CandleStore()
+    return _store
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+import json
+
+
+VEGA_LITE_SCHEMA = 'https://vega.github.io/schema/vega-lite/v4.17.0.json'
+
+# Shared by every security tile; only the data, line/gradient color and y-domain change
+INTRADAY_TEMPLATE = {
+    '$schema': VEGA_LITE_SCHEMA,
+    'config': {
+        'view': {
+            'continuousHeight': 75,
+            'continuousWidth': 125,
+            'strokeWidth': 0
+        },
+        'axis': {
+            'grid': False,
+            'domain': False
+        }
+    }
+}
+
+
+# ----------------- INTRADAY TILES -----------------
+def intraday_spec(times, closes, color):
+    """
+    Vega-Lite spec of a security tile's intraday area chart, built in memory
+    ---> same chart the tiles used to get from Altair (area with a white-to-color gradient, no axes)
+
+    :param times: unix seconds
+    :param closes
+    :param color
+    :return:
+    """
+
+    closes = [float(c) for c in closes]
+
+    return dict(
+        INTRADAY_TEMPLATE,
+        data={
+            'values': [
+                {'t': int(t) * 1000, 'c': c} for t, c in zip(times, closes)
+            ]
+        },
+        mark={
+            'type': 'area',
+            'line': {'color': color},
+            'color': {
+                'gradient': 'linear',
+                'stops': [
+                    {'color': 'white', 'offset': 0},
+                    {'color': color, 'offset': 1}
+                ]
+            }
+        },
+        encoding={
+            'x': {
+                'field': 't',
+                'type': 'temporal',
+                'axis': {'title': '', 'labels': False}
+            },
+            'y': {
+                'field': 'c',
+                'type': 'quantitative',
+                'axis': {'title': ''},
+                'scale': {'domain': [min(closes) - 1, max(closes) + 1]}
+            }
+        }
+    )
+
+
+# ----------------- SHARED TILE SCRIPT -----------------
+# Included once per document, however many tiles it holds
+VEGA_SCRIPTS = """
+<script type="text/javascript" src="https://cdn.jsdelivr.net/npm//vega@5"></script>
+<script type="text/javascript" src="https://cdn.jsdelivr.net/npm//vega-lite@4.17.0"></script>
+<script type="text/javascript" src="https://cdn.jsdelivr.net/npm//vega-embed@6"></script>
+""".strip()
+
+# Builds every tile's spec from one template: data, colors and y-domain are filled in per tile
+TILES_JS = """
+(function (template, tiles) {
+    tiles.forEach(function (tile) {
+        var spec = JSON.parse(JSON.stringify(template)), t = tile.t0;
+        spec.data.values = tile.c.map(function (c, i) { t += tile.dt[i]; return {t: t * 1000, c: c}; });
+        spec.mark.line.color = tile.color;
+        spec.mark.color.stops[1].color = tile.color;
+        spec.encoding.y.scale.domain = [Math.min.apply(null, tile.c) - 1, Math.max.apply(null, tile.c) + 1];
+        vegaEmbed("#vis" + tile.id, spec, {"mode": "vega-lite"});
+    });
+})
+""".strip()
+
+
+def tile_data(id_, times, closes, color):
+    """
+    A security tile's intraday chart as data, drawn by `tiles_script`
+    ---> times are delta-encoded (mostly 60s steps) and closes kept to 6 significant digits
+
+    :param id_
+    :param times: unix seconds
+    :param closes
+    :param color
+    :return:
+    """
+
+    times = [int(t) for t in times]
+
+    return {
+        'id': id_,
+        'color': color,
+        't0': times[0] if len(times) > 0 else 0,
+        'dt': [0] + [b - a for a, b in zip(times, times[1:])],
+        'c': [float(f'{float(c):.6g}') for c in closes]
+    }
+
+
+def tiles_script(tiles):
+    """
+    One <script> block rendering every tile (the spec template is sent once, not per tile)
+
+    :param tiles: `tile_data` records
+    :return:
+    """
+
+    template = intraday_spec([0], [0.0], 'white')
+
+    return f"""
+        <script>
+            {TILES_JS}({json.dumps(template, separators=(',', ':'))}, {json.dumps(tiles, separators=(',', ':'))});
+        </script>
+    """.strip()
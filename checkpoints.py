@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from constants import ROOT
+import datetime
+import pickle
+import shutil
+import time
+import os
+
+
+# Stages of one user's report, in the order they run
+STAGES = ['auth', 'transactions', 'holdings', 'prices', 'valuation', 'news', 'render', 'upload']
+
+# 'auth' is never written to disk: the session token stays with robin_stocks
+CHECKPOINTED = STAGES[1:]
+
+# Days of checkpoints kept per user (older run directories are removed)
+KEEP_DAYS = 3
+
+
+class CheckpointStore:
+    """
+    Outputs of each completed report stage for one user and run date
+    ---> Input/checkpoints/<user>/<date>/<stage>.pkl, pickled (highest protocol), written atomically
+    ---> a rerun on the same day loads completed stages instead of repeating their network calls
+    ---> a new day starts from an empty directory, so prices and holdings are never stale
+
+    :param user
+    :param date: run date (today if None)
+    :param root
+    """
+
+    def __init__(self, user, date=None, root=None):
+        self.user = user
+        self.date = date if date is not None else datetime.date.today()
+        self.root = root if root is not None else os.path.join(ROOT, 'Input', 'checkpoints')
+        self.directory = os.path.join(self.root, user, self.date.isoformat())
+
+    def path(self, stage):
+        return os.path.join(self.directory, f'{stage}.pkl')
+
+    def done(self, stage):
+        return os.path.exists(self.path(stage))
+
+    def pending(self, stages=CHECKPOINTED):
+        return [stage for stage in stages if not self.done(stage)]
+
+    def load(self, stage):
+        """
+        Output of a completed stage
+
+        :param stage
+        :return:
+        """
+
+        with open(self.path(stage), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, stage, output):
+        """
+        Mark a stage complete with its output
+        ---> an output that cannot be pickled is not checkpointed; the stage simply runs again on a rerun
+
+        :param stage
+        :param output
+        :return: whether the checkpoint was written
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{self.path(stage)}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            os.remove(tmp)
+            return False
+
+        os.replace(tmp, self.path(stage))
+        return True
+
+    def clear(self, stages=None):
+        """
+        Forget completed stages (every stage of this run if None)
+
+        :param stages
+        :return:
+        """
+
+        if stages is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        for stage in stages:
+            if self.done(stage):
+                os.remove(self.path(stage))
+
+    def prune(self, keep=KEEP_DAYS):
+        """
+        Remove this user's run directories older than `keep` days
+
+        :param keep
+        :return:
+        """
+
+        user_dir = os.path.dirname(self.directory)
+        if not os.path.isdir(user_dir):
+            return
+        cutoff = (self.date - datetime.timedelta(days=keep)).isoformat()
+        for name in os.listdir(user_dir):
+            if name < cutoff:
+                shutil.rmtree(os.path.join(user_dir, name), ignore_errors=True)
+
+    def run(self, stage, fn, attempts=1, backoff=2.0, retry_on=(Exception,)):
+        """
+        Output of a stage: loaded if it already completed, otherwise computed (with retries) and saved
+
+        :param stage
+        :param fn: callable() -> stage output
+        :param attempts
+        :param backoff
+        :param retry_on
+        :return:
+        """
+
+        if self.done(stage):
+            return self.load(stage)
+
+        output = retry(fn, attempts=attempts, backoff=backoff, retry_on=retry_on)
+        self.save(stage, output)
+        return output
+
+
+def retry(fn, attempts=3, backoff=2.0, retry_on=(Exception,)):
+    """
+    Call fn(), retrying failures with exponential backoff (backoff, 2 x backoff, ... seconds)
+    ---> an error marked `retried` (e.g. by finnhub.FinnhubClient, once its own retries run out) is raised
+         immediately, so requests are retried at one layer rather than attempts x retries times against the quota
+
+    :param fn
+    :param attempts
+    :param backoff
+    :param retry_on: exception types worth another attempt; anything else is raised immediately
+    :return:
+    """
+
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == attempts - 1 or getattr(e, 'retried', False):
+                raise
+            time.sleep(backoff * 2 ** attempt)
@@ -7,38 +7,262 @@
 """
 
 
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-import datapane as dp
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from instrumentation import timed_call
+import threading
 import requests
 import datetime
 import math
 import time
 
 
+BASE_URL = 'https://finnhub.io/api/v1'
+CALLS_PER_MINUTE = 60
+CALLS_PER_SECOND = 30
+
+# Candles per response the provider may cap (a longer response is cut short); long ranges are requested in
+# chunks of CHUNK_BARS, so a full chunk never reaches the cap and one that does is split and re-requested
+MAX_BARS = 5000
+CHUNK_BARS = 4000
+CHUNK_WORKERS = 4
+
+# Stocks trade weekdays, with intraday bars over about 16 hours (pre-market to after-hours), so a stock chunk
+# spans more calendar time than a crypto chunk of the same number of bars
+STOCK_DAYS_PER_WEEK = 5
+STOCK_HOURS_PER_DAY = 16
+
+RESOLUTION_SECONDS = {
+    '1': 60, '5': 300, '15': 900, '30': 1800, '60': 3600, 'D': 86400, 'W': 7 * 86400, 'M': 31 * 86400
+}
+
+# pandas, the candle store, plotly and datapane are imported inside the functions that use them,
+# so a plain quote lookup (e.g. `python -m portfolio_analysis quote`) starts without them
+
+
+# -------------------- CLIENT --------------------
+class RateLimiter:
+    """
+    Thread-safe token bucket
+    ---> refills `rate` tokens every `per` seconds and allows bursts of up to `capacity` calls
+
+    :param rate
+    :param per
+    :param capacity
+    """
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available, then consume it
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FinnhubClient:
+    """
+    Keep-alive, rate-limited Finnhub REST client
+    ---> one pooled session per API key, shared by every function in this module
+    ---> retries 429 and 5xx responses (and dropped connections) with exponential backoff; the error raised once
+         retries run out is marked `retried`, so callers (checkpoints.retry) do not retry it again on top
+    ---> at most `pool_size` requests are open at once; further callers wait for a pooled connection rather
+         than opening one that is thrown away afterwards
+
+    :param key
+    :param calls_per_minute
+    :param retries
+    :param backoff
+    :param pool_size
+    :param timeout
+    :param base_url
+    """
+
+    def __init__(self, key, calls_per_minute=CALLS_PER_MINUTE, retries=4, backoff=1.0, pool_size=10, timeout=30,
+                 base_url=BASE_URL):
+        self.key = key
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/')
+        self.limiter = RateLimiter(
+            calls_per_minute,
+            capacity=min(calls_per_minute, CALLS_PER_SECOND)
+        )
+
+        self.session = requests.Session()
+        self.pool_size = 0
+        self.resize(pool_size)
+
+    def resize(self, pool_size):
+        """
+        Grow the connection pool (it is never shrunk, so requests already sharing it keep their connections)
+
+        :param pool_size
+        :return:
+        """
+
+        if pool_size <= self.pool_size:
+            return
+
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool_size = pool_size
+
+    def get(self, endpoint, **params):
+        """
+
+        :param endpoint: path relative to the API root, e.g. 'quote' or 'stock/candle'
+        :param params: query parameters (the token is added here)
+        :return: decoded JSON response
+        """
+
+        params['token'] = self.key
+        url = f'{self.base_url}/{endpoint}'
+
+        with timed_call(f'finnhub/{endpoint}') as call:
+            for attempt in range(self.retries + 1):
+                call['retries'] = attempt
+                self.limiter.acquire()
+                try:
+                    r = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if attempt == self.retries:
+                        e.retried = True
+                        raise
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+
+                call['bytes'] += len(r.content)
+                if r.status_code == 429 or r.status_code >= 500:
+                    if attempt == self.retries:
+                        try:
+                            r.raise_for_status()
+                        except requests.exceptions.HTTPError as e:
+                            e.retried = True
+                            raise
+                    retry_after = r.headers.get('Retry-After')
+                    time.sleep(
+                        float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+                    )
+                    continue
+
+                r.raise_for_status()
+                return r.json()
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key, pool_size=None):
+    """
+    Shared client for an API key (created on first use)
+
+    :param key
+    :param pool_size: connections the caller will use at once (the shared pool is grown to fit)
+    :return:
+    """
+
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = FinnhubClient(key)
+        if pool_size is not None:
+            _clients[key].resize(pool_size)
+        return _clients[key]
+
+
 # -------------------- QUOTE --------------------
 def quote(key, ticker):
     """
     Real-time quote data for United States equities
     ---> includes high, low, open, close, change, etc.
+    ---> one uncached request; the rest of the project quotes through quote_provider
 
     :param key
     :param ticker
     :return:
     """
 
-    q = f'https://finnhub.io/api/v1/quote?symbol={ticker}&token={key}'
-    with requests.get(q) as r:
-        resp = r.json()
+    resp = get_client(key).get('quote', symbol=ticker)
     return list(resp.values())
 
 
-def big_number(key, ticker):
+def quotes(key, tickers, max_workers=8):
+    """
+    Batch quote lookup on a bounded thread pool, through the shared quote_provider
+    ---> every request still passes through the shared client's rate limiter
+    ---> a ticker quoted in the last few seconds (or being quoted right now) is not requested again
+    ---> results are in input order as (ticker, quote, error); a failed ticker has quote None
+
+    :param key
+    :param tickers
+    :param max_workers
+    :return:
+    """
+
+    from quote_provider import get_provider
+
+    return get_provider(key).quotes(tickers, max_workers=max_workers)
+
+
+def big_number(key, ticker, stream=None):
+    """
+
+    :param key
+    :param ticker
+    :param stream: streaming.QuoteStream; its in-memory quote is used when it has one
+    :return:
+    """
+
+    from quote_provider import get_provider
+
+    q = stream.quote(ticker) if stream is not None else None
+    return quote_number(ticker, q if q is not None else get_provider(key).quote(ticker))
+
+
+def quote_number(ticker, q, error=None):
     """
+    BigNumber for a quote already fetched (e.g. by `quotes`)
 
+    :param ticker
+    :param q
+    :param error
+    :return:
     """
-    close, delta, delta_pct, high, low, open_, p_close, _ = quote(key, ticker)
+
+    import datapane as dp
+
+    if error is not None or q is None:
+        return dp.BigNumber(
+            heading=ticker,
+            value="N/A"
+        )
+
+    close, delta, delta_pct, high, low, open_, p_close, _ = q
 
     return dp.BigNumber(
         heading=ticker,
@@ -49,19 +273,26 @@ def big_number(key, ticker):
 
 
 # -------------------- CANDLES --------------------
-def candles(key, ticker, years=1, resolution='D', type_='stock'):
+def candles(key, ticker, years=1, resolution='D', type_='stock', cache=True, gaps=None):
     """
     Get candlestick data (OHLCV) for stocks.
     ---> daily data will be adjusted for splits; intraday data will remain unadjusted.
+    ---> served from the local candle store; only ranges it does not cover are downloaded
+    ---> long ranges are downloaded in concurrent chunks (see `fetch_candles`); if a chunk fails, its error is
+         raised once the others finish, so the store never records the range as covered
 
     :param key
     :param ticker
     :param years
     :param resolution
     :param type_
+    :param cache
+    :param gaps: list to extend with the ranges that came back empty or truncated
     :return:
     """
 
+    from candle_store import get_store
+
     if isinstance(years, int) or isinstance(years, float):
         days = math.ceil(years * 365)
         today = datetime.date.today()
@@ -72,15 +303,126 @@ def candles(key, ticker, years=1, resolution='D', type_='stock'):
         f = int(time.mktime(f.timetuple()))
         t = int(time.mktime(t.timetuple()))
 
-    candle = f'https://finnhub.io/' \
-             f'api/v1/{type_}/candle?symbol={ticker}&resolution={resolution}&from={f}&to={t}&token={key}'
-    with requests.get(candle) as r:
-        resp = r.json()
+    def fetch(f_, t_):
+        df, gaps_ = fetch_candles(key, ticker, f_, t_, resolution, type_)
+        errors = [gap['error'] for gap in gaps_ if gap['error'] is not None]
+        if len(errors) > 0:
+            raise errors[0]
+        if gaps is not None:
+            gaps.extend(gaps_)
+        return df
+
+    if not cache:
+        return fetch(f, t)
+
+    return get_store().get(ticker, type_, resolution, f, t, fetch)
 
-    try:
-        return pd.DataFrame(resp)
-    except ValueError:
-        return None
+
+def candle_chunks(f, t, resolution='D', chunk_bars=CHUNK_BARS, type_='stock'):
+    """
+    Split [f, t] into consecutive ranges of about `chunk_bars` bars (neighbours share their boundary second)
+    ---> stock ranges are measured in trading time (STOCK_DAYS_PER_WEEK, STOCK_HOURS_PER_DAY), so e.g. a week of
+         minute bars is one request; a chunk that turns out longer is split by `fetch_candles`
+
+    :param f: unix start
+    :param t: unix end
+    :param resolution
+    :param chunk_bars
+    :param type_
+    :return: [(from, to)]
+    """
+
+    step = RESOLUTION_SECONDS[str(resolution)]
+    span = chunk_bars * step
+    if type_ == 'stock' and step < 7 * 86400:
+        span = span * 7 // STOCK_DAYS_PER_WEEK
+        if step < 86400:
+            span = span * 24 // STOCK_HOURS_PER_DAY
+    return [(f_, min(f_ + span, t)) for f_ in range(f, t, span)] or [(f, t)]
+
+
+def fetch_candles(key, ticker, f, t, resolution='D', type_='stock', chunk_bars=CHUNK_BARS,
+                  max_workers=CHUNK_WORKERS):
+    """
+    Download [f, t] in chunks, concurrently, and stitch them together
+    ---> every request still passes through the shared client's rate limiter, so the time taken is bounded by
+         the number of chunks over the rate limit
+    ---> at most `max_workers` chunks are in flight, and never more than the client's connection pool
+    ---> a chunk that comes back at the provider's cap (MAX_BARS) is split in two and each half re-requested
+    ---> chunks are stitched on timestamp: sorted, and a bar returned by two chunks is kept once
+    ---> nothing is dropped silently: each chunk that failed, was empty or stayed truncated is a gap
+
+    :param key
+    :param ticker
+    :param f: unix start
+    :param t: unix end
+    :param resolution
+    :param type_
+    :param chunk_bars
+    :param max_workers
+    :return: candles shaped like the Finnhub response (None if there are none),
+             gaps [{'from', 'to', 'reason': 'error' | 'no_data' | 'truncated', 'error'}]
+    """
+
+    import pandas as pd
+
+    resolution = str(resolution)
+
+    def fetch(chunk):
+        f_, t_ = chunk
+        try:
+            resp = get_client(key).get(
+                f'{type_}/candle',
+                symbol=ticker,
+                resolution=resolution,
+                **{'from': f_, 'to': t_}
+            )
+        except Exception as e:
+            return [], [{'from': f_, 'to': t_, 'reason': 'error', 'error': e}]
+
+        if resp.get('s') != 'ok' or len(resp.get('t') or []) == 0:
+            return [], [{'from': f_, 'to': t_, 'reason': 'no_data', 'error': None}]
+
+        df = pd.DataFrame(resp)
+        if len(df) < MAX_BARS:
+            return [df], []
+        if t_ - f_ <= RESOLUTION_SECONDS[resolution]:
+            return [df], [{'from': f_, 'to': t_, 'reason': 'truncated', 'error': None}]
+
+        middle = f_ + (t_ - f_) // 2
+        (first, first_gaps), (second, second_gaps) = fetch((f_, middle)), fetch((middle, t_))
+        return first + second, first_gaps + second_gaps
+
+    chunks = candle_chunks(f, t, resolution, chunk_bars, type_)
+    if len(chunks) == 1:
+        results = [fetch(chunks[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks), get_client(key).pool_size)) as pool:
+            results = list(pool.map(fetch, chunks))
+
+    frames = [df for frames_, _ in results for df in frames_]
+    gaps = []
+    for gap in sorted([gap for _, gaps_ in results for gap in gaps_], key=lambda g: g['from']):
+        # ---> neighbouring gaps of the same kind are reported as one range
+        if len(gaps) > 0 and gaps[-1]['reason'] == gap['reason'] == 'no_data' and gaps[-1]['to'] >= gap['from']:
+            gaps[-1]['to'] = gap['to']
+        else:
+            gaps.append(gap)
+
+    if len(frames) == 0:
+        return None, gaps
+
+    df = pd.concat(
+        frames
+    ).drop_duplicates(
+        subset='t',
+        keep='last'
+    ).sort_values(
+        by='t'
+    ).reset_index(
+        drop=True
+    )
+    return df, gaps
 
 
 def candlestick(df, ticker, label=None):
@@ -92,6 +434,11 @@ def candlestick(df, ticker, label=None):
     :return:
     """
 
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+    import datapane as dp
+    import pandas as pd
+
     try:
         df['t'] = pd.to_datetime(
             df['t'],
@@ -185,9 +532,7 @@ def name_search(key, ticker):
     :return:
     """
 
-    prof = f'https://finnhub.io/api/v1/stock/profile2?symbol={ticker}&token={key}'
-    with requests.get(prof) as r:
-        resp = r.json()
+    resp = get_client(key).get('stock/profile2', symbol=ticker)
 
     try:
         name = resp['name']
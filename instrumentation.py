@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import bisect
+import json
+import time
+import os
+
+
+PROFILE_PATH = 'run_profile.jsonl'
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+_local = threading.local()
+_lock = threading.Lock()
+_spans = []
+_endpoints = {}
+
+
+# ----------------- TIMING SPANS -----------------
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block; spans opened inside it (on the same thread) are recorded as its children
+    ---> recorded name is the '/'-joined path, e.g. 'report/prices/candles'
+
+    :param name
+    :param attrs: extra fields stored with the span
+    :return:
+    """
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    stack.append(name)
+    path = '/'.join(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            _spans.append({
+                'type': 'span',
+                'name': path,
+                'depth': len(stack),
+                'seconds': round(seconds, 6),
+                **attrs
+            })
+
+
+def metric(name, value, **attrs):
+    """
+    Record a single measured value (e.g. a report's size in bytes) alongside the spans
+
+    :param name
+    :param value
+    :param attrs
+    :return:
+    """
+
+    stack = getattr(_local, 'stack', None) or []
+    with _lock:
+        _spans.append({
+            'type': 'metric',
+            'name': '/'.join(stack + [name]),
+            'value': value,
+            **attrs
+        })
+
+
+# ----------------- ENDPOINT COUNTERS -----------------
+def record_call(endpoint, seconds, nbytes=0, retries=0, error=False):
+    """
+    Count one call to an external endpoint
+
+    :param endpoint: e.g. 'finnhub/quote', 'robinhood/news'
+    :param seconds
+    :param nbytes
+    :param retries
+    :param error
+    :return:
+    """
+
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        stats = _endpoints.get(endpoint)
+        if stats is None:
+            stats = _endpoints[endpoint] = {
+                'calls': 0,
+                'errors': 0,
+                'bytes': 0,
+                'retries': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'histogram': [0] * (len(LATENCY_BUCKETS) + 1)
+            }
+        stats['calls'] += 1
+        stats['errors'] += int(error)
+        stats['bytes'] += nbytes
+        stats['retries'] += retries
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['histogram'][bucket] += 1
+
+
+@contextmanager
+def timed_call(endpoint):
+    """
+    Time a call and count it against `endpoint`
+    ---> the caller may set 'bytes' and 'retries' on the yielded dict; an exception counts as an error
+
+    :param endpoint
+    :return:
+    """
+
+    call = {'bytes': 0, 'retries': 0}
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        record_call(endpoint, time.perf_counter() - start, call['bytes'], call['retries'], error=True)
+        raise
+    record_call(endpoint, time.perf_counter() - start, call['bytes'], call['retries'])
+
+
+# ----------------- RUN PROFILE -----------------
+def profile():
+    """
+    Snapshot of every span and endpoint counter recorded so far
+
+    :return:
+    """
+
+    with _lock:
+        return {
+            'spans': [dict(s) for s in _spans],
+            'endpoints': {
+                endpoint: dict(stats, histogram=list(stats['histogram'])) for endpoint, stats in _endpoints.items()
+            }
+        }
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _endpoints.clear()
+
+
+def write_profile(run, path=PROFILE_PATH, clear=True):
+    """
+    Append the run's profile as JSON lines (one header, then one line per span and per endpoint)
+    ---> written in a single append, so concurrent report processes do not interleave lines
+
+    :param run: label of the run, e.g. the user
+    :param path
+    :param clear: reset the counters afterwards
+    :return:
+    """
+
+    snapshot = profile()
+    header = {
+        'type': 'run',
+        'run': run,
+        'time': str(datetime.today()),
+        'pid': os.getpid(),
+        'buckets': LATENCY_BUCKETS
+    }
+    lines = [header] + [
+        dict(s, run=run) for s in snapshot['spans']
+    ] + [
+        dict(stats, type='endpoint', endpoint=endpoint, run=run) for endpoint, stats in snapshot['endpoints'].items()
+    ]
+
+    with open(path, 'a+') as f:
+        f.write(''.join(json.dumps(line) + '\n' for line in lines))
+
+    if clear:
+        reset()
+
+    return snapshot
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from instrumentation import timed_call
+from constants import ROOT
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pandas as pd
+import os
+
+
+STOCK_ORDERS_URL = 'https://api.robinhood.com/orders/'
+CRYPTO_ORDERS_URL = 'https://nummus.robinhood.com/orders/'
+OPTION_ORDERS_URL = 'https://api.robinhood.com/options/orders/'
+
+# Same columns (and order) as robin_stocks' export_completed_*_orders CSVs
+ORDER_COLUMNS = ['symbol', 'date', 'order_type', 'side', 'fees', 'quantity', 'average_price']
+OPTION_COLUMNS = [
+    'chain_symbol', 'expiration_date', 'strike_price', 'option_type', 'side', 'order_created_at', 'direction',
+    'order_quantity', 'order_type', 'opening_strategy', 'closing_strategy', 'price', 'processed_quantity'
+]
+NUMERIC = {
+    'stock': ['fees', 'quantity', 'average_price'],
+    'crypto': ['fees', 'quantity', 'average_price'],
+    'option': ['strike_price', 'order_quantity', 'price', 'processed_quantity']
+}
+
+# Ledger bookkeeping columns: order id, the lookup key its symbol came from, and when the broker last updated it
+KEYS = ['id', 'key', 'updated_at']
+
+
+# ----------------- ORDER ROWS -----------------
+def stock_rows(order, symbol):
+    """
+    Completed rows of a stock order, as export_completed_stock_orders writes them
+    ---> partial executions of a cancelled order, or the whole order once filled
+
+    :param order
+    :param symbol
+    :return:
+    """
+
+    rows = []
+    if order['state'] == 'cancelled' and len(order['executions']) > 0:
+        for partial in order['executions']:
+            rows.append([
+                symbol, partial['timestamp'], order['type'], order['side'],
+                order['fees'], partial['quantity'], partial['price']
+            ])
+
+    if order['state'] == 'filled' and order['cancel'] is None:
+        rows.append([
+            symbol, order['last_transaction_at'], order['type'], order['side'],
+            order['fees'], order['quantity'], order['average_price']
+        ])
+
+    return rows
+
+
+def crypto_rows(order, symbol):
+    """
+    Completed rows of a crypto order, as export_completed_crypto_orders writes them
+
+    :param order
+    :param symbol
+    :return:
+    """
+
+    if order['state'] != 'filled' or order['cancel_url'] is not None:
+        return []
+
+    return [[
+        symbol, order['last_transaction_at'], order['type'], order['side'],
+        order.get('fees', 0.0), order['quantity'], order['average_price']
+    ]]
+
+
+def option_rows(order, instruments):
+    """
+    Completed rows of an option order (one per leg), as export_completed_option_orders writes them
+
+    :param order
+    :param instruments: {option url: option instrument}
+    :return:
+    """
+
+    if order['state'] != 'filled':
+        return []
+
+    rows = []
+    for leg in order['legs']:
+        instrument = instruments[leg['option']]
+        rows.append([
+            order['chain_symbol'], instrument['expiration_date'], instrument['strike_price'], instrument['type'],
+            leg['side'], order['created_at'], order['direction'], order['quantity'], order['type'],
+            order['opening_strategy'], order['closing_strategy'], order['price'], order['processed_quantity']
+        ])
+
+    return rows
+
+
+# ----------------- ORDER LEDGER -----------------
+class OrderLedger:
+    """
+    Locally persisted order history of one user, kept current from the broker's order endpoints
+    ---> orders are paged straight into DataFrames (no export CSVs written to ROOT)
+    ---> each file's schema metadata records a cursor (the latest `updated_at` seen); a sync only asks for
+         orders updated since then, and replaces any order it already holds (e.g. a fill after a partial)
+    ---> instrument / currency pair / option lookups are answered from the ledger before the broker is asked
+
+    :param user
+    :param root
+    """
+
+    def __init__(self, user, root=None):
+        self.user = user
+        self.root = root if root is not None else os.path.join(ROOT, 'Input', 'ledger')
+
+    def path(self, kind):
+        """
+
+        :param kind: 'stock', 'crypto' or 'option'
+        :return:
+        """
+
+        return os.path.join(self.root, self.user, f'{kind}_orders.parquet')
+
+    def read(self, kind):
+        """
+
+        :param kind
+        :return: ledger rows, cursor (an empty frame and None if nothing is stored)
+        """
+
+        columns = KEYS + (OPTION_COLUMNS if kind == 'option' else ORDER_COLUMNS)
+        path = self.path(kind)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns), None
+
+        table = pq.read_table(path)
+        meta = table.schema.metadata or {}
+        cursor = meta.get(b'cursor')
+
+        return table.to_pandas(), None if cursor is None else cursor.decode()
+
+    def write(self, kind, df, cursor):
+        """
+        Atomically replace the stored ledger (write to a temp file, then rename)
+
+        :param kind
+        :param df
+        :param cursor
+        :return:
+        """
+
+        path = self.path(kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        table = pa.Table.from_pandas(
+            df.reset_index(drop=True),
+            preserve_index=False
+        )
+        if cursor is not None:
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                b'cursor': cursor.encode()
+            })
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def sync(self, client):
+        """
+        Fetch orders updated since the last sync and merge them into the ledger
+
+        :param client: robin_stocks.robinhood (or anything exposing the same calls)
+        :return: stock orders, crypto orders, option orders (same layout as the export CSVs)
+        """
+
+        stock = self._sync(client, 'stock', STOCK_ORDERS_URL)
+        crypto = self._sync(client, 'crypto', CRYPTO_ORDERS_URL)
+        option = self._sync(client, 'option', OPTION_ORDERS_URL)
+
+        return stock, crypto, option
+
+    def _sync(self, client, kind, url):
+        ledger, cursor = self.read(kind)
+
+        payload = None if cursor is None else {'updated_at[gte]': cursor}
+        with timed_call(f'robinhood/{kind}_orders'):
+            orders = client.helper.request_get(url, 'pagination', payload)
+
+        # robin_stocks answers [None] when a request fails; keep what is stored rather than a partial history
+        if orders is None or any(order is None for order in orders):
+            print(f'Failed to sync {kind} orders - using stored ledger')
+            return self._export(ledger, kind)
+
+        if len(orders) > 0:
+            rows = self._rows(client, kind, orders, ledger)
+            ledger = pd.concat([
+                ledger.loc[~ledger['id'].isin([order['id'] for order in orders])],
+                rows
+            ])
+            ledger = ledger.sort_values(
+                by=['date' if kind != 'option' else 'order_created_at', 'id']
+            ).reset_index(drop=True)
+            cursor = max([order['updated_at'] for order in orders] + ([cursor] if cursor is not None else []))
+
+            self.write(kind, ledger, cursor)
+
+        return self._export(ledger, kind)
+
+    def _rows(self, client, kind, orders, ledger):
+        # Symbols (or option instruments) already resolved for earlier orders
+        known = dict(zip(ledger['key'], ledger['symbol' if kind != 'option' else 'chain_symbol']))
+
+        rows = []
+        if kind == 'stock':
+            for order in orders:
+                key = order['instrument']
+                if key not in known:
+                    with timed_call('robinhood/instrument'):
+                        known[key] = client.stocks.get_symbol_by_url(key)
+                rows.extend(
+                    [order['id'], key, order['updated_at']] + row for row in stock_rows(order, known[key])
+                )
+
+        elif kind == 'crypto':
+            for order in orders:
+                key = order['currency_pair_id']
+                if key not in known:
+                    with timed_call('robinhood/crypto_pair'):
+                        known[key] = client.crypto.get_crypto_quote_from_id(key, 'symbol')
+                rows.extend(
+                    [order['id'], key, order['updated_at']] + row for row in crypto_rows(order, known[key])
+                )
+
+        else:
+            instruments = {
+                key: {'expiration_date': e, 'strike_price': s, 'type': t}
+                for key, e, s, t in ledger[['key', 'expiration_date', 'strike_price', 'option_type']].values
+            }
+            for order in orders:
+                if order['state'] != 'filled':
+                    continue
+                for leg in order['legs']:
+                    if leg['option'] not in instruments:
+                        with timed_call('robinhood/option_instrument'):
+                            instruments[leg['option']] = client.helper.request_get(leg['option'])
+                rows.extend(
+                    [order['id'], leg['option'], order['updated_at']] + row
+                    for leg, row in zip(order['legs'], option_rows(order, instruments))
+                )
+
+        rows = pd.DataFrame(
+            rows,
+            columns=KEYS + (OPTION_COLUMNS if kind == 'option' else ORDER_COLUMNS)
+        )
+        for column in NUMERIC[kind]:
+            rows[column] = pd.to_numeric(rows[column], errors='coerce')
+        return rows
+
+    @staticmethod
+    def _export(ledger, kind):
+        df = ledger.drop(KEYS, axis=1).reset_index(drop=True)
+        for column in NUMERIC[kind]:
+            df[column] = df[column].astype(float)
+        return df
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from snapshots import SUMMARY
+import numpy as np
+import threading
+import time
+
+
+# Seconds between intraday snapshots
+SNAPSHOT_INTERVAL = 300
+
+
+class MarkToMarket:
+    """
+    Live Cash / Equity / Crypto / Total Portfolio Value of the current positions
+    ---> positions are arrays indexed by symbol (quantity, last price, crypto flag) with running totals
+    ---> a price update changes one slot and adjusts the equity or crypto total by quantity x price change: O(1)
+    ---> totals are recomputed from the arrays at every snapshot, so rounding never accumulates
+    ---> a snapshot of the totals is taken on the first update at or after each `interval`
+
+    :param symbols
+    :param quantities
+    :param prices: last known price of each symbol (NaN if unknown; the position counts once priced)
+    :param crypto: whether each symbol is a crypto position
+    :param cash
+    :param previous: totals at the previous close ({SUMMARY name: value}), for the KPI changes
+    :param interval: seconds between intraday snapshots
+    """
+
+    def __init__(self, symbols, quantities, prices, crypto, cash=0.0, previous=None, interval=SNAPSHOT_INTERVAL):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.quantity = np.asarray(quantities, dtype='float64').copy()
+        self.price = np.asarray(prices, dtype='float64').copy()
+        self.crypto = np.asarray(crypto, dtype=bool).copy()
+        self.cash = float(cash)
+        self.previous = previous
+        self.interval = interval
+        self.snapshots = []
+        self.updated_at = None
+        self._next_snapshot = None
+        self._lock = threading.Lock()
+        self._revalue()
+
+    @classmethod
+    def from_holdings(cls, holdings, previous=None, interval=SNAPSHOT_INTERVAL):
+        """
+        Engine over the report's holdings stage output
+
+        :param holdings: {'tickers': [stocks, etfs, crypto], 'quantities': [...], 'prices': [...], 'cash': ...}
+        :param previous
+        :param interval
+        :return:
+        """
+
+        tickers, quantities, prices = holdings['tickers'], holdings['quantities'], holdings['prices']
+        return cls(
+            sum(tickers, []),
+            sum(quantities, []),
+            sum(prices, []),
+            [False] * (len(tickers[0]) + len(tickers[1])) + [True] * len(tickers[2]),
+            holdings['cash'],
+            previous,
+            interval
+        )
+
+    # ----------------- UPDATES -----------------
+    def update(self, symbol, price, t=None):
+        """
+        New price of one symbol
+
+        :param symbol
+        :param price
+        :param t: unix seconds (now if None)
+        :return:
+        """
+
+        i = self.index.get(symbol)
+        if i is None:
+            return
+
+        with self._lock:
+            old = self.price[i]
+            change = float(self.quantity[i] * (price - (old if old == old else 0.0)))
+            if self.crypto[i]:
+                self.crypto_value += change
+            else:
+                self.equity_value += change
+            self.price[i] = price
+            self._tick(t)
+
+    def trade(self, symbol, quantity, price, crypto=False, t=None):
+        """
+        Change a position (a fill) and pay for it out of cash; an unseen symbol gets a new slot
+
+        :param symbol
+        :param quantity: signed (buys positive)
+        :param price
+        :param crypto
+        :param t
+        :return:
+        """
+
+        with self._lock:
+            if symbol not in self.index:
+                self.index[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+                self.quantity = np.append(self.quantity, 0.0)
+                self.price = np.append(self.price, price)
+                self.crypto = np.append(self.crypto, crypto)
+
+            i = self.index[symbol]
+            self.quantity[i] += quantity
+            self.price[i] = price
+            self.cash -= quantity * price
+            self._revalue()
+            self._tick(t)
+
+    def set_cash(self, cash):
+        with self._lock:
+            self.cash = float(cash)
+
+    def attach(self, stream, symbols=None):
+        """
+        Follow a streaming.QuoteStream: every trade it receives updates the matching position
+
+        :param stream
+        :param symbols: {feed symbol: position symbol} where they differ, e.g. {'BINANCE:BTCUSDT': 'BTC'}
+        :return:
+        """
+
+        symbols = symbols or {}
+        stream.listeners.append(lambda symbol, price, t: self.update(symbols.get(symbol, symbol), price, t))
+        return self
+
+    # ----------------- READS -----------------
+    def values(self):
+        """
+        Current totals
+
+        :return: {SUMMARY name: value}
+        """
+
+        with self._lock:
+            return {
+                'Cash': self.cash,
+                'Total Portfolio Value': self.cash + self.equity_value + self.crypto_value,
+                'Equity Value': self.equity_value,
+                'Crypto Value': self.crypto_value
+            }
+
+    def kpis(self):
+        """
+        The report's KPI numbers (see `kpis`) against the previous close
+
+        :return:
+        """
+
+        return kpis(self.values(), self.previous if self.previous is not None else self.values())
+
+    def intraday(self):
+        """
+        Intraday snapshots so far
+
+        :return: DataFrame indexed by time, one column per SUMMARY total
+        """
+
+        import pandas as pd
+
+        with self._lock:
+            rows = list(self.snapshots)
+        df = pd.DataFrame([row[1:] for row in rows], columns=SUMMARY)
+        df.index = pd.to_datetime([row[0] for row in rows], unit='s')
+        df.index.name = 'time'
+        return df
+
+    def snapshot(self, t=None):
+        """
+        Record the totals now (outside the schedule)
+
+        :param t
+        :return:
+        """
+
+        with self._lock:
+            self._snapshot(t if t is not None else time.time())
+
+    # ----------------- INTERNALS -----------------
+    def _revalue(self):
+        priced = np.nan_to_num(self.quantity * self.price)
+        self.equity_value = float(priced[~self.crypto].sum())
+        self.crypto_value = float(priced[self.crypto].sum())
+
+    def _tick(self, t):
+        t = t if t is not None else time.time()
+        self.updated_at = t
+        if self._next_snapshot is None or t >= self._next_snapshot:
+            self._snapshot(t)
+
+    def _snapshot(self, t):
+        self._revalue()
+        total = self.cash + self.equity_value + self.crypto_value
+        self.snapshots.append((t, self.cash, total, self.equity_value, self.crypto_value))
+        self._next_snapshot = (t // self.interval + 1) * self.interval
+
+
+def kpis(current, previous):
+    """
+    Values and percent changes shown by the report's KPI tiles
+
+    :param current: {SUMMARY name: value} (e.g. the last historical row, or MarkToMarket.values())
+    :param previous: the same at the previous close
+    :return: {SUMMARY name: value, '<name> Change': percent change}
+    """
+
+    changes = {}
+    for name in ['Equity Value', 'Crypto Value', 'Total Portfolio Value']:
+        changes[f'{name} Change'] = (current[name] / previous[name] - 1) * 100 if previous[name] != 0 else 0.0
+
+    return {**{name: current[name] for name in SUMMARY}, **changes}
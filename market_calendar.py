@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from constants import ROOT
+import pandas as pd
+import datetime
+import bisect
+import os
+
+
+# Full-day closures that no holiday rule produces
+SPECIAL_CLOSURES = {
+    datetime.date(1994, 4, 27),     # President Nixon's funeral
+    datetime.date(2001, 9, 11),     # September 11th
+    datetime.date(2001, 9, 12),
+    datetime.date(2001, 9, 13),
+    datetime.date(2001, 9, 14),
+    datetime.date(2004, 6, 11),     # President Reagan's funeral
+    datetime.date(2007, 1, 2),      # President Ford's funeral
+    datetime.date(2012, 10, 29),    # Hurricane Sandy
+    datetime.date(2012, 10, 30),
+    datetime.date(2018, 12, 5),     # President G.H.W. Bush's funeral
+    datetime.date(2025, 1, 9),      # President Carter's funeral
+}
+
+
+# ----------------- HOLIDAY RULES -----------------
+def easter(year):
+    """
+    Gregorian Easter Sunday (anonymous computus)
+
+    :param year
+    :return:
+    """
+
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l_ = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l_) // 451
+    month, day = divmod(h + l_ - 7 * m + 114, 31)
+
+    return datetime.date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """
+    n-th `weekday` (Monday=0) of a month; n=-1 for the last one
+
+    :param year
+    :param month
+    :param weekday
+    :param n
+    :return:
+    """
+
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(date):
+    """
+    Saturday holidays are observed on Friday, Sunday holidays on Monday
+
+    :param date
+    :return:
+    """
+
+    if date.weekday() == 5:
+        return date - datetime.timedelta(days=1)
+    if date.weekday() == 6:
+        return date + datetime.timedelta(days=1)
+    return date
+
+
+def nyse_holidays(year):
+    """
+    NYSE full-day holidays for a year
+
+    :param year
+    :return:
+    """
+
+    holidays = {
+        nth_weekday(year, 2, 0, 3),                         # Washington's Birthday
+        easter(year) - datetime.timedelta(days=2),          # Good Friday
+        nth_weekday(year, 5, 0, -1),                        # Memorial Day
+        observed(datetime.date(year, 7, 4)),                # Independence Day
+        nth_weekday(year, 9, 0, 1),                         # Labor Day
+        nth_weekday(year, 11, 3, 4),                        # Thanksgiving
+        observed(datetime.date(year, 12, 25)),              # Christmas
+    }
+
+    # New Year's Day is not moved back into the previous year when it falls on a Saturday
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(observed(new_year))
+    if year >= 1998:
+        holidays.add(nth_weekday(year, 1, 0, 3))           # Martin Luther King Jr. Day
+    if year >= 2022:
+        holidays.add(observed(datetime.date(year, 6, 19)))  # Juneteenth
+
+    return holidays
+
+
+_holidays = {}
+
+
+def rule_is_open(date):
+    """
+    Whether the NYSE is open on a date, from rules alone
+
+    :param date
+    :return:
+    """
+
+    if date.weekday() >= 5 or date in SPECIAL_CLOSURES:
+        return False
+    if date.year not in _holidays:
+        _holidays[date.year] = nyse_holidays(date.year)
+    return date not in _holidays[date.year]
+
+
+# ----------------- TRADING CALENDAR -----------------
+class TradingCalendar:
+    """
+    NYSE trading calendar backed by Input/market_open.csv
+    ---> days outside the file are computed from the holiday rules and appended (never rewritten)
+    ---> open days are held in a sorted list of ordinals, so lookups are binary searches
+
+    :param path
+    """
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else f'{ROOT}/Input/market_open.csv'
+        self.first = None
+        self.last = None
+        self.opens = []
+        self.closed = set()
+
+        if os.path.exists(self.path):
+            stored = pd.read_csv(self.path)
+            stored['date'] = pd.to_datetime(stored['date'], format='%Y-%m-%d').dt.date
+            stored = stored.drop_duplicates(subset='date', keep='last').sort_values(by='date')
+            if len(stored) > 0:
+                self._index(stored['date'].tolist(), stored['is_open'].astype(str).str.lower().eq('true').tolist())
+
+    def _index(self, dates, is_open):
+        self.opens.extend(d.toordinal() for d, open_ in zip(dates, is_open) if open_)
+        self.opens.sort()
+        self.closed.update(d.toordinal() for d, open_ in zip(dates, is_open) if not open_)
+
+        self.first = dates[0] if self.first is None else min(self.first, dates[0])
+        self.last = dates[-1] if self.last is None else max(self.last, dates[-1])
+
+    def extend(self, start, end):
+        """
+        Cover [start, end], computing and persisting only the days not already known
+
+        :param start
+        :param end
+        :return: the days added
+        """
+
+        if self.first is None:
+            new = pd.date_range(start, end)
+        else:
+            new = pd.date_range(start, self.first - datetime.timedelta(days=1)).append(
+                pd.date_range(self.last + datetime.timedelta(days=1), end)
+            )
+        dates = [d.date() for d in new]
+        if len(dates) == 0:
+            return dates
+
+        is_open = [rule_is_open(d) for d in dates]
+        self._index(dates, is_open)
+        self._append(dates, is_open)
+
+        return dates
+
+    def _append(self, dates, is_open):
+        exists = os.path.exists(self.path)
+        if not exists:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        pd.DataFrame(
+            {'date': dates, 'is_open': is_open}
+        ).to_csv(
+            self.path,
+            mode='a',
+            header=not exists,
+            index=False
+        )
+
+    def is_open(self, date):
+        """
+
+        :param date
+        :return:
+        """
+
+        if self.first is None or not self.first <= date <= self.last:
+            self.extend(min(date, self.first or date), max(date, self.last or date))
+
+        o = date.toordinal()
+        i = bisect.bisect_left(self.opens, o)
+        return i < len(self.opens) and self.opens[i] == o
+
+    def trading_days_between(self, start, end):
+        """
+        Number of open days in [start, end]
+
+        :param start
+        :param end
+        :return:
+        """
+
+        self.extend(min(start, self.first or start), max(end, self.last or end))
+
+        return bisect.bisect_right(self.opens, end.toordinal()) - bisect.bisect_left(self.opens, start.toordinal())
+
+    def trading_days(self, start, end):
+        """
+        Open days in [start, end]
+
+        :param start
+        :param end
+        :return:
+        """
+
+        self.extend(min(start, self.first or start), max(end, self.last or end))
+
+        lo = bisect.bisect_left(self.opens, start.toordinal())
+        hi = bisect.bisect_right(self.opens, end.toordinal())
+        return [datetime.date.fromordinal(o) for o in self.opens[lo:hi]]
+
+    def frame(self, start=None, end=None):
+        """
+        Every covered day as a date / is_open DataFrame (the market_open.csv layout)
+
+        :param start
+        :param end
+        :return:
+        """
+
+        start = self.first if start is None else start
+        end = self.last if end is None else end
+        if start is None:
+            return pd.DataFrame(columns=['date', 'is_open'])
+
+        self.extend(min(start, self.first or start), max(end, self.last or end))
+
+        dates = [d.date() for d in pd.date_range(start, end)]
+        open_ = set(self.trading_days(start, end))
+        return pd.DataFrame(
+            [[d, d in open_] for d in dates],
+            columns=['date', 'is_open']
+        )
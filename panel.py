@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+import pandas as pd
+import numpy as np
+
+
+class PricePanel:
+    """
+    Daily closes of many symbols as one dates x symbols float64 matrix
+    ---> rows are sorted unique dates, columns follow insertion order; a missing close is NaN
+    ---> closes are placed by date (never by position), so later listings and trading-day gaps stay aligned
+    ---> `column`, `select` (contiguous symbols) and `between` return views into the same matrix
+
+    :param dates
+    :param symbols
+    :param values: matrix of closes (all NaN if not given)
+    """
+
+    def __init__(self, dates=(), symbols=(), values=None):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.symbols = list(symbols)
+        self._columns = {symbol: i for i, symbol in enumerate(self.symbols)}
+        if values is None:
+            values = np.full((len(self.dates), len(self.symbols)), np.nan)
+        self.values = np.asarray(values, dtype='float64')
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, symbol):
+        return symbol in self._columns
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # ----------------- CONSTRUCTION -----------------
+    @classmethod
+    def from_series(cls, series):
+        """
+        Panel from per-symbol closes, allocated once over the union of their dates
+
+        :param series: {symbol: (dates, closes)}; None for a symbol with no data leaves its column empty
+        :return:
+        """
+
+        dates = [np.asarray(s[0], dtype='datetime64[D]') for s in series.values() if s is not None]
+        panel = cls(
+            np.unique(np.concatenate(dates)) if len(dates) > 0 else [],
+            series.keys()
+        )
+        for symbol, s in series.items():
+            if s is not None:
+                panel.insert(symbol, *s)
+
+        return panel
+
+    @classmethod
+    def from_candles(cls, candles_):
+        """
+        Panel of daily closes from Finnhub-shaped candle frames (what `finnhub.candles` returns)
+
+        :param candles_: {symbol: candle DataFrame, or None}
+        :return:
+        """
+
+        return cls.from_series({
+            symbol: None if c is None or 't' not in c else (
+                pd.to_datetime(c['t'], unit='s').values.astype('datetime64[D]'),
+                c['c'].values
+            )
+            for symbol, c in candles_.items()
+        })
+
+    @classmethod
+    def from_store(cls, store, symbols, type_, resolution='D', f=None, t=None):
+        """
+        Panel from whatever the candle store already holds (no network)
+
+        :param store: candle_store.CandleStore
+        :param symbols: {panel symbol: store symbol}, e.g. {'BTC': 'BINANCE:BTCUSDT'}
+        :param type_
+        :param resolution
+        :param f: unix start (everything cached if None)
+        :param t: unix end
+        :return:
+        """
+
+        candles_ = {}
+        for symbol, stored in symbols.items():
+            cached, _, _ = store.read(stored, type_, resolution)
+            if cached is not None:
+                cached = cached.loc[
+                    (cached['t'] >= (f if f is not None else cached['t'].min()))
+                    & (cached['t'] <= (t if t is not None else cached['t'].max()))
+                ]
+            candles_[symbol] = cached
+
+        return cls.from_candles(candles_)
+
+    def to_candles(self, symbol):
+        """
+        One column back in the candle layout (unix 't', close 'c'), without its missing days
+
+        :param symbol
+        :return:
+        """
+
+        closes = self.column(symbol)
+        present = ~np.isnan(closes)
+        return pd.DataFrame({
+            't': self.dates[present].astype('datetime64[s]').astype('int64'),
+            'c': closes[present]
+        })
+
+    # ----------------- UPDATES -----------------
+    def insert(self, symbol, dates, closes):
+        """
+        Place closes at their dates; unseen dates are merged into the index and unseen symbols appended
+
+        :param symbol
+        :param dates
+        :param closes
+        :return:
+        """
+
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        closes = np.asarray(closes, dtype='float64')
+
+        new_dates = np.setdiff1d(dates, self.dates)
+        if len(new_dates) > 0:
+            union = np.union1d(self.dates, new_dates)
+            values = np.full((len(union), len(self.symbols)), np.nan)
+            values[np.searchsorted(union, self.dates)] = self.values
+            self.dates, self.values = union, values
+
+        if symbol not in self._columns:
+            self._columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.values = np.hstack([self.values, np.full((len(self.dates), 1), np.nan)])
+
+        self.values[np.searchsorted(self.dates, dates), self._columns[symbol]] = closes
+        return self
+
+    def ffill(self):
+        """
+        Carry each symbol's last close forward over its missing days (in place)
+
+        :return:
+        """
+
+        rows = np.where(
+            np.isnan(self.values),
+            0,
+            np.arange(len(self.dates))[:, None]
+        )
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        self.values[:] = self.values[rows, np.arange(len(self.symbols))]
+        return self
+
+    # ----------------- ACCESS -----------------
+    def column(self, symbol):
+        """
+        Closes of one symbol (a view)
+
+        :param symbol
+        :return:
+        """
+
+        return self.values[:, self._columns[symbol]]
+
+    def select(self, symbols):
+        """
+        Sub-panel of `symbols`; a view when they are adjacent and in order (e.g. all equities, then all crypto)
+
+        :param symbols
+        :return:
+        """
+
+        index = [self._columns[symbol] for symbol in symbols]
+        if len(index) > 0 and index == list(range(index[0], index[0] + len(index))):
+            values = self.values[:, index[0]:index[0] + len(index)]
+        else:
+            values = self.values[:, index]
+
+        return PricePanel(self.dates, symbols, values)
+
+    def between(self, start, end):
+        """
+        Rows from `start` to `end` inclusive (a view)
+
+        :param start
+        :param end
+        :return:
+        """
+
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return PricePanel(self.dates[lo:hi], self.symbols, self.values[lo:hi])
+
+    def last(self):
+        """
+        Latest close of every symbol
+
+        :return:
+        """
+
+        return pd.Series(
+            self.values[-1] if len(self.dates) > 0 else np.nan,
+            index=self.symbols
+        )
+
+    def frame(self):
+        """
+        DataFrame over the same matrix, indexed by datetime.date like the rest of the pipeline
+
+        :return:
+        """
+
+        return pd.DataFrame(
+            self.values,
+            index=pd.Index(self.dates.astype(object), name='date'),
+            columns=self.symbols,
+            copy=False
+        )
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Command-line entry point.
+
+        python -m portfolio_analysis report --user iain                 # one report (or --all, via run_reports)
+        python -m portfolio_analysis report --user iain --fresh         # ... ignoring today's checkpoints
+        python -m portfolio_analysis login --user iain                  # store a Robinhood token (MFA once)
+        python -m portfolio_analysis quote AAPL MSFT                    # latest quotes
+        python -m portfolio_analysis watch AAPL BINANCE:BTCUSDT         # streamed quotes, refreshed from memory
+        python -m portfolio_analysis backfill AAPL --crypto BTC         # warm the candle store
+        python -m portfolio_analysis backfill --user iain --years 5     # ... for everything a user has traded
+
+    Only the standard library is imported up front; each subcommand imports what it needs, so quote and
+    backfill jobs never load plotly, datapane or altair (see benchmarks/startup.py).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import sys
+
+
+SECRETS_PATH = 'secrets.json'
+
+
+# ----------------- HELPERS -----------------
+def finnhub_key(args):
+    """
+    API key from --key, else from secrets.json; registers a client for --finnhub-url if one is given
+
+    :param args
+    :return:
+    """
+
+    key = args.key
+    if key is None:
+        with open(args.secrets) as s:
+            key = json.loads(s.read())['finnhub']
+
+    if args.finnhub_url is not None:
+        import finnhub
+
+        finnhub._clients[key] = finnhub.FinnhubClient(key, base_url=args.finnhub_url)
+
+    return key
+
+
+# ----------------- SUBCOMMANDS -----------------
+def cmd_quote(args):
+    from finnhub import quotes
+
+    status = 0
+    for ticker, q, error in quotes(finnhub_key(args), args.tickers):
+        if error is not None:
+            print(f'{ticker:<8} N/A ({error})')
+            status = 1
+            continue
+        close, delta, delta_pct = q[:3]
+        print(f'{ticker:<8} {close:>12.2f} {delta:>+10.2f} {delta_pct:>+8.2f}%')
+
+    return status
+
+
+def cmd_watch(args):
+    from streaming import QuoteStream
+    import time
+
+    key = finnhub_key(args)
+    stream = QuoteStream(key, args.tickers, url=args.feed_url)
+    if not args.no_seed:
+        stream.seed()
+
+    # ---> after seeding, every refresh is served from the stream's memory
+    refreshes = 0
+    try:
+        with stream:
+            while args.count is None or refreshes < args.count:
+                time.sleep(args.every)
+                refreshes += 1
+                print(time.strftime('%H:%M:%S'), f'({stream.trades} trades)')
+                for ticker, q, error in stream.quotes(args.tickers):
+                    if error is not None:
+                        print(f'  {ticker:<20} N/A')
+                        continue
+                    close, delta, delta_pct = q[:3]
+                    print(f'  {ticker:<20} {close:>12.2f} {delta:>+10.2f} {delta_pct:>+8.2f}%')
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def cmd_backfill(args):
+    from finnhub import candles, candle_chunks, get_client, CALLS_PER_MINUTE, CHUNK_WORKERS
+    import candle_store
+    import datetime
+
+    key = finnhub_key(args)
+    workers = max(1, args.workers)
+
+    # ---> each symbol downloads up to CHUNK_WORKERS chunks at once; the shared pool holds a connection for each
+    get_client(key, pool_size=workers * CHUNK_WORKERS)
+    if args.store is not None:
+        candle_store._store = candle_store.CandleStore(args.store)
+
+    stocks, crypto = list(args.symbols), list(args.crypto)
+    if args.user is not None:
+        from ledger import OrderLedger
+
+        ledger = OrderLedger(args.user)
+        stocks += ledger.read('stock')[0]['symbol'].unique().tolist()
+        crypto += ledger.read('crypto')[0]['symbol'].unique().tolist()
+
+    jobs = [(symbol, symbol, 'stock') for symbol in dict.fromkeys(stocks)]
+    if len(crypto) > 0:
+        from supported_crypto import get_catalog
+
+        catalog = get_catalog(key)
+        for code in dict.fromkeys(crypto):
+            pair = catalog.best_pair(code)
+            if pair is None:
+                print(f'{code:<8} no Finnhub pair')
+                continue
+            jobs.append((code, pair, 'crypto'))
+
+    # ---> upper bound on the work (ranges the store already covers are not requested), paced by the rate limit
+    t = int(datetime.datetime.now().timestamp())
+    f = t - int(args.years * 365 * 86400)
+    requests = sum(len(candle_chunks(f, t, args.resolution, type_=type_)) for _, _, type_ in jobs)
+    print(f'{len(jobs)} symbols, at most {requests} requests (~{requests / CALLS_PER_MINUTE:.1f} min)')
+
+    def fetch(job):
+        symbol, ticker, type_ = job
+        gaps = []
+        try:
+            df = candles(key, ticker, years=args.years, resolution=args.resolution, type_=type_, gaps=gaps)
+        except Exception as e:
+            return symbol, ticker, None, gaps, e
+        return symbol, ticker, 0 if df is None else len(df), gaps, None
+
+    def stamp(ts):
+        return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')
+
+    status = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        for symbol, ticker, bars, gaps, error in pool.map(fetch, jobs):
+            if error is not None:
+                print(f'{symbol:<8} {ticker:<20} ERROR ({error})')
+                status = 1
+            else:
+                print(f'{symbol:<8} {ticker:<20} {bars:>8} bars')
+            for gap in gaps:
+                print(f"{'':<8} {'':<20} gap {stamp(gap['from'])} -> {stamp(gap['to'])} ({gap['reason']})")
+
+    if args.compact:
+        print(f'compacted ({candle_store.get_store().compact()} files removed)')
+
+    return status
+
+
+def cmd_login(args):
+    from robinhood import login
+
+    with open(args.secrets) as s:
+        username, password = json.loads(s.read())['robinhood'][args.user].values()
+
+    # ---> prompts for MFA / challenge codes if Robinhood asks, so unattended runs can refresh afterwards
+    info = login(username, password, interactive=True)
+    print(f"{args.user}: {info['detail']} (expires in {info['expires_in'] / 3600:.1f}h)")
+    return 0
+
+
+def cmd_report(args):
+    from report import generate_report, load_users
+
+    users = load_users()['short_name'].tolist() if args.all else args.user
+    if len(users) == 0:
+        print('No users given (use --user or --all)')
+        return 2
+
+    if len(users) == 1:
+        status = generate_report(users[0], resume=not args.fresh)
+        return 0 if status == 'COMPLETE' else 1
+
+    from functools import partial
+    from runner import run_reports
+
+    summary = run_reports(
+        users, partial(generate_report, resume=not args.fresh), max_workers=args.workers, timeout=args.timeout
+    )
+    for user, (status, error, seconds, *_) in summary.items():
+        print(f"{user}'s Report: {status} ({seconds}s)" + ('' if error is None else f' {error}'))
+
+    return 0 if all(result[0] == 'COMPLETE' for result in summary.values()) else 1
+
+
+# ----------------- PARSER -----------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog='portfolio_analysis', description='End of day portfolio analysis')
+    parser.add_argument('--secrets', default=SECRETS_PATH)
+    parser.add_argument('--key', default=None, help='Finnhub API key (default: from the secrets file)')
+    parser.add_argument('--finnhub-url', default=None, help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help='build and upload reports')
+    report.add_argument('--user', action='append', default=[], help='short name from users.csv (repeatable)')
+    report.add_argument('--all', action='store_true', help='every user in users.csv')
+    report.add_argument('--workers', type=int, default=4)
+    report.add_argument('--timeout', type=int, default=900)
+    report.add_argument('--fresh', action='store_true', help="ignore today's checkpoints and rebuild from scratch")
+    report.set_defaults(run=cmd_report)
+
+    login = commands.add_parser('login', help='store a Robinhood token (answering MFA once, from a terminal)')
+    login.add_argument('--user', required=True, help='short name from users.csv')
+    login.set_defaults(run=cmd_login)
+
+    quote = commands.add_parser('quote', help='print latest quotes')
+    quote.add_argument('tickers', nargs='+')
+    quote.set_defaults(run=cmd_quote)
+
+    watch = commands.add_parser('watch', help='stream live trades and print quotes from memory')
+    watch.add_argument('tickers', nargs='+', help="Finnhub symbols, e.g. AAPL or BINANCE:BTCUSDT")
+    watch.add_argument('--every', type=float, default=5, help='seconds between refreshes')
+    watch.add_argument('--count', type=int, default=None, help='stop after this many refreshes')
+    watch.add_argument('--no-seed', action='store_true', help='skip the start-up quotes / candles (REST)')
+    watch.add_argument('--feed-url', default=None, help=argparse.SUPPRESS)
+    watch.set_defaults(run=cmd_watch)
+
+    backfill = commands.add_parser('backfill', help='download candles into the local candle store')
+    backfill.add_argument('symbols', nargs='*', help='stock / ETF tickers')
+    backfill.add_argument('--crypto', nargs='*', default=[], help='Robinhood crypto codes, e.g. BTC')
+    backfill.add_argument('--user', default=None, help="add every symbol in the user's order ledger")
+    backfill.add_argument('--years', type=float, default=1)
+    backfill.add_argument('--resolution', default='D')
+    backfill.add_argument('--workers', type=int, default=4)
+    backfill.add_argument('--store', default=None, help='candle store directory (default: ROOT/Input/candles)')
+    backfill.add_argument('--compact', action='store_true')
+    backfill.set_defaults(run=cmd_backfill)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
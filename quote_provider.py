@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from instrumentation import timed_call
+import threading
+import time
+
+
+# Seconds a quote is reused before it is fetched again
+QUOTE_TTL = 15
+
+STOCK, CRYPTO = 'stock', 'crypto'
+
+# Sources tried in order for each kind of asset (ETFs are quoted as stocks)
+# ---> crypto positions are Robinhood coin codes valued at Robinhood's mark, so Robinhood goes first
+SOURCES = {
+    STOCK: ['finnhub', 'robinhood'],
+    CRYPTO: ['robinhood', 'finnhub']
+}
+
+QUOTES_BY_ID_URL = 'https://api.robinhood.com/marketdata/quotes/'
+QUOTE_BATCH_SIZE = 50
+
+
+class QuoteProvider:
+    """
+    One place every module gets prices from: equities, ETFs and crypto
+    ---> quotes come back in Finnhub's shape, [c, d, dp, h, l, o, pc, t], whichever source served them
+    ---> each source is tried in turn (SOURCES) until one has the symbol, e.g. Robinhood when Finnhub fails
+    ---> results are memoised for `ttl` seconds, so the report's code paths share one lookup per symbol
+    ---> concurrent requests for the same symbol are coalesced: the first caller fetches, the rest wait for
+         its result instead of sending their own
+    ---> Robinhood quotes by instrument id (news related instruments) are memoised the same way, and also
+         fill the symbol's stock quote
+
+    :param key: Finnhub API key (None: Finnhub is skipped)
+    :param client: robin_stocks.robinhood, once logged in (None: Robinhood is skipped)
+    :param ttl
+    """
+
+    def __init__(self, key=None, client=None, ttl=QUOTE_TTL):
+        self.key = key
+        self.client = client
+        self.ttl = ttl
+        self.requests = {}
+        self.hits = 0
+        self.coalesced = 0
+        self._cache = {}
+        self._inflight = {}
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ----------------- QUOTES -----------------
+    def quote(self, symbol, kind=STOCK):
+        """
+        Latest quote of one symbol
+
+        :param symbol: ticker, or Robinhood coin code for crypto
+        :param kind: STOCK or CRYPTO
+        :return: [c, d, dp, h, l, o, pc, t]; raises the last source's error if none has a quote
+        """
+
+        return self._memo([(kind, symbol)], lambda keys: {keys[0]: self._fetch(symbol, kind)})[(kind, symbol)]
+
+    def quotes(self, symbols, kind=STOCK, max_workers=8):
+        """
+        Quotes of several symbols on a bounded thread pool
+
+        :param symbols
+        :param kind
+        :param max_workers
+        :return: [(symbol, quote, error)] in input order; a failed symbol has quote None
+        """
+
+        def fetch(symbol):
+            try:
+                return symbol, self.quote(symbol, kind), None
+            except Exception as e:
+                return symbol, None, e
+
+        symbols = list(symbols)
+        if len(symbols) == 0:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as pool:
+            return list(pool.map(fetch, symbols))
+
+    def quotes_by_ids(self, ids, batch_size=QUOTE_BATCH_SIZE):
+        """
+        Robinhood quotes by instrument id; ids not already memoised or in flight go out in bulk requests
+
+        :param ids
+        :param batch_size
+        :return: {instrument id: Robinhood quote}; ids the broker does not recognise are left out
+        """
+
+        def fetch(keys):
+            ids_ = [id_ for _, id_ in keys]
+            quotes = {}
+            for i in range(0, len(ids_), batch_size):
+                batch = ids_[i:i + batch_size]
+                with timed_call('robinhood/quotes'):
+                    results = self.client.helper.request_get(QUOTES_BY_ID_URL, 'results', {'ids': ','.join(batch)})
+                self._count('robinhood')
+                for id_, q in zip(batch, results or []):
+                    if q is not None:
+                        quotes[('id', id_)] = q
+                        self._prime((STOCK, q['symbol']), from_robinhood(q))
+            return quotes
+
+        found = self._memo([('id', id_) for id_ in ids], fetch)
+        return {id_: q for (_, id_), q in found.items() if q is not None}
+
+    # ----------------- CANDLES -----------------
+    def candles(self, symbol, years=1, resolution='D', type_=STOCK, cache=True):
+        """
+        finnhub.candles, memoised and coalesced like quotes
+        ---> each caller gets its own copy of the memoised frame, so converting or adding columns is safe
+
+        :param symbol: ticker, or Finnhub pair for crypto
+        :param years: float, or (from, to) dates
+        :param resolution
+        :param type_
+        :param cache: False bypasses the candle store
+        :return:
+        """
+
+        from finnhub import candles
+
+        key = ('candles', type_, symbol, resolution, years, cache)
+        df = self._memo([key], lambda keys: {key: candles(self.key, symbol, years, resolution, type_, cache)})[key]
+        return df.copy() if df is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    # ----------------- SOURCES -----------------
+    def _fetch(self, symbol, kind):
+        error = ValueError(f'No quote source available for {symbol}')
+        for source in SOURCES[kind]:
+            if (source == 'finnhub' and self.key is None) or (source == 'robinhood' and self.client is None):
+                continue
+            try:
+                self._count(source)
+                return getattr(self, f'_{source}_{kind}')(symbol)
+            except Exception as e:
+                error = e
+
+        raise error
+
+    def _finnhub_stock(self, symbol):
+        from finnhub import quote
+
+        q = quote(self.key, symbol)
+        if q[1] is None:
+            raise ValueError(f'No quote available for {symbol}')
+        return q
+
+    def _finnhub_crypto(self, code):
+        from supported_crypto import get_catalog
+        from finnhub import candles
+
+        # ---> Finnhub has no crypto quote endpoint: the last two daily bars of the coin's best pair
+        pair = get_catalog(self.key).best_pair(code)
+        if pair is None:
+            raise ValueError(f'No Finnhub pair for {code}')
+        df = candles(self.key, pair, years=5 / 365, type_='crypto', cache=False)
+        if df is None or len(df) < 2:
+            raise ValueError(f'No quote available for {code}')
+
+        c, pc = float(df['c'].iloc[-1]), float(df['c'].iloc[-2])
+        return [
+            c, c - pc, (c / pc - 1) * 100,
+            float(df['h'].iloc[-1]), float(df['l'].iloc[-1]), float(df['o'].iloc[-1]),
+            pc, int(df['t'].iloc[-1])
+        ]
+
+    def _robinhood_stock(self, symbol):
+        with timed_call('robinhood/quotes'):
+            results = self.client.stocks.get_quotes(symbol)
+        if not results or results[0] is None:
+            raise ValueError(f'No quote available for {symbol}')
+        return from_robinhood(results[0])
+
+    def _robinhood_crypto(self, code):
+        with timed_call('robinhood/crypto_quote'):
+            q = self.client.crypto.get_crypto_quote(code)
+        c = float(q['mark_price'])
+
+        # ---> a coin has no close: its change is over the last 24 hours, from the open price
+        pc = float(q['open_price']) if q.get('open_price') else c
+        return [
+            c, c - pc, (c / pc - 1) * 100,
+            float(q.get('high_price') or c), float(q.get('low_price') or c), pc,
+            pc, int(time.time())
+        ]
+
+    # ----------------- INTERNALS -----------------
+    def _memo(self, keys, fetch):
+        """
+        Memoised, coalesced lookup of several keys
+
+        :param keys
+        :param fetch: function(keys missing from the memo) -> {key: value}; missing keys memoise None
+        :return: {key: value}
+        """
+
+        now = time.monotonic()
+        values, waiting, owned = {}, {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                hit = self._cache.get(key)
+                if hit is not None and hit[0] > now:
+                    values[key] = hit[1]
+                    self.hits += 1
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.coalesced += 1
+                else:
+                    self._inflight[key] = Future()
+                    owned.append(key)
+
+        if len(owned) > 0:
+            fetched, error = {}, None
+            try:
+                fetched = fetch(owned)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # ---> every owned future is resolved and dropped, however fetch exits, so no waiter hangs
+                # ---> (an interrupt reaches waiters as a RuntimeError rather than a KeyboardInterrupt of their own)
+                if error is not None and not isinstance(error, Exception):
+                    error = RuntimeError(f'Quote request interrupted ({type(error).__name__})')
+                expires = time.monotonic() + self.ttl
+                with self._lock:
+                    for key in owned:
+                        future = self._inflight.pop(key)
+                        if error is not None:
+                            future.set_exception(error)
+                            continue
+                        values[key] = fetched.get(key)
+                        self._store(key, expires, values[key])
+                        future.set_result(values[key])
+
+        for key, future in waiting.items():
+            values[key] = future.result()
+
+        return values
+
+    def _prime(self, key, value):
+        with self._lock:
+            if key not in self._inflight:
+                self._store(key, time.monotonic() + self.ttl, value)
+
+    def _store(self, key, expires, value):
+        """
+        Memoise one value (lock held); expired entries are swept at most once per `ttl`, so a long session's
+        memo holds only what was fetched in roughly the last two TTLs
+
+        :param key
+        :param expires
+        :param value
+        :return:
+        """
+
+        now = time.monotonic()
+        if now >= self._swept + self.ttl:
+            self._cache = {k: hit for k, hit in self._cache.items() if hit[0] > now}
+            self._swept = now
+        self._cache[key] = (expires, value)
+
+    def _count(self, source):
+        with self._lock:
+            self.requests[source] = self.requests.get(source, 0) + 1
+
+
+def from_robinhood(q):
+    """
+    Robinhood stock quote in Finnhub's shape
+
+    :param q: {'last_trade_price', 'previous_close', ...}
+    :return:
+    """
+
+    c, pc = float(q['last_trade_price']), float(q['previous_close'])
+    return [c, c - pc, (c / pc - 1) * 100, None, None, None, pc, int(time.time())]
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider(key=None, client=None):
+    """
+    Shared provider (created on first use); a key or client passed in is used from then on
+
+    :param key
+    :param client
+    :return:
+    """
+
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = QuoteProvider(key, client)
+        if key is not None:
+            _provider.key = key
+        if client is not None:
+            _provider.client = client
+        return _provider
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+import pandas as pd
+import numpy as np
+
+
+# ----------------- SIGNED DELTAS -----------------
+def transaction_deltas(transactions):
+    """
+    Signed position and cash change of every transaction
+    ---> columns are positional, as in the order exports: symbol, date, type, direction, fees, quantity, price
+    ---> buys/sells move the symbol's quantity and (if an order type is set) cash
+    ---> transfers, withdrawals and cash referrals (symbol 'Cash') only move cash
+    ---> stock referrals have an empty order type, so they add shares without costing cash
+
+    :param transactions
+    :return: DataFrame of date, symbol, quantity delta, cash delta
+    """
+
+    symbol = transactions.iloc[:, 0].values
+    date = transactions.iloc[:, 1].values
+    type_ = transactions.iloc[:, 2]
+    direction = transactions.iloc[:, 3].values
+    quantity = transactions.iloc[:, 5].astype(float).values
+    price = transactions.iloc[:, 6].astype(float).values
+
+    is_cash = symbol == 'Cash'
+    notional = quantity * price
+
+    quantity_delta = np.where(
+        is_cash,
+        0.0,
+        quantity * np.where(direction == 'sell', -1.0, 1.0)
+    )
+    cash_delta = np.where(
+        is_cash,
+        notional * np.where(direction == 'withdraw', -1.0, 1.0),
+        np.where(
+            (type_ != '').values,
+            notional * np.where(direction == 'buy', -1.0, 1.0),
+            0.0
+        )
+    )
+
+    return pd.DataFrame({
+        'date': date,
+        'symbol': symbol,
+        'quantity': quantity_delta,
+        'cash': cash_delta
+    })
+
+
+# ----------------- HOLDINGS REPLAY -----------------
+def replay(transactions, start=None, present=None):
+    """
+    Daily holdings of every symbol (and 'Cash') from `start` to `present`
+    ---> one cumulative sum over a (date x symbol) pivot of signed deltas
+    ---> same output as `replay_loop`, without filtering the transactions once per calendar day
+
+    :param transactions: cleaned transactions, sorted by date (datetime.date values)
+    :param start
+    :param present
+    :return: DataFrame indexed by calendar day, one column per symbol in order of first appearance
+    """
+
+    if start is None:
+        start = transactions.iloc[0, 1]
+    if present is None:
+        present = transactions.iloc[:, 1].max()
+
+    symbols = transactions.iloc[:, 0].unique().tolist()
+    if 'Cash' not in symbols:
+        symbols.append('Cash')
+    days = pd.date_range(start, present)
+
+    deltas = transaction_deltas(transactions)
+    deltas['date'] = pd.to_datetime(deltas['date'])
+    positions = deltas.loc[
+        deltas['symbol'] != 'Cash', ['date', 'symbol', 'quantity']
+    ]
+    cash = deltas.groupby('date')['cash'].sum()
+
+    historical_weights = positions.groupby(
+        ['date', 'symbol']
+    )['quantity'].sum().unstack().reindex(
+        index=days,
+        columns=symbols
+    )
+    historical_weights['Cash'] = cash.reindex(days)
+    historical_weights = historical_weights.fillna(0.0).cumsum()
+    historical_weights.columns.name = None
+
+    return historical_weights
+
+
+def replay_loop(transactions, start, present):
+    """
+    Reference day-by-day replay (the original reverse_engineer loop), kept for parity checks
+
+    :param transactions
+    :param start
+    :param present
+    :return:
+    """
+
+    symbols = transactions.symbol.unique().tolist()
+
+    portfolio_weights = []
+    w = {
+        symbol: 0.0 for symbol in symbols
+    }
+    w['Cash'] = 0.0
+
+    for date in pd.date_range(start, present):
+        result = transactions.loc[transactions['date'] == date.date()]
+        if len(result) != 0:
+            for r in result.values:
+                symbol, d, type_, direction, fees, quantity, price = r
+                if symbol == 'Cash':
+                    w['Cash'] += quantity * price * (-1 if direction == 'withdraw' else 1)
+                else:
+                    w[symbol] += quantity * (-1 if direction == 'sell' else 1)
+                    if type_ != '':
+                        w['Cash'] += quantity * price * (-1 if direction == 'buy' else 1)
+
+        portfolio_weights.append(list(w.values()))
+
+    return pd.DataFrame(
+        portfolio_weights,
+        columns=list(w.keys()),
+        index=pd.date_range(start, present)
+    )
+
+
+def check_parity(transactions, start=None, present=None, rtol=1e-9, atol=1e-6):
+    """
+    Compare `replay` against `replay_loop` on the same transactions
+
+    :param transactions
+    :param start
+    :param present
+    :param rtol
+    :param atol
+    :return: True if both produce the same holdings (within floating point tolerance)
+    """
+
+    if start is None:
+        start = transactions.iloc[0, 1]
+    if present is None:
+        present = transactions.iloc[:, 1].max()
+
+    fast = replay(transactions, start, present)
+    slow = replay_loop(transactions, start, present)
+
+    return (
+        list(fast.columns) == list(slow.columns)
+        and fast.index.equals(slow.index)
+        and np.allclose(fast.values, slow.values, rtol=rtol, atol=atol)
+    )
@@ -0,0 +1,1126 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    The end of day report pipeline (moved out of portfolio_analysis.ipynb so it can run without Jupyter).
+"""
+
+from robinhood import login, load_portfolio, portfolio_news, gather_news, render_news
+from mark_to_market import MarkToMarket, SNAPSHOT_INTERVAL, kpis
+from checkpoints import CheckpointStore, CHECKPOINTED, retry
+from instrumentation import span, metric, write_profile
+from charts import tile_data, tiles_script, VEGA_SCRIPTS
+from risk import returns_matrix, risk_metrics
+from errors import ErrorHandler, get_error_info
+from market_calendar import TradingCalendar
+from supported_crypto import get_catalog
+from snapshots import SnapshotStore, SUMMARY
+from quote_provider import get_provider
+from ledger import OrderLedger
+from panel import PricePanel
+from constants import ROOT
+import robin_stocks as rs
+import datapane as dp
+import altair as alt
+import pandas as pd
+import webbrowser
+import requests
+import datetime
+import json
+import os
+
+
+SECRETS_PATH = 'secrets.json'
+USERS_PATH = 'users.csv'
+
+# Stages that call Robinhood (the others only need Finnhub / Datapane, so a resumed run may skip the login)
+ROBINHOOD_STAGES = {'transactions', 'holdings', 'valuation', 'news'}
+
+# Errors worth another attempt of the stage that raised them
+NETWORK_ERRORS = (requests.exceptions.RequestException, ConnectionError, TimeoutError)
+STAGE_ATTEMPTS = 3
+STAGE_BACKOFF = 2.0
+
+# Holdings tiles (emitted once per report by `holdings_html`)
+HOLDINGS_CSS = """
+            h3 {
+                font-family: sans-serif;
+            }
+            .grid-container {
+                display: grid;
+                grid-template-columns: auto auto auto;
+                border-top: 0px solid black;
+                border-left: 0px solid black;
+            }
+            .grid-container > div {
+                border-bottom: 0px;
+                border-right: 0px;
+            }
+            .chart {
+                display: block;
+                margin: 0 auto;
+            }
+            .symbol {
+                font-size: 20px;
+                font-weight: bold;
+                color: #000000;
+                padding: 15px 0;
+                float: right;
+                text-align: center;
+            }
+            .shares_num {
+                font-size: 12px;
+                color: #36454F;
+            }
+            .shares_word {
+                font-size: 10px;
+                color: #36454F;
+            }
+            .error {
+                color: red;
+            }
+            .change_up {
+                font-size: 17px;
+                font-weight: bold;
+                color: darkgreen;
+                padding: 20px 0;
+                float: left;
+            }
+            .change_down {
+                font-size: 17px;
+                font-weight: bold;
+                color: darkred;
+                padding: 20px 0;
+                float: left;
+            }
+"""
+
+_secrets = None
+_users = None
+_sp500 = None
+
+
+# ----------------- CONFIGURATION -----------------
+def load_secrets(path=SECRETS_PATH):
+    """
+    Robinhood, Finnhub and Datapane credentials (read once, on first use)
+
+    :param path
+    :return:
+    """
+
+    global _secrets
+    if _secrets is None:
+        with open(path) as s:
+            _secrets = json.loads(s.read())
+    return _secrets
+
+
+def load_users(path=USERS_PATH):
+    """
+
+    :param path
+    :return:
+    """
+
+    global _users
+    if _users is None:
+        _users = pd.read_csv(path)
+    return _users
+
+
+def finnhub_key():
+    return load_secrets()['finnhub']
+
+
+def benchmark():
+    """
+    S&P 500 closes (dated, so holdings are aligned to it by day rather than by position)
+
+    :return:
+    """
+
+    global _sp500
+    if _sp500 is None:
+        import pandas_datareader as pdr
+
+        _sp500 = pdr.get_data_yahoo('^GSPC')['Close']
+    return _sp500
+
+
+# ----------------- HOLDINGS OVERVIEW -----------------
+def intraday_prices(symbols, equity, stream=None):
+    """
+    Last few days of minute candles for each holding
+    ---> last few days only, so the candle store covers it without re-downloading a year of bars
+    ---> served from memory for symbols a streaming.QuoteStream is subscribed to (no REST calls)
+    ---> otherwise through the shared quote provider, so a symbol's candles are requested once per run
+    ---> coins no exchange lists are left without candles (None)
+
+    :param: symbols
+    :param: equity
+    :param: stream: streaming.QuoteStream, or None
+    :return: {symbol: candles, or None}
+    """
+
+    pairs = {
+        symbol: symbol if equity else get_catalog(finnhub_key()).best_pair(symbol) for symbol in symbols
+    }
+
+    provider = get_provider(finnhub_key())
+
+    return {
+        symbol: stream.candles(pair) if stream is not None and len(stream.bars.get(pair, ())) > 0 else provider.candles(
+            pair, 
+            years=5 / 365,
+            resolution='1',
+            type_='stock' if equity else 'crypto'
+        ) if pair is not None else None
+        for symbol, pair in pairs.items()
+    }
+
+
+def security_grouping(symbol, shares, id_, equity, prices=None):
+    """
+    :param: symbol
+    :param: shares
+    :param: id_
+    :param: equity
+    :param: prices: intraday candles (fetched if None; a tile without any has an empty chart)
+    
+    :return: tile markup, chart data for `tiles_script`
+    """
+    
+    # ----- Symbol and Shares -----
+    info_content = f"""
+        <p class='symbol'>
+            {symbol}<br>
+            <span class='shares_num'>{shares} </span><span class='shares_word'>shares</span>
+        </p>
+    """.strip()
+    
+    # -----  Intraday Chart  -----
+    if prices is None:
+        prices = intraday_prices([symbol], equity)[symbol]
+    if prices is None or len(prices) == 0:
+        chart = tile_data(id_, [], [], 'gray')
+        change_content = """
+        <p class='change_up'>
+            -
+        </p>
+    """.strip()
+    else:
+        prices = prices[-480:].reset_index(drop=True)
+
+        begin, end = prices.iloc[0]['c'], prices.iloc[-1]['c']
+        change = 'darkgreen' if end > begin else 'darkred'
+        delta = (end / begin - 1) * 100
+        chart = tile_data(id_, prices['t'], prices['c'], change)
+
+        # -----  Intraday Change -----
+        change_content = f"""
+        <p class='change_{'up' if delta >= 0.0 else 'down'}'>
+            {round(delta,  2)}%
+        </p>
+    """.strip()
+    
+    return f"""
+        <div>
+            {info_content}
+        </div>
+        <div id="vis{id_}" class="chart"></div>
+        <div>
+            {change_content}
+        </div>
+    """.strip(), chart
+
+
+def security_html(symbols, quantities, id_, equity=True, prices=None):
+    """
+    
+    :param: symbols
+    :param: quantities
+    :param: id_
+    :param: equity
+    :param: prices: {symbol: intraday candles} (fetched if None)
+    :return: grid markup, chart data of its tiles
+    """
+    
+    if prices is None:
+        prices = intraday_prices(symbols, equity)
+    groups = list(map(
+        lambda s, q, i: security_grouping(s, q, i, equity, prices.get(s)),
+        symbols, quantities, id_
+    ))
+    html = """
+        <div class='grid-container'>
+        """ + '\n'.join(markup for markup, _ in groups) + """
+        </div>
+    """.strip()
+
+    return html, [chart for _, chart in groups]
+
+
+def holdings_html(sections, prices):
+    """
+    Every holdings section as one document: the stylesheet, the Vega scripts and the chart template are
+    included once, and each tile is a few lines of markup plus a data record
+
+    :param: sections: [(title, symbols, quantities, equity)]
+    :param: prices: {symbol: intraday candles}
+    :return:
+    """
+    
+    body, tiles = [], []
+    for title, symbols, quantities, equity in sections:
+        if len(symbols) == 0:
+            continue
+        # ---> ids keep counting across sections, since they now share one page
+        grid, charts = security_html(
+            symbols, quantities, range(len(tiles) + 1, len(tiles) + len(symbols) + 1), equity=equity, prices=prices
+        )
+        body.append(f"<h3>{title}</h3>\n{grid}")
+        tiles.extend(charts)
+
+    return dp.HTML(
+        """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style type='text/css'>""" + HOLDINGS_CSS + """</style>
+        """ + VEGA_SCRIPTS + """
+    </head>
+    <body>
+        """ + '\n'.join(body) + """
+        """ + tiles_script(tiles) + """
+    </body>
+    </html>
+    """.strip()
+    )
+
+
+# ----------------- PORTFOLIO HISTORICAL -----------------
+def get_referrals(client):
+    """
+    
+    :param: client
+    :return:
+    """
+    
+    referrals = client.account.get_referrals()
+    
+    # Stock Referrals
+    referral_stock = pd.concat(
+        [pd.DataFrame(referral['reward']['stocks']) for referral in referrals]
+    )
+    referral_stock = pd.DataFrame(
+        [
+            [s[2], s[10], '', 'buy', 0.0, s[3], s[4]]
+            for s in referral_stock.values
+        ]
+    )
+    
+    # Cash Referrals
+    referral_cash = pd.concat(
+        [pd.DataFrame(referral['reward']['cash']) for referral in referrals]
+    )
+    referral_cash = pd.DataFrame(
+        [
+            ['Cash', s[10], '', 'deposit', 0.0, 1.0, s[4]]
+            for s in referral_cash.values
+        ]
+    )
+    
+    return referral_stock, referral_cash
+
+
+def get_portfolio_transactions(client, user):
+    """
+    
+    :param: client
+    :param: user
+    :return:
+    """
+    
+    # SYNC ALL TRADES
+    # ---> paged straight from the order endpoints into the user's ledger (Input/ledger/<user>)
+    # ---> only orders updated since the last run are downloaded
+    stock_orders, crypto_orders, option_orders = OrderLedger(user).sync(client)
+
+    return stock_orders, crypto_orders, option_orders
+
+
+def historical_prices(equity_symbols, crypto_symbols, start, present):
+    """
+    
+    :param: equity_symbols
+    :param: crypto_symbols
+    :param: start
+    :param: present
+    :return:
+    """
+    
+    # Finnhub pair for each Robinhood crypto code (coins no exchange lists are left without prices)
+    crypto_pairs = {
+        symbol: get_catalog(finnhub_key()).best_pair(symbol) for symbol in crypto_symbols
+    }
+    
+    # Query Historical Prices
+    # ---> placed by date in one panel (equities, then crypto), so symbols listed later or with gaps stay aligned
+    historical_prices = PricePanel.from_candles({
+        **{
+            symbol: get_provider(finnhub_key()).candles(
+                symbol, 
+                years=(start, present),
+                type_='stock'
+            )
+            for symbol in equity_symbols
+        },
+        **{
+            symbol: get_provider(finnhub_key()).candles(
+                pair, 
+                years=(start - datetime.timedelta(days=1), present),
+                type_='crypto'
+            )
+            for symbol, pair in crypto_pairs.items() if pair is not None
+        }
+    })
+
+    return historical_prices
+
+
+def reverse_engineer(client, user, trades, equity_symbols, crypto_symbols, referrals):
+    """
+    
+    :param: client
+    :param: user
+    :param: trades
+    :param: equity_symbols
+    :param: crypto_symbols
+    :param: referrals
+    :return:
+    """
+    # LOAD AND CLEAN ALL TRANSFERS
+    transfers = pd.DataFrame(
+        client.account.get_bank_transfers()
+    )
+    transfers = transfers.apply(
+        lambda x: pd.Series(
+            ['Cash', x[15], None, x[7], x[9], 1, x[6]]
+        ),
+        axis=1
+    )
+    transfers.columns = trades.columns
+    
+    # CONCATENATE AND CLEAN ALL TRANSACTIONS
+    transactions = pd.concat(
+        [trades, transfers]
+    )
+    transactions['date'] = pd.to_datetime(
+        pd.Series(transactions['date'].str[:10]),
+        format='%Y-%m-%d'
+    ).dt.date
+    transactions = transactions.sort_values(
+        by='date', 
+        ascending=True
+    ).reset_index(drop=True)
+    transactions['fees'] = transactions['fees'].astype(float)
+    transactions['quantity'] = transactions['quantity'].astype(float)
+    transactions['average_price'] = transactions['average_price'].astype(float)
+    
+    # REVERSE ENGINEER PORTFOLIO VALUE
+    # Present Date
+    present = datetime.date.today()
+    
+    # Open Market Days (NYSE rules, cached in Input/market_open.csv)
+    open_days = TradingCalendar().trading_days
+    
+    # Extend the user's snapshot with the days since the last run
+    # ---> only newer transactions are replayed and only newer prices downloaded
+    # ---> rebuilt from the start after a back-dated transaction or a split (revised closes)
+    values, rebuilt = SnapshotStore().update(
+        user,
+        transactions,
+        lambda start_, present_: historical_prices(equity_symbols, crypto_symbols, start_, present_).frame(),
+        open_days,
+        equity_symbols,
+        crypto_symbols,
+        present
+    )
+    if rebuilt is not None:
+        print(f"      Rebuilt Portfolio History ({rebuilt})")
+
+    return values
+
+
+def portfolio_kpis(historical, live=None):
+    """
+    
+    :param: historical
+    :param: live: mark_to_market.MarkToMarket; its current totals replace the last historical day
+    :return:
+    """
+    
+    numbers = live.kpis() if live is not None else kpis(historical.iloc[-1], historical.iloc[-2])
+    cash_t1, equity_t1, crypto_t1, total_t1 = [
+        numbers[name] for name in ['Cash', 'Equity Value', 'Crypto Value', 'Total Portfolio Value']
+    ]
+    
+    equity_delta = numbers['Equity Value Change']
+    crypto_delta = numbers['Crypto Value Change']
+    total_delta = numbers['Total Portfolio Value Change']
+    
+    # Portfolio Value
+    value = """
+        <html>
+            <style>
+                .header {
+                    font-size: 18px;
+                }
+                .big_number {
+                    font-size: 24px;
+                    font-weight: bold;
+                }
+                .delta {
+                    font-size: 16px;
+                    color: """ + ('darkgreen;' if total_delta >= 0.0 else 'darkred;') + """
+                }
+            </style>
+            <p class='header' align='center'>
+                Total Portfolio Value <br />
+                <span class='big_number'>$""" + str(round(total_t1, 2)) + """</span>
+                <span class='delta'>""" + str(round(total_delta, 2)) + """%</span>
+            </p>
+        </html>
+    """.strip()
+    value = dp.HTML(value)
+    
+    # Breakdown of Cash, Equity, Crypto
+    cash_bn = dp.BigNumber(
+        heading='Cash',
+        value=f"${round(cash_t1, 2)}"
+    )
+    equity_bn = dp.BigNumber(
+        heading='Equity Value',
+        value=f"${round(equity_t1, 2)}",
+        change=f"{round(equity_delta, 2)}%",
+        is_upward_change=True if equity_delta >= 0.0 else False
+    )
+    crypto_bn = dp.BigNumber(
+        heading='Crypto Value',
+        value=f"${round(crypto_t1, 2)}",
+        change=f"{round(crypto_delta, 2)}%",
+        is_upward_change=True if crypto_delta >= 0.0 else False
+    )
+    breakdown = dp.Group(
+        blocks=[
+            cash_bn,
+            equity_bn,
+            crypto_bn
+        ],
+        columns=3
+    )
+    
+    # Overall Portfolio Plot
+    historical['date'] = pd.to_datetime(
+        historical['date']
+    )
+    alt_chart = alt.Chart(
+        historical
+    ).mark_area(
+        line={'color': 'darkgreen'},
+        color=alt.Gradient(
+            gradient='linear',
+            stops=[
+                alt.GradientStop(color='white', offset=0),
+                alt.GradientStop(color='darkgreen', offset=1)
+            ]
+        )
+    ).encode(
+        x=alt.X(
+            "date:T",
+            axis=alt.Axis(
+                title="Date",
+                format=('%b %Y'),
+                labelAngle=-60,
+                tickCount={"interval": "month", "step": 1}
+            )
+        ),
+        y=alt.Y(
+            'Total Portfolio Value',
+            axis=alt.Axis(
+                title="Total Portfolio Value ($)"
+            )
+        )
+    ).configure_axis(
+        grid=False
+    )
+    overall_plot = dp.Plot(
+        alt_chart
+    )
+    
+    # Breakdown Portfolio Plot
+#     breakdown_plot = dp.Plot(
+    
+#     )
+    
+    return dp.Group(
+        blocks=[
+            value,
+            breakdown,
+            overall_plot
+#             breakdown_plot
+        ]
+    )
+
+
+def live_portfolio(holdings, values, stream=None, interval=SNAPSHOT_INTERVAL):
+    """
+    Mark-to-market totals of the current holdings, compared against the last close in `values`
+    ---> attached to a streaming.QuoteStream, every trade keeps the totals and KPIs current
+         (crypto positions follow their Finnhub pair; coins no exchange lists keep their last price)
+
+    :param: holdings: holdings stage output
+    :param: values: historical portfolio value (reverse_engineer)
+    :param: stream
+    :param: interval: seconds between intraday snapshots
+    :return:
+    """
+    today = datetime.date.today()
+    closes = values.loc[[date < today for date in values.index]]
+    previous = closes.iloc[-1][SUMMARY].to_dict() if len(closes) > 0 else None
+
+    live = MarkToMarket.from_holdings(holdings, previous, interval)
+    if stream is not None:
+        pairs = {code: get_catalog(finnhub_key()).best_pair(code) for code in holdings['tickers'][2]}
+        live.attach(
+            stream,
+            {pair: code for code, pair in pairs.items() if pair is not None}
+        )
+
+    return live
+
+
+# ----------------- PORTFOLIO NEWS -----------------
+def get_portfolio_news(client, tickers):
+    """
+    
+    :param: client
+    :param: tickers
+    :return: 
+    """
+    # ---> fetched concurrently, deduplicated across tickers and already sorted newest first
+    news, _ = portfolio_news(client, tickers)
+    
+    return news
+
+
+# ----------------- PORTFOLIO ANALYTICS -----------------
+def risk_prices(tickers, years=5):
+    """
+    One date-aligned price panel of all holdings
+    ---> crypto priced from the catalog's best Finnhub pair for each code
+
+    :param: tickers
+    :param: years
+    :return:
+    """
+    stock_symbols, etf_symbols, crypto_symbols = tickers
+
+    pairs = {
+        **{symbol: symbol for symbol in stock_symbols + etf_symbols},
+        **{symbol: get_catalog(finnhub_key()).best_pair(symbol) for symbol in crypto_symbols}
+    }
+    prices = PricePanel.from_candles({
+        symbol: get_provider(finnhub_key()).candles(
+            pair, 
+            years=years,
+            type_='stock' if symbol not in crypto_symbols else 'crypto'
+        )
+        for symbol, pair in pairs.items() if pair is not None
+    })
+
+    return prices
+
+
+def portfolio_risk(sp500, tickers, quantities, years=5, prices=None):
+    """
+    
+    :param: sp500
+    :param: tickers
+    :param: quantities
+    :param: years
+    :param: prices: output of `risk_prices` (fetched if None)
+    :return:
+    """
+    stock_symbols, etf_symbols, crypto_symbols = tickers
+    
+    # One Date-Aligned Price Panel of all Holdings
+    if prices is None:
+        prices = risk_prices(tickers, years)
+    
+    # Betas, Volatility, Correlation, VaR/CVaR in one Pass over the Aligned Returns Matrix
+    # ---> the panel is a checkpointed stage's output, so it is read, not filled in place
+    market_value = prices.frame().ffill().iloc[-1] * pd.Series(
+        dict(zip(stock_symbols + etf_symbols + crypto_symbols, sum(quantities, [])))
+    )
+    holdings, correlation, portfolio = risk_metrics(
+        returns_matrix(prices.frame(), sp500),
+        market_value
+    )
+    
+    # Portfolio Risk
+    confidence = round(portfolio['confidence'] * 100)
+    summary = dp.Group(
+        blocks=[
+            dp.BigNumber(
+                heading='Portfolio Beta',
+                value=f"{round(portfolio['beta'], 2)}"
+            ),
+            dp.BigNumber(
+                heading='Annualized Volatility',
+                value=f"{round(portfolio['volatility'] * 100, 2)}%",
+                change=f"S&P 500: {round(portfolio['benchmark_volatility'] * 100, 2)}%",
+                is_upward_change=portfolio['volatility'] <= portfolio['benchmark_volatility']
+            ),
+            dp.BigNumber(
+                heading=f'1-Day VaR ({confidence}%)',
+                value=f"${round(portfolio['var'] * portfolio['market_value'], 2)}",
+                change=f"{round(portfolio['var'] * 100, 2)}%",
+                is_upward_change=False
+            ),
+            dp.BigNumber(
+                heading=f'1-Day CVaR ({confidence}%)',
+                value=f"${round(portfolio['cvar'] * portfolio['market_value'], 2)}",
+                change=f"{round(portfolio['cvar'] * 100, 2)}%",
+                is_upward_change=False
+            )
+        ],
+        columns=4
+    )
+    window = portfolio['window']
+    note = dp.Text(
+        f"Portfolio risk over the {portfolio['days']} trading days every priced holding has returns"
+        + (f" ({window[0]:%Y-%m-%d} to {window[1]:%Y-%m-%d})" if window is not None else "")
+        + (f"; not enough history: {', '.join(portfolio['unpriced'])}" if len(portfolio['unpriced']) > 0 else "")
+        + "."
+    )
+    
+    # Individual Holdings
+    table = holdings.sort_values(
+        by='weight', 
+        ascending=False
+    )
+    table['weight'] = (table['weight'] * 100).round(2)
+    table['beta'] = table['beta'].round(2)
+    table['volatility'] = (table['volatility'] * 100).round(2)
+    table.columns = ['Weight (%)', 'Beta', 'Annualized Volatility (%)']
+    
+    # Correlation Heatmap (largest 25 positions)
+    largest = table.index[:25].tolist()
+    heatmap = correlation.loc[largest, largest].rename_axis('x').reset_index().melt(
+        id_vars='x', 
+        var_name='y', 
+        value_name='correlation'
+    )
+    alt_chart = alt.Chart(
+        heatmap
+    ).mark_rect().encode(
+        x=alt.X('x:N', sort=largest, title=None),
+        y=alt.Y('y:N', sort=largest, title=None),
+        color=alt.Color(
+            'correlation:Q', 
+            scale=alt.Scale(scheme='redyellowgreen', domain=[-1, 1])
+        ),
+        tooltip=['x', 'y', alt.Tooltip('correlation:Q', format='.2f')]
+    )
+    
+    return dp.Group(
+        blocks=[
+            summary,
+            note,
+            dp.Table(table),
+            dp.Plot(alt_chart)
+        ],
+        label='Analysis'
+    )
+
+
+# ----------------- GENERATE REPORTS -----------------
+def build_header(user):
+    """
+    
+    :param: user
+    :return:
+    """
+    
+    return dp.HTML(
+        """
+        <html>
+            <style type='text/css'>
+                @keyframes rotate {
+                    0%   {color: #0BDA51;}
+                    15%  {color: #32CD32;}
+                    30%  {color: #4CBB17;}
+                    60%  {color: #008000;}
+                    75%  {color: #4CBB17;}
+                    90%  {color: #32CD32;}
+                    100% {color: #0BDA51;}
+                }
+                h1 {
+                    color: #0BDA51;
+                    animation-name: rotate;
+                    animation-duration: 4s;
+                    animation-iteration-count: infinite;
+                }
+            </style>
+            <h1>Portfolio Analysis</h1>
+            <b>User:</b> """ + user + """<br><br>
+            <b>Generated:</b> """ + datetime.date.today().strftime('%A, %B %d, %Y') + """
+        </html>
+        """.strip()
+    )
+
+
+def upload_report(r, user, attempts=4, backoff=5.0):
+    """
+    
+    :param: r
+    :param: user
+    :param: attempts: uploads tried before giving up (Datapane HTTP errors back off 5s, 10s, 20s, ...)
+    :param: backoff
+    :return:
+    """
+    # Local copy first: kept even if the upload fails, and its size is the report-size metric
+    path = f'{ROOT}/Portfolio-Analysis.html'
+    r.save(
+        path=path
+    )
+    size = os.path.getsize(path)
+    metric('report_bytes', size)
+    print(f"      Report Size: {size / 1024:,.0f} KB")
+
+    def upload():
+        try:
+            r.upload(
+                name='Portfolio Analysis', 
+                open=False
+            )
+        except requests.exceptions.HTTPError:
+            print(
+                ErrorHandler("Report Upload Error; retrying.", *get_error_info(), user)
+            )
+            raise
+
+    retry(
+        upload, 
+        attempts=attempts, 
+        backoff=backoff, 
+        retry_on=(requests.exceptions.HTTPError,)
+    )
+        
+    webbrowser.open(
+        r.web_url
+    )
+
+    return r.web_url
+
+
+# ----------------- REPORT STAGES -----------------
+# Each stage returns plain data (frames, lists, dicts) so its output can be checkpointed;
+# only `stage_render` builds Datapane blocks
+def stage_transactions(client, user):
+    """
+    Every order in the user's ledger, and referral rewards in the same layout
+
+    :param: client
+    :param: user
+    :return:
+    """
+    stocks, crypto, options = get_portfolio_transactions(client, user)
+
+    referral_stock, referral_cash = get_referrals(client)
+    referrals = pd.concat(
+        [referral_stock, referral_cash]
+    )
+    referrals.columns = stocks.columns
+
+    return {
+        'stocks': stocks,
+        'crypto': crypto,
+        'options': options,
+        'referrals': referrals
+    }
+
+
+def stage_holdings(client):
+    """
+    Open positions, their quantities and the account's cash / market value
+
+    :param: client
+    :return:
+    """
+    tickers, data, profile = load_portfolio(client)
+    stock_open, etf_open, crypto_open = data
+
+    # ---> Intermediate Crypto Quote Lookup (marks, through the shared quote provider)
+    crypto_quotes = []
+    for symbol, q, error in get_provider(finnhub_key(), client).quotes(tickers[2], kind='crypto'):
+        if error is not None:
+            raise error
+        crypto_quotes.append(q[0])
+    crypto_quantities = crypto_open.quantity_available.astype(float).tolist()
+
+    mkt_value, prev_mkt_value = profile['market_value'], profile['last_core_market_value']
+    mkt_value, prev_mkt_value = float(mkt_value), float(prev_mkt_value)
+    cash = float(profile['withdrawable_amount'])
+
+    holdings = {
+        'tickers': [list(t) for t in tickers],
+        'quantities': [
+            stock_open.quantity.astype(float).tolist(),
+            etf_open.quantity.astype(float).tolist(),
+            crypto_quantities
+        ],
+        'prices': [
+            stock_open.price.astype(float).tolist(),
+            etf_open.price.astype(float).tolist(),
+            crypto_quotes
+        ],
+        'start': profile['start_date'],
+        'delta_pct': mkt_value / prev_mkt_value - 1,
+        'cash': cash
+    }
+
+    # ---> marked to market from the positions themselves (equities at their holdings price, crypto at its mark)
+    holdings['portfolio_value'] = MarkToMarket.from_holdings(holdings).values()['Total Portfolio Value']
+
+    return holdings
+
+
+def stage_prices(holdings, stream=None):
+    """
+    Finnhub prices the report needs: intraday candles for the tiles, daily closes for the risk tab
+
+    :param: holdings
+    :param: stream: streaming.QuoteStream to take intraday candles from, if one is running
+    :return:
+    """
+    stock_symbols, etf_symbols, crypto_symbols = holdings['tickers']
+
+    return {
+        'intraday': {
+            **intraday_prices(stock_symbols + etf_symbols, equity=True, stream=stream),
+            **intraday_prices(crypto_symbols, equity=False, stream=stream)
+        },
+        'risk': risk_prices(holdings['tickers']),
+        'benchmark': benchmark()
+    }
+
+
+def stage_valuation(client, user, transactions):
+    """
+    Daily portfolio value since the first transaction (extends the user's snapshot)
+
+    :param: client
+    :param: user
+    :param: transactions
+    :return:
+    """
+    stocks, crypto, referrals = transactions['stocks'], transactions['crypto'], transactions['referrals']
+    trades = pd.concat(
+        [stocks, crypto, referrals]
+    )
+
+    return reverse_engineer(
+        client, 
+        user,
+        trades, 
+        stocks.symbol.unique().tolist(), 
+        crypto.symbol.unique().tolist(), 
+        referrals
+    )
+
+
+def stage_render(name, holdings, prices, values, news, live=None):
+    """
+    Datapane report from the outputs of the earlier stages (no network)
+
+    :param: name
+    :param: holdings
+    :param: prices
+    :param: values
+    :param: news: articles and related quotes from `gather_news`
+    :param: live: MarkToMarket for live KPIs (see `live_portfolio`)
+    :return:
+    """
+    stock_symbols, etf_symbols, crypto_symbols = holdings['tickers']
+    stock_quantities, etf_quantities, crypto_quantities = holdings['quantities']
+
+    # ---------- PORTFOLIO SUMMARY ----------
+    # ---> Individual Securities
+    with span('tiles'):
+        tiles = holdings_html(
+            [
+                ('Equities', stock_symbols, stock_quantities, True),
+                ('Exchange Traded Funds', etf_symbols, etf_quantities, True),
+                ('Cryptocurrencies', crypto_symbols, crypto_quantities, False)
+            ],
+            prices['intraday']
+        )
+
+    # ---> Overall Portfolio
+    with span('kpis'):
+        portfolio_group = portfolio_kpis(
+            values.reset_index(),
+            live
+        )
+    
+    summary = dp.Group(
+        blocks=[
+            tiles,
+            portfolio_group
+        ],
+        columns=2,
+        label='Overview'
+    )
+
+    # ----------   PORTFOLIO NEWS  ----------
+    articles, quotes = news
+    news = dp.Group(
+        blocks=[] if articles is None else render_news(articles, quotes)[0],
+        columns=1,
+        label='News'
+    )
+
+    # ---------- PORTFOLIO ANALYSIS ---------
+    with span('analysis'):
+        analysis = portfolio_risk(
+            prices['benchmark'],
+            holdings['tickers'],
+            holdings['quantities'],
+            prices=prices['risk']
+        )
+
+    # ----------   MISCELLAENOUS   ----------
+    header = build_header(name)
+    credits = dp.Text(
+        "Report built by Iain Muir."
+    )
+
+    # BUILD REPORT
+    return dp.Report(
+        blocks=[
+            header,
+            dp.Divider(),
+            dp.Select(
+                blocks=[
+                    summary, news, analysis
+                ],
+                type=dp.SelectType.TABS,
+                label='main_select'
+            ),
+            dp.Divider(),
+            credits
+        ]
+    )
+
+
+def generate_report(user, resume=True, stream=None):
+    """
+    Build and upload one user's report, stage by stage
+    ---> each stage's output is checkpointed (Input/checkpoints/<user>/<date>), so a rerun on the same day
+         resumes from the first incomplete stage instead of repeating finished network work
+    ---> transient network errors are retried within the stage that raised them
+    ---> Robinhood is only logged into when a remaining stage needs it
+
+    :param: user
+    :param: resume: False discards today's checkpoints and starts over
+    :param: stream: streaming.QuoteStream of the holdings (tiles are then drawn from its minute bars)
+    :return: "COMPLETE", or "LOGIN FAILED" if Robinhood refused the stored session
+    """
+
+    users = load_users()
+    user_info = users.loc[users.short_name == user]
+    name, _, email = user_info.values[0]
+    
+    print(f"---------- Generating {name.title()}'s Report ----------\n")
+
+    checkpoints = CheckpointStore(user)
+    if not resume:
+        checkpoints.clear()
+    checkpoints.prune()
+
+    pending = checkpoints.pending()
+    if len(pending) == 0:
+        print("   Report already uploaded today (resume=False to rebuild)")
+        return "COMPLETE"
+    if pending[0] != CHECKPOINTED[0]:
+        print(f"   Resuming from '{pending[0]}'")
+
+    def stage(name_, fn, attempts=STAGE_ATTEMPTS):
+        with span(name_):
+            return checkpoints.run(name_, fn, attempts=attempts, backoff=STAGE_BACKOFF, retry_on=NETWORK_ERRORS)
+    
+    # ---------- ROBINHOOD AUTHENTICATION ----------
+    client = rs.robinhood
+    if len(set(pending) & ROBINHOOD_STAGES) > 0:
+        with span('auth'):
+            username, password = load_secrets()['robinhood'][user].values()
+        
+            # ---> stored token when fresh, else its refresh token; never prompts for MFA in a batch run
+            try:
+                login(
+                    username, 
+                    password,
+                    interactive=False
+                )
+            except:
+                print('Failed Robinhood Authentication - Exiting...')
+                write_profile(user)
+                return "LOGIN FAILED"
+    
+        print("   1. Successful Robinhood Authentication")
+    
+    # GET PORTFOLIO TRANSACTIONS
+    # ---> all transactions on account
+    transactions = stage('transactions', lambda: stage_transactions(client, user))
+    
+    # BUILD HOLDINGS
+    # ---> only open positions
+    holdings = stage('holdings', lambda: stage_holdings(client))
+    print("   2. Built Holdings and Retrieved Historical Transactions")
+
+    # HISTORICAL PRICES
+    prices = stage('prices', lambda: stage_prices(holdings, stream))
+
+    # Reverse Engineer Historical Portfolio Value
+    values = stage('valuation', lambda: stage_valuation(client, user, transactions))
+    print("   3. Completed Portfolio Summary")
+    
+    # ----------   PORTFOLIO NEWS  ----------
+    news = stage('news', lambda: gather_news(client, holdings['tickers'][0]))
+    print("   4. Aggregated Portfolio News")
+    
+    # ---------- BUILD REPORT ---------
+    # ---> with a stream running, the KPI tiles show live mark-to-market totals against the last close
+    live = live_portfolio(holdings, values, stream) if stream is not None else None
+    report = stage('render', lambda: stage_render(name, holdings, prices, values, news, live))
+    print("   5. Succesfully Build Datapane Report\n\n")
+    
+    # REPORT UPLOAD
+    # ---> upload_report backs off on Datapane errors itself
+    stage('upload', lambda: upload_report(report, user), attempts=1)
+
+    # ---> quotes served from the shared provider's memo / coalesced with a request already in flight
+    provider = get_provider()
+    metric('quotes/memoised', provider.hits)
+    metric('quotes/coalesced', provider.coalesced)
+
+    # ---> per-stage timings and API-call counters, appended next to run_log.txt
+    write_profile(user)
+
+    return "COMPLETE"
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+import pandas as pd
+import numpy as np
+
+
+BENCHMARK = 'Benchmark'
+TRADING_DAYS = 252
+CONFIDENCE = 0.95
+
+# Fewest returns (or shared returns, for a pair) a statistic is computed from
+MIN_PERIODS = 20
+
+
+# ----------------- RETURNS MATRIX -----------------
+def returns_matrix(prices, benchmark):
+    """
+    Daily log returns of every holding and the benchmark, aligned by date on the benchmark's trading days
+    ---> closes are carried forward across days a symbol did not trade (e.g. crypto closes on weekends are
+         folded into the next trading day); days before a symbol's first close have no return (NaN)
+
+    :param prices: daily closes indexed by date, one column per symbol
+    :param benchmark: daily closes of the benchmark indexed by date
+    :return: DataFrame indexed by date, one column per symbol, then BENCHMARK
+    """
+
+    prices = prices.copy()
+    prices.index = pd.to_datetime(prices.index).normalize()
+    benchmark = benchmark.copy()
+    benchmark.index = pd.to_datetime(benchmark.index).normalize()
+
+    closes = pd.concat(
+        [prices, benchmark.rename(BENCHMARK)],
+        axis=1
+    ).sort_index()
+    closes = closes.loc[~closes.index.duplicated(keep='last')]
+    closes = closes.ffill().reindex(benchmark.index.unique())
+
+    return np.log(closes / closes.shift()).iloc[1:]
+
+
+# ----------------- RISK METRICS -----------------
+def risk_metrics(returns, market_value, confidence=CONFIDENCE, periods=TRADING_DAYS, min_periods=MIN_PERIODS):
+    """
+    Betas, volatilities, correlations, portfolio volatility and historical VaR / CVaR from one returns matrix
+    ---> a missing return (before a symbol listed or first closed, or a hole in the data) is left out, never
+         counted as no change
+    ---> per holding: volatility over the days it has returns; beta and correlations over the days both
+         series have returns (pairwise); fewer than `min_periods` shared days gives NaN
+    ---> portfolio volatility and VaR / CVaR need every position's return on the same day, so they use the
+         common window of the priced holdings and the benchmark, which is recorded ('window', 'days');
+         holdings with fewer than `min_periods` returns are left out of it and listed ('unpriced')
+    ---> portfolio beta is weighted over the holdings that have a beta (weights renormalised among them)
+    ---> VaR and CVaR are one-day, historical, on simple portfolio returns
+
+    :param returns: output of `returns_matrix`
+    :param market_value: {symbol: market value} (or a Series) of the current holdings
+    :param confidence
+    :param periods: return periods per year, for annualizing
+    :param min_periods
+    :return: holdings (weight, beta, volatility per symbol), correlation, portfolio summary
+    """
+
+    symbols = [c for c in returns.columns if c != BENCHMARK]
+    R = returns[symbols + [BENCHMARK]]
+    X = R.values
+    valid = ~np.isnan(X)
+    count = valid.sum(axis=0)
+
+    # Volatility of each column over its own returns; correlation over each pair's shared days
+    sd = np.where(count >= min_periods, R.std().values, np.nan)
+    corr = R.corr(min_periods=min_periods).values
+
+    # Betas: covariance with the benchmark over the days both have returns, over the benchmark's variance then
+    both = valid & valid[:, [-1]]
+    shared = both.sum(axis=0)
+    x = np.where(both, X, 0.0)
+    b = np.where(both, X[:, [-1]], 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean, b_mean = x.sum(axis=0) / shared, b.sum(axis=0) / shared
+        cov_b = ((x - x_mean) * (b - b_mean) * both).sum(axis=0) / (shared - 1)
+        var_b = ((b - b_mean) ** 2 * both).sum(axis=0) / (shared - 1)
+        betas = np.where(shared >= min_periods, cov_b / var_b, np.nan)
+
+    # Weights by market value
+    value = pd.Series(market_value, dtype=float).reindex(symbols).fillna(0.0).values
+    total = value.sum()
+    w = value / total if total != 0 else np.zeros(len(symbols))
+
+    # Common window of the priced holdings (and the benchmark)
+    held = np.flatnonzero((w != 0) & (count[:-1] >= min_periods))
+    unpriced = [symbols[i] for i in np.flatnonzero((w != 0) & (count[:-1] < min_periods))]
+    rows = valid[:, np.append(held, len(symbols))].all(axis=1)
+    window = returns.index[rows]
+
+    # Portfolio beta over the holdings with enough days shared with the benchmark
+    rated = held[np.isfinite(betas[held])]
+    beta = w[rated] @ betas[rated] / w[rated].sum() if w[rated].sum() != 0 else np.nan
+
+    # Portfolio volatility (w'Σw) and historical VaR / CVaR of the daily portfolio return, on that window
+    if rows.sum() >= 2:
+        common = X[rows][:, held]
+        cov = np.atleast_2d(np.cov(common, rowvar=False))
+        portfolio_returns = np.expm1(common) @ w[held]
+        cutoff = np.quantile(portfolio_returns, 1 - confidence)
+        tail = portfolio_returns[portfolio_returns <= cutoff]
+        volatility, var, cvar = np.sqrt(w[held] @ cov @ w[held] * periods), -cutoff, -tail.mean()
+    else:
+        volatility = var = cvar = np.nan
+
+    holdings = pd.DataFrame(
+        {
+            'weight': w,
+            'beta': betas[:-1],
+            'volatility': sd[:-1] * np.sqrt(periods)
+        },
+        index=symbols
+    )
+    correlation = pd.DataFrame(
+        corr,
+        index=symbols + [BENCHMARK],
+        columns=symbols + [BENCHMARK]
+    )
+    portfolio = {
+        'market_value': float(total),
+        'beta': float(beta),
+        'volatility': float(volatility),
+        'benchmark_volatility': float(sd[-1] * np.sqrt(periods)),
+        'var': float(var),
+        'cvar': float(cvar),
+        'confidence': confidence,
+        'days': int(rows.sum()),
+        'window': (window[0], window[-1]) if len(window) > 0 else None,
+        'unpriced': unpriced
+    }
+
+    return holdings, correlation, portfolio
@@ -6,23 +6,87 @@
     Project:
 """
 
-import robin_stocks.robinhood as r
+from quote_provider import get_provider, QUOTE_BATCH_SIZE
+from concurrent.futures import ThreadPoolExecutor
+from token_store import get_store as get_token_store
+from instrumentation import span, timed_call
 from datetime import timedelta
-from finnhub import big_number
-from functools import partial
-from constants import ROOT
-import datapane as dp
+from finnhub import quotes, quote_number
 import pandas as pd
 import datetime
-import pickle
-import os
+import time
+import sys
+
+
+# Robinhood's public OAuth client id (the one robin_stocks uses)
+CLIENT_ID = 'c82SH0WZOsabOXGP2sxqcj34FxkvfnWRZBKlBjFS'
+TOKEN_LIFETIME = 86400
+
+# News tab (emitted once per report by `news_html`)
+NEWS_CSS = """
+                .news {
+                    display: grid;
+                    grid-template-columns: 1fr 1fr;
+                    gap: 24px;
+                }
+                .article {
+                    display: grid;
+                    grid-template-columns: 200px auto;
+                    column-gap: 16px;
+                }
+                .article .related {
+                    grid-column: 1 / span 2;
+                }
+                h4 {
+                    text-align:left;
+                }
+                a {
+                    text-decoration:none;
+                    color:#000000;
+                }
+                p {
+                    text-align:left;
+                    font-size:14px;
+                    color:#000000;
+                }
+                .info span {
+                    font-size:12px;
+                    color:#808080;
+                }
+                .related {
+                    display: flex;
+                    align-items: center;
+                    justify-content: center;
+                }
+                .triangle-up {
+                    width: 0;
+                    height: 0;
+                    border-left: 8px solid transparent;
+                    border-right: 8px solid transparent;
+                    border-bottom: 15px solid #00FF00;
+                }
+                .triangle-down {
+                    width: 0;
+                    height: 0;
+                    border-top: 15px solid #FF0000;
+                    border-left: 8px solid transparent;
+                    border-right: 8px solid transparent;
+                }
+"""
+
+# robin_stocks and datapane are imported inside the functions that use them (login / rendering only)
 
 
 # ----------------- AUTHENTICATION PROCEDURE -----------------
-def login(username, password, expiresIn=86400, scope="internal", by_sms=True, store_session=True):
+def login(username, password, expiresIn=TOKEN_LIFETIME, scope="internal", by_sms=True, store_session=True,
+          interactive=None):
     """This function will effectivly log the user into robinhood by getting an
     authentication token and saving it to the session header. By default, it will store the authentication
-    token in a pickle file and load that value on subsequent logins.
+    token (with its issue and expiry times) in the token store and reuse it on subsequent logins.
+    ---> a stored token with more than REFRESH_MARGIN left is used as is (no validation request)
+    ---> an older or expired one is exchanged for a new token with its refresh_token
+    ---> only when that fails is the password used, and only then can MFA / a challenge be needed
+    ---> the account's lock is held throughout, so concurrent runs for one account log in once
     :param username: The username for your robinhood account. Usually your email.
     :type username: str
     :param password: The password for your robinhood account.
@@ -35,76 +99,91 @@ def login(username, password, expiresIn=86400, scope="internal", by_sms=True, st
     :type by_sms: Optional[boolean]
     :param store_session: Specifies whether to save the log in authorization for future log ins.
     :type store_session: Optional[boolean]
+    :param interactive: Whether MFA / challenge codes may be prompted for (default: stdin is a terminal). \
+    When False, a login that needs a code raises instead of blocking on input().
+    :type interactive: Optional[boolean]
     :returns:  A dictionary with log in information. The 'access_token' keyword contains the access token, and the 'detail' keyword \
-    contains information on whether the access token was generated or loaded from pickle file.
+    contains information on whether the access token was generated, refreshed or loaded from the token store.
     """
 
-    pickle_ = username[:username.find('@')]
-    device_token = r.authentication.generate_device_token()
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    pickle_path = os.path.join(dir_path, "Input", f"robinhood_{pickle_}.pickle")
+    import robin_stocks.robinhood as r
+
+    name = username[:username.find('@')]
+    store = get_token_store()
+    if interactive is None:
+        interactive = sys.stdin is not None and sys.stdin.isatty()
+
+    with store.lock(name):
+        token = store.read(name) if store_session else None
+        if not store_session:
+            store.remove(name)
 
-    # Challenge type is used if not logging in with two-factor authentication.
-    challenge_type = "sms" if by_sms else "email"
+        # Known to be fresh: use it without asking the server
+        if store.fresh(token):
+            return _use_token(r, token, "logged in using stored authentication.")
+
+        device_token = token['device_token'] if token is not None else r.authentication.generate_device_token()
+
+        # Close to (or past) expiry: exchange the refresh token
+        if token is not None and token.get('refresh_token'):
+            with timed_call('robinhood/refresh'):
+                data = r.helper.request_post(
+                    r.urls.login_url(),
+                    {
+                        "client_id": CLIENT_ID,
+                        "expires_in": expiresIn,
+                        "grant_type": "refresh_token",
+                        "refresh_token": token['refresh_token'],
+                        "scope": token['scope'] or scope,
+                        "device_token": device_token,
+                    }
+                )
+            if data is not None and "access_token" in data:
+                token = store.write(name, data, device_token, token['scope'] or scope)
+                return _use_token(r, token, "logged in with a refreshed authentication code.")
+            print("ERROR: Could not refresh the stored authentication - logging in normally.")
+
+        # Try to log in normally.
+        data = _password_login(r, username, password, expiresIn, scope, by_sms, device_token, interactive)
+
+        if store_session:
+            token = store.write(name, data, device_token, scope)
+        else:
+            token = dict(data, device_token=device_token)
+        return _use_token(r, token, "logged in with brand new authentication code.")
+
+
+def _password_login(r, username, password, expiresIn, scope, by_sms, device_token, interactive):
+    """
+    Password grant, answering MFA / challenge prompts when interactive
+
+    :return: token response
+    """
 
     url = r.urls.login_url()
     payload = {
-        "client_id": "c82SH0WZOsabOXGP2sxqcj34FxkvfnWRZBKlBjFS",
+        "client_id": CLIENT_ID,
         "expires_in": expiresIn,
         "grant_type": "password",
         "password": password,
         "scope": scope,
         "username": username,
-        "challenge_type": challenge_type,
+        # Challenge type is used if not logging in with two-factor authentication.
+        "challenge_type": "sms" if by_sms else "email",
         "device_token": device_token,
     }
-    # If authentication has been stored in pickle file then load it. Stops login server from being pinged so much.
-    if os.path.isfile(pickle_path):
-        # If store_session has been set to false then delete the pickle file, otherwise try to load it.
-        # Loading pickle file will fail if the acess_token has expired.
-        if store_session:
-            try:
-                with open(pickle_path, "rb") as f:
-                    pickle_data = pickle.load(f)
-                    access_token = pickle_data["access_token"]
-                    token_type = pickle_data["token_type"]
-                    refresh_token = pickle_data["refresh_token"]
-                    # Set device_token to be the original device token when first logged in.
-                    pickle_device_token = pickle_data["device_token"]
-                    payload["device_token"] = pickle_device_token
-                    # Set login status to True in order to try and get account info.
-                    r.helper.set_login_state(True)
-                    r.helper.update_session(
-                        "Authorization", "{0} {1}".format(token_type, access_token)
-                    )
-                    # Try to load account profile to check that authorization token is still valid.
-                    res = r.helper.request_get(
-                        r.urls.portfolio_profile(), "regular", payload, jsonify_data=False
-                    )
-                    # Raises exception is response code is not 200.
-                    res.raise_for_status()
-                    return {
-                        "access_token": access_token,
-                        "token_type": token_type,
-                        "expires_in": expiresIn,
-                        "scope": scope,
-                        "detail": "logged in using authentication in data.pickle",
-                        "backup_code": None,
-                        "refresh_token": refresh_token,
-                    }
-            except:
-                print(
-                    "ERROR: There was an issue loading pickle file. Authentication may be expired - logging in normally."
-                )
-                r.helper.set_login_state(False)
-                r.helper.update_session("Authorization", None)
-        else:
-            os.remove(pickle_path)
-    # Try to log in normally.
-    data = r.helper.request_post(
-        url,
-        payload
-    )
+
+    with timed_call('robinhood/login'):
+        data = r.helper.request_post(
+            url,
+            payload
+        )
+
+    if not interactive and ("mfa_required" in data or "challenge" in data):
+        raise Exception(
+            f"Robinhood login for {username} needs a verification code; "
+            "run `python -m portfolio_analysis login` from a terminal once to store a token."
+        )
 
     # Handle case where mfa or challenge is required.
     if "mfa_required" in data:
@@ -140,47 +219,50 @@ def login(username, password, expiresIn=86400, scope="internal", by_sms=True, st
             payload
         )
 
-    # Update Session data with authorization or raise exception with the information present in data.
-    if "access_token" in data:
-        token = "{0} {1}".format(data["token_type"], data["access_token"])
-        r.helper.update_session("Authorization", token)
-        r.helper.set_login_state(True)
-        data["detail"] = "logged in with brand new authentication code."
-        if store_session:
-            with open(pickle_path, "wb") as f:
-                pickle.dump(
-                    {
-                        "token_type": data["token_type"],
-                        "access_token": data["access_token"],
-                        "refresh_token": data["refresh_token"],
-                        "device_token": device_token,
-                    },
-                    f,
-                )
-    else:
+    if "access_token" not in data:
         raise Exception(data["detail"])
 
     return data
 
 
-def authenticate_(username, password):
+def _use_token(r, token, detail):
+    """
+    Put a token on the robin_stocks session
+
+    :return: log in information, as robin_stocks returns it
+    """
+
+    r.helper.update_session("Authorization", "{0} {1}".format(token["token_type"], token["access_token"]))
+    r.helper.set_login_state(True)
+
+    return {
+        "access_token": token["access_token"],
+        "token_type": token["token_type"],
+        "expires_in": max(0, round(token.get("expires_at", time.time()) - time.time())),
+        "scope": token.get("scope"),
+        "detail": detail,
+        "backup_code": None,
+        "refresh_token": token.get("refresh_token"),
+    }
+
+
+def authenticate_(username, password, interactive=None):
     """
 
     :param username:
     :param password:
+    :param interactive:
     :return:
     """
 
-    pickle_ = username[:username.find('@')]
-    pickle_name = f'{ROOT}/Input/robinhood_{pickle_}.pickle'
+    import robin_stocks.robinhood as r
 
-    r.login(
-        username=username,
-        password=password,
-        expiresIn=30,
-        scope='r',
-        pickle_name=pickle_name,
-        store_session=True
+    # ---> a day-long token from the token store (was a fresh 30 second login on every call)
+    login(
+        username,
+        password,
+        scope='internal',
+        interactive=interactive
     )
     return r
 
@@ -194,7 +276,8 @@ def load_portfolio(client):
     # TODO Error Handling for Tickers
 
     # ----- Build Holdings -----
-    equities = client.account.build_holdings()
+    with timed_call('robinhood/build_holdings'):
+        equities = client.account.build_holdings()
     equities = pd.DataFrame(equities).T
     equities = equities.reset_index()
 
@@ -203,7 +286,8 @@ def load_portfolio(client):
     etf = equities.loc[equities['type'] == 'etp']
     etf_tickers = etf['index'].tolist()
 
-    crypto = client.crypto.get_crypto_positions()
+    with timed_call('robinhood/crypto_positions'):
+        crypto = client.crypto.get_crypto_positions()
     crypto = {
         curr['currency']['code']: curr for curr in crypto if float(curr['quantity']) != 0.0
     }
@@ -212,58 +296,144 @@ def load_portfolio(client):
     crypto = crypto.reset_index()
 
     # ----- Portfolio Value -----
-    portfolio = client.profiles.load_portfolio_profile()
+    with timed_call('robinhood/portfolio_profile'):
+        portfolio = client.profiles.load_portfolio_profile()
 
     return [stock_tickers, etf_tickers, crypto_tickers], [stock, etf, crypto], portfolio
 
 
 # ----------------- ROBINHOOD NEWS FUNCTIONS -----------------
-def robinhood_news(client, ticker):
+def fetch_news(client, ticker):
     """
+    Articles on a ticker published since yesterday
 
     :param: client
     :param: ticker
     :return:
     """
-    news = client.stocks.get_news(ticker)
+    with timed_call('robinhood/news'):
+        news = client.stocks.get_news(ticker)
     news = pd.DataFrame(news)
+    if len(news) == 0:
+        return news
+
     news['published_at'] = pd.to_datetime(news['published_at'])
     news['published'] = news['published_at'].dt.date
 
     yesterday = datetime.date.today() - timedelta(days=1)
     recent_news = news.loc[
         news['published'] >= yesterday
-        ]
+        ].copy()
     recent_news['preview_text'] = recent_news['preview_text'].apply(clean_summary)
 
-    article_groups = list(
-        recent_news.apply(
-            lambda row: format_article(row),
-            axis=1
-        ).values
-    )
+    return recent_news
 
-    related_htmls = recent_news.related_instruments.apply(
-        lambda i: related_instruments(client, i)
-    )
 
-    article_groups = list(map(
-        lambda article, html: dp.Group(
-            article,
-            html
-        ),
-        article_groups,
-        related_htmls
+def news_html(recent_news, quotes):
+    """
+    Every article as one document: the stylesheet is included once and articles are laid out two per row
+
+    :param: recent_news
+    :param: quotes: {instrument id: quote}, covering every related instrument
+    :return:
+    """
+
+    articles = list(map(
+        lambda row, ids: format_article(row, related_instruments(ids, quotes)),
+        recent_news.itertuples(index=False),
+        recent_news.related_instruments
     ))
 
-    return article_groups, list(recent_news['published'])
+    return """
+        <html>
+            <style type='text/css'>""" + NEWS_CSS + """</style>
+            <div class="news">
+                """ + '\n'.join(articles) + """
+            </div>
+        </html>
+        """.strip()
+
+
+def render_news(recent_news, quotes):
+    """
+
+    :param: recent_news
+    :param: quotes: {instrument id: quote}, covering every related instrument
+    :return: one block holding every article, and their publish dates
+    """
+
+    import datapane as dp
+
+    return [dp.HTML(news_html(recent_news, quotes))], list(recent_news['published'])
+
+
+def gather_news(client, tickers, max_workers=8):
+    """
+    Newest-first news across every ticker, and quotes of the instruments it mentions (no rendering)
+    ---> per-ticker fetches run concurrently on a bounded thread pool
+    ---> a story returned for several holdings is kept once (by URL, then id)
+    ---> related-instrument quotes for the remaining articles are fetched in one bulk lookup
+
+    :param: client
+    :param: tickers
+    :param: max_workers
+    :return: articles DataFrame (None if there are none), {instrument id: quote}
+    """
+    tickers = list(tickers)
+    if len(tickers) == 0:
+        return None, {}
+
+    with span('fetch', tickers=len(tickers)):
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as pool:
+            news = [
+                recent_news for recent_news in pool.map(lambda t: fetch_news(client, t), tickers)
+                if len(recent_news) > 0
+            ]
+    if len(news) == 0:
+        return None, {}
+
+    news = pd.concat(
+        news
+    ).drop_duplicates(
+        subset='url'
+    ).drop_duplicates(
+        subset='uuid'
+    ).sort_values(
+        by='published_at',
+        ascending=False
+    )
+
+    with span('related'):
+        quotes = get_quotes_by_ids(
+            client,
+            [id_ for ids in news.related_instruments for id_ in ids]
+        )
+
+    return news, quotes
 
 
-def format_article(article):
+def portfolio_news(client, tickers, max_workers=8):
+    """
+    Newest-first news across every ticker, rendered
+
+    :param: client
+    :param: tickers
+    :param: max_workers
+    :return: article groups and their publish dates
+    """
+    news, quotes = gather_news(client, tickers, max_workers)
+    if news is None:
+        return [], []
+
+    with span('render', articles=len(news)):
+        return render_news(news, quotes)
+
+
+def format_article(article, related=''):
     """
 
     :param article
-    :param source
+    :param related: markup from `related_instruments`
     :return:
     """
 
@@ -272,55 +442,41 @@ def format_article(article):
         byline = source
     date = datetime.datetime.strptime(str(date)[:-6], '%Y-%m-%d %H:%M:%S').strftime('%m/%d/%y %I:%M:%S %p')
 
-    media = dp.HTML(f"""
-        <img src="{img}" width="200"/>
-    """.strip())
-    html = dp.HTML(
-        """
-        <html>
-            <style type='text/css'>
-                h4 {
-                    text-align:left;
-                }
-                a {
-                    text-decoration:none;
-                    color:#000000;
-                }
-                p {
-                    text-align:left;
-                    font-size:14px;
-                    color=#000000;
-                }
-                .info span {
-                    font-size:12px;
-                    color=#808080;
-                }
-            </style>
-            
-            <h4><a href='""" + url + """' target="_blank">""" + title + """</a></h4>
-            <p class='info'>
-                <span><i>""" + byline + '<br>' + date + """</i></span><br><br>
-                """ + abstract + """
-            </p>
-        </html>
+    return """
+        <div class="article">
+            <img src='""" + str(img) + """' width="200"/>
+            <div>
+                <h4><a href='""" + url + """' target="_blank">""" + title + """</a></h4>
+                <p class='info'>
+                    <span><i>""" + byline + '<br>' + date + """</i></span><br><br>
+                    """ + abstract + """
+                </p>
+            </div>
+            """ + related + """
+        </div>
         """.strip()
-    )
-
-    return dp.Group(
-        media,
-        html,
-        columns=2
-    )
 
 
-def format_related(client, id_):
+def get_quotes_by_ids(client, ids, batch_size=QUOTE_BATCH_SIZE):
     """
+    Bulk quote lookup by instrument id, through the shared quote_provider
+    ---> duplicates are dropped, then ids not quoted in the last few seconds are sent `batch_size` at a time
+         to the marketdata quotes endpoint
 
     :param: client
-    :param: id_
+    :param: ids
+    :param: batch_size
+    :return: {instrument id: quote}; ids the broker does not recognise are left out
+    """
+    return get_provider(client=client).quotes_by_ids(ids, batch_size)
+
+
+def format_related(q):
+    """
+
+    :param: q
     :return:
     """
-    q = client.stocks.get_stock_quote_by_id(id_)
     symbol, price, p_close = q['symbol'], q['last_trade_price'], q['previous_close']
     delta = (float(price) / float(p_close) - 1) * 100
     arrow = 'up' if delta >= 0 else 'down'
@@ -330,45 +486,22 @@ def format_related(client, id_):
     """.strip()
 
 
-def related_instruments(client, id_list):
+def related_instruments(id_list, quotes):
     """
 
-    :param: client
     :param: id_list
+    :param: quotes
     :return:
     """
-    instruments = list(map(
-        lambda id_: format_related(client, id_), id_list
-    ))
-    html = """
-        <html>
-            <style type='text/css'>
-                .related {
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                }
-                .triangle-up {
-                    width: 0;
-                    height: 0;
-                    border-left: 8px solid transparent;
-                    border-right: 8px solid transparent;
-                    border-bottom: 15px solid #00FF00;
-                }
-                .triangle-down {
-                    width: 0;
-                    height: 0;
-                    border-top: 15px solid #FF0000;
-                    border-left: 8px solid transparent;
-                    border-right: 8px solid transparent;
-                }
-            </style>
-            <div class="related">
-                """ + "&nbsp;|&nbsp;".join(instruments) + """
-            </div>
-        </html>
+
+    instruments = [
+        format_related(quotes[id_]) for id_ in id_list if id_ in quotes
+    ]
+    return """
+        <div class="related">
+            """ + "&nbsp;|&nbsp;".join(instruments) + """
+        </div>
         """.strip()
-    return dp.HTML(html)
 
 
 def clean_summary(summary):
@@ -396,18 +529,22 @@ def get_scroll_objects(row):
     """.strip()
 
 
-def ticker_toggle(key, tickers, label):
+def ticker_toggle(key, tickers, label, stream=None):
     """
 
     :param key
     :param tickers
     :param label
+    :param stream: streaming.QuoteStream; quotes come from its memory instead of Finnhub's REST API
     :return:
     """
 
-    bn = list(map(
-        partial(big_number, key), tickers
-    ))
+    import datapane as dp
+
+    results = stream.quotes(tickers) if stream is not None else quotes(key, tickers)
+    bn = [
+        quote_number(ticker, q, error) for ticker, q, error in results
+    ]
     return dp.Toggle(
         dp.Group(
             *bn,
@@ -422,6 +559,8 @@ def make_header(header):
 
     """
 
+    import datapane as dp
+
     return dp.HTML(
         """
         <html>
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from errors import ErrorHandler, Logging
+import multiprocessing as mp
+import traceback
+import time
+import sys
+
+
+# ----------------- WORKER -----------------
+def _run_user(build, user, results):
+    """
+    Child-process entry point
+    ---> each process has its own robin_stocks session, so logins never clobber each other
+
+    :param build
+    :param user
+    :param results
+    :return:
+    """
+
+    start = time.time()
+    try:
+        status = build(user)
+        results.put([user, status, None, None, time.time() - start])
+    except BaseException as e:
+        tb = traceback.extract_tb(sys.exc_info()[2])
+        line = tb[-1].lineno if len(tb) > 0 else 0
+        results.put([user, None, f'{type(e).__name__}: {e}', line, time.time() - start])
+
+
+# ----------------- RUNNER -----------------
+def run_reports(users, build, max_workers=4, timeout=900, log=True):
+    """
+    Build reports for many users concurrently, one process per user
+    ---> at most `max_workers` processes run at once
+    ---> a report still running after `timeout` seconds is terminated and marked TIMEOUT
+    ---> outcomes are written to the run_log.txt success/error log from this (parent) process
+
+    :param users
+    :param build: callable(user) -> 'COMPLETE' on success (any other result is recorded as an ERROR)
+    :param max_workers
+    :param timeout
+    :param log
+    :return: {user: [status, error, seconds]}
+    """
+
+    # 'fork' keeps notebook-defined functions (and their globals) reachable from the children
+    ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else None)
+    results = ctx.Queue()
+
+    pending = list(users)
+    running = {}
+    summary = {}
+
+    def collect():
+        while not results.empty():
+            user, status, error, line, seconds = results.get()
+            # ---> anything but COMPLETE is a failure, with a message the log can write (a build may return None)
+            if error is None and status != 'COMPLETE':
+                error = f'Report returned {status}'
+            summary[user] = [status if error is None else 'ERROR', error, round(seconds, 2), line or 0]
+
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < max_workers:
+            user = pending.pop(0)
+            process = ctx.Process(
+                target=_run_user,
+                args=(build, user, results),
+                daemon=True
+            )
+            process.start()
+            running[user] = [process, time.time()]
+
+        collect()
+        for user, (process, started) in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                del running[user]
+            elif time.time() - started > timeout:
+                process.terminate()
+                process.join()
+                del running[user]
+                summary[user] = ['TIMEOUT', f'Exceeded {timeout}s', round(time.time() - started, 2), 0]
+
+        time.sleep(0.1)
+
+    collect()
+    for user in users:
+        if user not in summary:
+            summary[user] = ['ERROR', 'Worker exited without a result', 0.0, 0]
+
+    if log:
+        for user in users:
+            status, error, seconds, line = summary[user]
+            if status == 'COMPLETE':
+                Logging.write_success_to_log(user)
+            else:
+                Logging.write_error_to_log(ErrorHandler(
+                    f"Unable to Generate {user}'s Report ({error})", status, 'runner.py', line, user
+                ))
+
+    return {
+        user: summary[user][:3] for user in users
+    }
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from constants import ROOT
+from replay import replay
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pandas as pd
+import numpy as np
+import datetime
+import hashlib
+import os
+
+
+SUMMARY = ['Cash', 'Total Portfolio Value', 'Equity Value', 'Crypto Value']
+
+# Relative change in the last snapshot day's close that counts as a revision (e.g. a split re-adjusting history)
+PRICE_RTOL = 1e-4
+
+
+# ----------------- VALUATION -----------------
+def valuation(quantities, prices, equity_symbols, crypto_symbols):
+    """
+    Daily value of every position, cash, and the portfolio / equity / crypto totals
+    ---> same arithmetic generate_report used, on the holdings' trading days only
+
+    :param quantities: daily holdings (one column per symbol, plus 'Cash')
+    :param prices: daily closes (one column per symbol), indexed by date
+    :param equity_symbols
+    :param crypto_symbols
+    :return:
+    """
+
+    weights = quantities.drop('Cash', axis=1)
+    prices = prices.fillna(0).reindex(index=weights.index, columns=weights.columns)
+
+    values = prices * weights
+    values['Cash'] = quantities['Cash']
+    values['Total Portfolio Value'] = values.sum(
+        axis=1
+    )
+    values['Equity Value'] = values.reindex(columns=equity_symbols).sum(
+        axis=1
+    )
+    values['Crypto Value'] = values.reindex(columns=crypto_symbols).sum(
+        axis=1
+    )
+    values.index.name = 'date'
+
+    return values
+
+
+def fingerprint(transactions):
+    """
+    Order-independent hash of a set of transactions
+    ---> changes if any transaction is added, removed or edited
+
+    :param transactions
+    :return:
+    """
+
+    rows = np.sort(
+        pd.util.hash_pandas_object(transactions.iloc[:, :7], index=False).values
+    )
+    return hashlib.sha1(rows.tobytes()).hexdigest()
+
+
+# ----------------- SNAPSHOT STORE -----------------
+class SnapshotStore:
+    """
+    Per-user Parquet snapshot of the daily holdings, closes and valuation
+    ---> a run replays only the transactions and prices after the last snapshot day, then appends
+    ---> the stored fingerprint covers every transaction already applied; if it changes (a back-dated or
+         edited transaction), or the last snapshot day's close comes back revised (a split re-adjusts the
+         whole daily history), the snapshot is rebuilt from the first transaction
+    ---> only settled days (before `present`) are stored, so today's live close is recomputed every run
+
+    :param root
+    :param rtol
+    """
+
+    def __init__(self, root=None, rtol=PRICE_RTOL):
+        self.root = root if root is not None else os.path.join(ROOT, 'Input', 'snapshots')
+        self.rtol = rtol
+
+    def path(self, user):
+        """
+
+        :param user
+        :return:
+        """
+
+        return os.path.join(self.root, f'{user}.parquet')
+
+    def read(self, user):
+        """
+
+        :param user
+        :return: quantities, prices, values, fingerprint (all None if there is no snapshot)
+        """
+
+        path = self.path(user)
+        if not os.path.exists(path):
+            return None, None, None, None
+
+        table = pq.read_table(path)
+        meta = table.schema.metadata or {}
+        if b'fingerprint' not in meta:
+            return None, None, None, None
+
+        df = table.to_pandas().set_index('date')
+        if len(df) == 0:
+            return None, None, None, None
+
+        quantities = self._unprefix(df, 'quantity:')
+        prices = self._unprefix(df, 'price:')
+        values = self._unprefix(df, 'value:')
+        values = pd.concat([values, df[SUMMARY]], axis=1)
+
+        return quantities, prices, values, meta[b'fingerprint'].decode()
+
+    def write(self, user, quantities, prices, values, fingerprint_):
+        """
+        Atomically replace the user's snapshot (write to a temp file, then rename)
+
+        :param user
+        :param quantities
+        :param prices
+        :param values
+        :param fingerprint_
+        :return:
+        """
+
+        path = self.path(user)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        positions = values.drop(SUMMARY, axis=1)
+        df = pd.concat(
+            [
+                quantities.add_prefix('quantity:'),
+                prices.add_prefix('price:'),
+                positions.add_prefix('value:'),
+                values[SUMMARY]
+            ],
+            axis=1
+        )
+        df.index.name = 'date'
+
+        table = pa.Table.from_pandas(
+            df.astype('float64').reset_index(),
+            preserve_index=False
+        )
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'fingerprint': fingerprint_.encode()
+        })
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def update(self, user, transactions, load_prices, open_days, equity_symbols, crypto_symbols, present=None):
+        """
+        Daily valuation through `present`, computing only the days after the user's last snapshot
+
+        :param user
+        :param transactions: cleaned transactions, sorted by date (datetime.date values)
+        :param load_prices: callable(start, end) -> DataFrame of daily closes indexed by date, one column per
+                            symbol; closes already downloaded must reflect later revisions (the candle store
+                            re-checks its last settled bar when it extends a range, and rewrites a revised history)
+        :param open_days: callable(start, end) -> list of trading days in [start, end]
+        :param equity_symbols
+        :param crypto_symbols
+        :param present
+        :return: values, reason for a full rebuild (None if the snapshot was extended)
+        """
+
+        present = datetime.date.today() if present is None else present
+        dates = transactions.iloc[:, 1]
+
+        quantities, prices, values, fingerprint_ = self.read(user)
+        if quantities is None:
+            reason = 'no snapshot'
+        else:
+            last = quantities.index[-1]
+            if fingerprint(transactions.loc[dates <= last]) != fingerprint_:
+                reason = 'back-dated transaction'
+            else:
+                reason = None
+
+        # Closes from the last snapshot day on
+        # ---> one request: that day's close, checked against the snapshot's, shows a revision (e.g. a split)
+        if reason is None:
+            start = last + datetime.timedelta(days=1)
+            days = open_days(start, present)
+            fresh = transactions.loc[dates > last]
+            new_prices = load_prices(last, present)
+            if self._revised(prices, new_prices, last):
+                reason = 'price revision'
+
+        # ---------- FULL REBUILD ----------
+        if reason is not None:
+            start = dates.iloc[0]
+            days = open_days(start, present)
+            quantities = replay(transactions, start, present)
+            quantities.index = quantities.index.date
+            quantities = quantities.reindex(days)
+            prices = self._closes(
+                load_prices(start, present),
+                days,
+                quantities.columns
+            )
+            values = valuation(quantities, prices, equity_symbols, crypto_symbols)
+
+            self._save(user, quantities, prices, values, transactions, present)
+            return values, reason
+
+        # ---------- INCREMENTAL ----------
+        if len(days) == 0:
+            return values, None
+
+        base = quantities.iloc[-1]
+        if len(fresh) > 0:
+            delta = replay(fresh, start, present)
+            delta.index = delta.index.date
+            delta = delta.reindex(days)
+        else:
+            delta = pd.DataFrame(0.0, index=days, columns=['Cash'])
+
+        columns = base.index.tolist() + [c for c in delta.columns if c not in base.index]
+        new_quantities = delta.reindex(columns=columns, fill_value=0.0) + base.reindex(columns, fill_value=0.0)
+        new_prices = self._closes(new_prices, days, new_quantities.columns)
+        new_values = valuation(new_quantities, new_prices, equity_symbols, crypto_symbols)
+
+        quantities = pd.concat([quantities, new_quantities]).fillna(0.0)
+        prices = pd.concat([prices, new_prices])
+        values = pd.concat([values, new_values]).fillna(0.0)
+
+        self._save(user, quantities, prices, values, transactions, present)
+        return values, None
+
+    def _save(self, user, quantities, prices, values, transactions, present):
+        # Today's bar is still live; keep it out of the snapshot and recompute it next run
+        settled = quantities.index < present
+        if not settled.any():
+            return
+
+        last = quantities.index[settled][-1]
+        self.write(
+            user,
+            quantities.loc[settled],
+            prices.loc[settled],
+            values.loc[settled],
+            fingerprint(transactions.loc[transactions.iloc[:, 1] <= last])
+        )
+
+    def _revised(self, prices, new_prices, last):
+        if new_prices is None or last not in new_prices.index or last not in prices.index:
+            return False
+
+        before = prices.loc[last]
+        after = new_prices.loc[last].reindex(before.index)
+        compare = before.notna() & after.notna() & (before != 0)
+        return not np.allclose(after[compare], before[compare], rtol=self.rtol, atol=0.0)
+
+    @staticmethod
+    def _closes(prices, days, symbols):
+        symbols = [s for s in symbols if s != 'Cash']
+        if prices is None:
+            return pd.DataFrame(np.nan, index=days, columns=symbols)
+
+        prices = prices.loc[~prices.index.duplicated(keep='last')]
+        return prices.reindex(index=days, columns=symbols)
+
+    @staticmethod
+    def _unprefix(df, prefix):
+        columns = [c for c in df.columns if c.startswith(prefix)]
+        out = df[columns]
+        out.columns = [c[len(prefix):] for c in columns]
+        return out
+
+
+_store = None
+
+
+def get_store():
+    """
+    Shared store under ROOT/Input/snapshots (created on first use)
+
+    :return:
+    """
+
+    global _store
+    if _store is None:
+        _store = SnapshotStore()
+    return _store
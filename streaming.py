@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from errors import ErrorHandler, Logging, get_error_info
+import numpy as np
+import threading
+import websocket
+import json
+
+
+FINNHUB_WS_URL = 'wss://ws.finnhub.io'
+
+# Minute bars kept per symbol (the last 480 are what an intraday tile draws)
+BAR_CAPACITY = 480
+
+# Errors that mean the connection is gone (the feed thread reconnects)
+CONNECTION_ERRORS = (OSError, websocket.WebSocketException)
+
+
+# ----------------- MINUTE BARS -----------------
+class MinuteBars:
+    """
+    Rolling one-minute OHLCV bars of one symbol in fixed-size ring buffers
+    ---> a trade updates the current bar or opens the next one in O(1); the oldest bar is overwritten
+    ---> minutes without trades have no bar (as in Finnhub's candles)
+    ---> a late trade for a minute still in the buffer updates that bar; older ones are dropped
+
+    :param capacity
+    """
+
+    def __init__(self, capacity=BAR_CAPACITY):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype='int64')
+        self.o = np.zeros(capacity)
+        self.h = np.zeros(capacity)
+        self.l = np.zeros(capacity)
+        self.c = np.zeros(capacity)
+        self.v = np.zeros(capacity)
+        self.size = 0
+        self._head = -1
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last(self):
+        return float(self.c[self._head]) if self.size > 0 else None
+
+    def update(self, price, volume, t):
+        """
+        Add one trade
+
+        :param price
+        :param volume
+        :param t: unix seconds
+        :return:
+        """
+
+        minute = int(t) // 60 * 60
+        if self.size > 0 and minute <= self.t[self._head]:
+            i = self._head if minute == self.t[self._head] else self._find(minute)
+            if i is None:
+                return
+            self.h[i] = max(self.h[i], price)
+            self.l[i] = min(self.l[i], price)
+            if i == self._head:
+                self.c[i] = price
+            self.v[i] += volume
+            return
+
+        self._head = (self._head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        i = self._head
+        self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i] = minute, price, price, price, price, volume
+
+    def seed(self, candles_):
+        """
+        Fill from minute candles (e.g. the candle store's) before trades arrive
+
+        :param candles_: DataFrame with t, o, h, l, c, v
+        :return:
+        """
+
+        for row in candles_[['t', 'o', 'h', 'l', 'c', 'v']].tail(self.capacity).itertuples(index=False):
+            if self.size > 0 and row.t <= self.t[self._head]:
+                continue
+            self._head = (self._head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            i = self._head
+            self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i] = row
+
+    def arrays(self):
+        """
+        Bars oldest first
+
+        :return: {'t', 'o', 'h', 'l', 'c', 'v': array}
+        """
+
+        order = self._order()
+        return {name: getattr(self, name)[order] for name in ['t', 'o', 'h', 'l', 'c', 'v']}
+
+    def frame(self):
+        """
+        Bars oldest first in the candle layout `finnhub.candles` returns
+
+        :return:
+        """
+
+        import pandas as pd
+
+        return pd.DataFrame(self.arrays())
+
+    def _order(self):
+        start = (self._head - self.size + 1) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    def _find(self, minute):
+        order = self._order()
+        j = np.searchsorted(self.t[order], minute)
+        if j < len(order) and self.t[order[j]] == minute:
+            return order[j]
+        return None
+
+
+# ----------------- QUOTE STREAM -----------------
+class QuoteStream:
+    """
+    Live trades of many symbols from Finnhub's websocket, kept in memory as minute bars
+    ---> one background thread reads the feed (websocket-client); it reconnects (and resubscribes) with
+         backoff when dropped
+    ---> a message that cannot be handled, or a listener that raises, is counted in `errors` and logged to
+         run_log.txt (once per kind) without stopping the feed
+    ---> `candles` and `quote` are served from memory, so refreshing tiles / BigNumbers makes no REST calls
+    ---> previous closes (for changes) come from `seed` or `set_previous_close`; without one the change is 0
+    ---> `listeners` are called with (symbol, price, unix seconds) for every trade, e.g. MarkToMarket.update
+
+    :param key: Finnhub API key
+    :param symbols: Finnhub symbols, e.g. 'AAPL', 'BINANCE:BTCUSDT'
+    :param url: feed URL (Finnhub's unless given, e.g. a benchmarks.feed.StandInFeed)
+    :param capacity: minute bars kept per symbol
+    :param timeout: seconds of silence before the connection is treated as dead
+    """
+
+    def __init__(self, key, symbols=(), url=None, capacity=BAR_CAPACITY, timeout=30):
+        self.key = key
+        self.url = url if url is not None else FINNHUB_WS_URL
+        self.capacity = capacity
+        self.timeout = timeout
+        self.bars = {}
+        self.previous_close = {}
+        self.trades = 0
+        self.errors = 0
+        self.listeners = []
+        self.connected = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ws = None
+        self._ws_lock = threading.Lock()
+        self._logged = set()
+        self._thread = None
+        for symbol in symbols:
+            self.bars[symbol] = MinuteBars(capacity)
+
+    # ----------------- LIFECYCLE -----------------
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        # ---> unblocks the feed thread's recv; the thread itself closes and clears the connection
+        with self._ws_lock:
+            if self._ws is not None:
+                self._ws.abort()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def subscribe(self, symbol):
+        with self._lock:
+            if symbol not in self.bars:
+                self.bars[symbol] = MinuteBars(self.capacity)
+        self._send({'type': 'subscribe', 'symbol': symbol})
+
+    def unsubscribe(self, symbol):
+        with self._lock:
+            self.bars.pop(symbol, None)
+        self._send({'type': 'unsubscribe', 'symbol': symbol})
+
+    # ----------------- SEEDING -----------------
+    def seed(self, years=5 / 365, resolution='1'):
+        """
+        Prefill bars and previous closes (REST, once at start-up; candles come from the candle store if cached)
+
+        :param years
+        :param resolution
+        :return:
+        """
+
+        from finnhub import candles, quotes
+
+        for symbol, q, error in quotes(self.key, list(self.bars)):
+            if error is None:
+                self.set_previous_close(symbol, q[6])
+
+        for symbol in list(self.bars):
+            crypto = ':' in symbol
+            df = candles(self.key, symbol, years=years, resolution=resolution, type_='crypto' if crypto else 'stock')
+            if df is not None and 't' in df:
+                with self._lock:
+                    self.bars[symbol].seed(df)
+        return self
+
+    def set_previous_close(self, symbol, close):
+        self.previous_close[symbol] = float(close)
+
+    # ----------------- READS (memory only) -----------------
+    def candles(self, symbol):
+        """
+        Minute bars of a symbol, oldest first, in the candle layout
+
+        :param symbol
+        :return:
+        """
+
+        with self._lock:
+            return self.bars[symbol].frame()
+
+    def quote(self, symbol):
+        """
+        Quote in Finnhub's /quote order (c, d, dp, h, l, o, pc, t) from the bars in memory
+        ---> high / low / open cover the bars since the start of the latest bar's (UTC) day
+
+        :param symbol
+        :return: None if no trade or bar has been seen
+        """
+
+        with self._lock:
+            bars = self.bars.get(symbol)
+            if bars is None or len(bars) == 0:
+                return None
+            a = bars.arrays()
+
+        today = a['t'] >= a['t'][-1] // 86400 * 86400
+        close = float(a['c'][-1])
+        p_close = self.previous_close.get(symbol, close)
+        return [
+            close,
+            close - p_close,
+            (close / p_close - 1) * 100 if p_close != 0 else 0.0,
+            float(a['h'][today].max()),
+            float(a['l'][today].min()),
+            float(a['o'][today][0]),
+            p_close,
+            int(a['t'][-1])
+        ]
+
+    def quotes(self, symbols):
+        """
+        Same shape as `finnhub.quotes`: (symbol, quote, error) in input order
+
+        :param symbols
+        :return:
+        """
+
+        results = []
+        for symbol in symbols:
+            q = self.quote(symbol)
+            results.append((symbol, q, None if q is not None else ValueError(f'No streamed trades for {symbol}')))
+        return results
+
+    def market_value(self, quantities):
+        """
+        Value of a set of positions at the latest streamed prices
+
+        :param quantities: {symbol: quantity}
+        :return: total, {symbol: value} (symbols without a price are left out)
+        """
+
+        with self._lock:
+            last = {symbol: bars.last for symbol, bars in self.bars.items() if len(bars) > 0}
+
+        values = {symbol: q * last[symbol] for symbol, q in quantities.items() if symbol in last}
+        return sum(values.values()), values
+
+    # ----------------- FEED -----------------
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                ws = websocket.create_connection(f'{self.url}?token={self.key}', timeout=self.timeout)
+                with self._ws_lock:
+                    self._ws = ws
+                with self._lock:
+                    symbols = list(self.bars)
+                for symbol in symbols:
+                    self._send({'type': 'subscribe', 'symbol': symbol})
+                self.connected.set()
+                backoff = 1.0
+
+                # ---> pings are answered inside recv
+                while not self._stop.is_set():
+                    text = ws.recv()
+                    try:
+                        self._on_message(text)
+                    except Exception as e:
+                        self._error(e, 'message')
+            except CONNECTION_ERRORS:
+                if self._stop.is_set():
+                    break
+            except Exception as e:
+                # ---> anything unexpected is logged and treated as a dropped connection, never ends the thread
+                self._error(e, 'feed')
+            finally:
+                self.connected.clear()
+                with self._ws_lock:
+                    ws, self._ws = self._ws, None
+                if ws is not None:
+                    ws.shutdown()
+
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _send(self, message):
+        # ---> a failed send is left to the feed thread, which resubscribes everything when it reconnects
+        with self._ws_lock:
+            if self._ws is None:
+                return
+            try:
+                self._ws.send(json.dumps(message))
+            except CONNECTION_ERRORS:
+                pass
+
+    def _on_message(self, text):
+        message = json.loads(text)
+        if message.get('type') != 'trade':
+            return
+
+        trades = []
+        with self._lock:
+            for trade in message['data']:
+                bars = self.bars.get(trade['s'])
+                if bars is not None:
+                    bars.update(trade['p'], trade.get('v', 0.0), trade['t'] / 1000)
+                    self.trades += 1
+                    trades.append((trade['s'], trade['p'], trade['t'] / 1000))
+
+        # ---> listeners run after the lock is released, so they may read the stream (and never block its readers)
+        for symbol, price, t in trades:
+            for listener in list(self.listeners):
+                try:
+                    listener(symbol, price, t)
+                except Exception as e:
+                    self._error(e, 'listener')
+
+    def _error(self, e, source):
+        """
+        Count an error in the feed thread; the first of each kind (source, type, line) goes to run_log.txt
+
+        :param e
+        :param source: 'message', 'listener' or 'feed'
+        :return:
+        """
+
+        type_, file_name, line = get_error_info()
+        self.errors += 1
+        if (source, type_, line) in self._logged:
+            return
+
+        self._logged.add((source, type_, line))
+        Logging.write_error_to_log(ErrorHandler(f'QuoteStream {source} error: {e}', type_, file_name, line, None))
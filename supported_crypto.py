@@ -6,28 +6,163 @@
     Project:
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from finnhub import get_client
 from constants import ROOT
 import pandas as pd
-import requests
+import threading
+import time
 import json
+import os
 
-with open('secrets.json') as s:
-    secrets = json.loads(s.read())
-FINNHUB_KEY = secrets['finnhub']
-
-with requests.get(f'https://finnhub.io/api/v1/crypto/exchange?token={FINNHUB_KEY}') as r:
-    exchanges = json.loads(r.content)
-
-supported = []
-for exchange in exchanges:
-    with requests.get(f'https://finnhub.io/api/v1/crypto/symbol?exchange=binance&token={FINNHUB_KEY}') as r:
-        symbols = json.loads(r.content)
-        for s in symbols:
-            desc, display, symbol = s.values()
-            supported.append([exchange, symbol, display, desc])
-
-df = pd.DataFrame(
-    supported,
-    columns=['exchange', 'symbol', 'displaySymbol', 'description']
-)
-df.to_csv(f'{ROOT}/Input/supported_crypto.csv')
+
+CATALOG_TTL = 7 * 86400
+
+# Ranking of candidate pairs for a crypto code: earlier exchanges, then earlier quote currencies, win
+EXCHANGE_PREFERENCE = ['BINANCE', 'COINBASE', 'KRAKEN', 'GEMINI', 'BITFINEX']
+QUOTE_PREFERENCE = ['USDT', 'USD', 'USDC', 'BUSD']
+
+COLUMNS = ['exchange', 'symbol', 'displaySymbol', 'description']
+
+
+class CryptoCatalog:
+    """
+    Finnhub's supported crypto symbols across every exchange
+    ---> nothing is fetched until the first lookup; then the local CSV is used while younger than `ttl`
+    ---> a refresh requests each exchange's symbol list once, concurrently
+    ---> `exists` and `best_pair` are dictionary / set lookups
+
+    :param key: Finnhub API key
+    :param path
+    :param ttl: seconds before the local CSV is refreshed
+    :param max_workers
+    """
+
+    def __init__(self, key, path=None, ttl=CATALOG_TTL, max_workers=8):
+        self.key = key
+        self.path = path if path is not None else os.path.join(ROOT, 'Input', 'supported_crypto.csv')
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._df = None
+        self._symbols = None
+        self._best = None
+
+    @property
+    def df(self):
+        self._load()
+        return self._df
+
+    def exists(self, symbol):
+        """
+        Whether Finnhub serves `symbol`, e.g. 'BINANCE:BTCUSDT'
+
+        :param symbol
+        :return:
+        """
+
+        self._load()
+        return symbol in self._symbols
+
+    def best_pair(self, code):
+        """
+        Finnhub symbol to price a Robinhood crypto code with
+        ---> accepts the holdings code ('BTC') or the order symbol ('BTCUSD')
+
+        :param code
+        :return: e.g. 'BINANCE:BTCUSDT', or None if no exchange lists the coin
+        """
+
+        self._load()
+        code = code.upper()
+        if code in self._best:
+            return self._best[code]
+        if code.endswith('USD'):
+            return self._best.get(code[:-3])
+        return None
+
+    def refresh(self):
+        """
+        Download every exchange's symbols (concurrently) and rewrite the local CSV
+
+        :return:
+        """
+
+        client = get_client(self.key)
+        exchanges = client.get('crypto/exchange')
+
+        def fetch(exchange):
+            return [
+                [exchange, s['symbol'], s['displaySymbol'], s['description']]
+                for s in client.get('crypto/symbol', exchange=exchange) or []
+            ]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(exchanges)))) as pool:
+            rows = [row for rows in pool.map(fetch, exchanges) for row in rows]
+
+        df = pd.DataFrame(rows, columns=COLUMNS).drop_duplicates(subset='symbol').reset_index(drop=True)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, self.path)
+
+        self._index(df)
+        return df
+
+    def _load(self):
+        with self._lock:
+            if self._df is not None:
+                return
+
+            if os.path.exists(self.path) and time.time() - os.path.getmtime(self.path) < self.ttl:
+                df = pd.read_csv(self.path)
+                if list(df.columns) == COLUMNS:
+                    self._index(df)
+                    return
+
+            self.refresh()
+
+    def _index(self, df):
+        pairs = df['displaySymbol'].astype(str).str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+        ranked = pd.DataFrame({
+            'symbol': df['symbol'],
+            'base': pairs[0].str.upper(),
+            'exchange_rank': self._rank(df['symbol'].str.split(':').str[0].str.upper(), EXCHANGE_PREFERENCE),
+            'quote_rank': self._rank(pairs[1].str.upper(), QUOTE_PREFERENCE)
+        }).dropna(subset=['base'])
+        ranked = ranked.sort_values(by=['exchange_rank', 'quote_rank'], kind='mergesort')
+
+        self._best = ranked.drop_duplicates(subset='base').set_index('base')['symbol'].to_dict()
+        self._symbols = set(df['symbol'])
+        self._df = df
+
+    @staticmethod
+    def _rank(values, preference):
+        return values.map({v: i for i, v in enumerate(preference)}).fillna(len(preference))
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(key):
+    """
+    Shared catalog for an API key (created on first use, loaded on first lookup)
+
+    :param key
+    :return:
+    """
+
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = CryptoCatalog(key)
+        return _catalogs[key]
+
+
+if __name__ == '__main__':
+    with open('secrets.json') as s:
+        secrets = json.loads(s.read())
+
+    # Force a refresh of Input/supported_crypto.csv
+    print(CryptoCatalog(secrets['finnhub']).refresh().shape)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+
+    Tests import the project modules from the repository root. `constants` (ROOT) is local configuration
+    kept out of the repository; when it is absent, ROOT points at a temporary directory for the session.
+"""
+
+import tempfile
+import types
+import sys
+import os
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import constants
+except ImportError:
+    constants = types.ModuleType('constants')
+    constants.ROOT = tempfile.mkdtemp(prefix='portfolio-root-')
+    sys.modules['constants'] = constants
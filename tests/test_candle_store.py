@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from market_calendar import TradingCalendar, rule_is_open
+from candle_store import CandleStore
+import pandas as pd
+import datetime
+import time
+
+
+DAY = 86400
+
+
+class Provider:
+    """
+    Daily bars at 00:00 UTC on NYSE open days; closes before `split` are divided by `ratio` once `adjusted`
+    """
+
+    def __init__(self, split=None, ratio=2.0):
+        self.split = split
+        self.ratio = ratio
+        self.adjusted = False
+        self.calls = []
+
+    def fetch(self, f, t):
+        self.calls.append((f, t))
+        times = [
+            ts for ts in range(f - f % DAY + (DAY if f % DAY else 0), t + 1, DAY)
+            if rule_is_open(datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).date())
+        ]
+        if len(times) == 0:
+            return None
+
+        closes = [100.0 + (ts // DAY) % 7 for ts in times]
+        if self.adjusted:
+            closes = [c / self.ratio if ts < self.split else c for c, ts in zip(closes, times)]
+        return pd.DataFrame({'c': closes, 'h': closes, 'l': closes, 'o': closes, 's': 'ok', 't': times, 'v': 1.0})
+
+
+def store(tmp_path):
+    return CandleStore(str(tmp_path / 'candles'), calendar=TradingCalendar(str(tmp_path / 'market_open.csv')))
+
+
+def utc(*date):
+    return int(datetime.datetime(*date, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def test_split_rewrites_the_cached_window(tmp_path):
+    candles = store(tmp_path)
+    provider = Provider(split=utc(2020, 6, 15))
+
+    before = candles.get('AAPL', 'stock', 'D', utc(2020, 1, 1), utc(2020, 6, 1), provider.fetch)
+    assert before['c'].min() >= 100.0
+
+    # ---> the provider split-adjusts its history; the next tail download overlaps the cache and notices
+    provider.adjusted = True
+    after = candles.get('AAPL', 'stock', 'D', utc(2020, 1, 1), utc(2020, 7, 1), provider.fetch)
+    expected = provider.fetch(utc(2020, 1, 1), utc(2020, 7, 1))
+
+    assert candles.revisions == 1
+    assert after['t'].tolist() == expected['t'].tolist()
+    assert after['c'].tolist() == expected['c'].tolist()
+    assert after.loc[after['t'] < utc(2020, 6, 15), 'c'].max() < 60.0
+
+    # ---> and the rewritten file serves the adjusted closes without another download
+    calls = len(provider.calls)
+    cached = candles.get('AAPL', 'stock', 'D', utc(2020, 1, 1), utc(2020, 6, 1), provider.fetch)
+    assert len(provider.calls) == calls
+    assert cached['c'].max() < 60.0
+
+
+def test_unrevised_tail_is_appended(tmp_path):
+    candles = store(tmp_path)
+    provider = Provider()
+
+    candles.get('MSFT', 'stock', 'D', utc(2020, 1, 1), utc(2020, 6, 1), provider.fetch)
+    df = candles.get('MSFT', 'stock', 'D', utc(2020, 1, 1), utc(2020, 7, 1), provider.fetch)
+
+    assert candles.revisions == 0
+    assert df['t'].is_unique and df['t'].is_monotonic_increasing
+    assert df['t'].tolist() == provider.fetch(utc(2020, 1, 1), utc(2020, 7, 1))['t'].tolist()
+
+    # ---> the tail download started on the last cached bar, so it overlapped the cache
+    f, _ = provider.calls[1]
+    assert f in df['t'].tolist() and f <= utc(2020, 6, 1)
+
+
+def test_warm_daily_pass_makes_no_requests(tmp_path):
+    candles = store(tmp_path)
+    provider = Provider()
+    t = int(time.time())
+
+    candles.get('SPY', 'stock', 'D', t - 60 * DAY, t, provider.fetch)
+    candles.get('SPY', 'stock', 'D', t - 60 * DAY, t, provider.fetch)
+
+    assert len(provider.calls) == 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from checkpoints import retry
+from finnhub import FinnhubClient
+import threading
+import requests
+import pytest
+
+
+class Unavailable:
+    """
+    Local server that answers every request 503
+    """
+
+    def __init__(self):
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+
+def test_retry_skips_errors_the_client_already_retried():
+    server = Unavailable()
+    client = FinnhubClient('test', retries=2, backoff=0, base_url=server.url)
+    try:
+        with pytest.raises(requests.exceptions.HTTPError) as error:
+            retry(lambda: client.get('quote', symbol='AAPL'), attempts=3, backoff=0,
+                  retry_on=(requests.exceptions.RequestException,))
+    finally:
+        server.httpd.shutdown()
+
+    # ---> the client's 1 + 2 retries, not 3 stage attempts x 3 requests
+    assert server.hits == 3
+    assert error.value.retried
+
+
+def test_retry_retries_other_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError('dropped')
+        return 'ok'
+
+    assert retry(flaky, attempts=3, backoff=0, retry_on=(ConnectionError,)) == 'ok'
+    assert len(calls) == 3
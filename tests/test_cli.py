@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from benchmarks.server import StandInServer
+import subprocess
+import pytest
+import json
+import sys
+import os
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that cron-style commands must not import
+HEAVY = ['plotly', 'datapane', 'altair', 'robin_stocks', 'pandas_datareader']
+
+# ---> records every attempt to import a heavy module, so the check holds whether or not it is installed
+CHILD = """
+import importlib.abc, json, sys
+
+HEAVY, attempted = set(sys.argv[1].split(',')), set()
+
+
+class Guard(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] in HEAVY:
+            attempted.add(name.split('.')[0])
+        return None
+
+
+sys.meta_path.insert(0, Guard())
+
+import portfolio_analysis
+status = portfolio_analysis.main(sys.argv[2:])
+print(json.dumps({'status': status, 'attempted': sorted(attempted)}))
+"""
+
+
+def run(tmp_path, argv):
+    with open(tmp_path / 'constants.py', 'w') as f:
+        f.write(f'ROOT = {str(tmp_path)!r}\n')
+
+    proc = subprocess.run(
+        [sys.executable, '-c', CHILD, ','.join(HEAVY)] + argv,
+        cwd=REPO,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), REPO])),
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('command', [
+    ['quote', 'AAPL', 'MSFT'],
+    ['backfill', 'AAPL', '--crypto', 'BTC', '--years', '0.1']
+])
+def test_commands_skip_heavy_imports(tmp_path, command):
+    with StandInServer() as server:
+        result = run(tmp_path, ['--key', 'test', '--finnhub-url', server.finnhub_url] + command)
+
+    assert result == {'status': 0, 'attempted': []}
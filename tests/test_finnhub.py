@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from finnhub import FinnhubClient, RateLimiter, candle_chunks, fetch_candles, get_client, MAX_BARS
+import finnhub
+import threading
+import requests
+import pytest
+import json
+import time
+
+
+class Scripted:
+    """
+    Local server answering each request with the next (status, body, headers) in `script`, then 200s
+    ---> records every request's path and query parameters
+    """
+
+    def __init__(self, script=(), respond=None):
+        self.script = list(script)
+        self.respond = respond
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                with server._lock:
+                    server.requests.append((parsed.path, params))
+                    step = server.script.pop(0) if len(server.script) > 0 else None
+                if step is None:
+                    step = (200, server.respond(params) if server.respond is not None else {'c': 1.0}, {})
+                status, body, headers = step
+
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ----------------- RATE LIMITER -----------------
+def test_rate_limiter_allows_a_burst_then_paces():
+    limiter = RateLimiter(600, capacity=5)
+
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    burst = time.monotonic() - start
+    for _ in range(5):
+        limiter.acquire()
+    paced = time.monotonic() - start
+
+    # ---> 10 tokens a second once the burst is spent
+    assert burst < 0.05
+    assert 0.4 <= paced < 1.0
+
+
+# ----------------- CLIENT -----------------
+def test_client_retries_throttled_and_failed_responses():
+    script = [(429, {'error': 'limit'}, {'Retry-After': '0'}), (502, {}, {})]
+    with Scripted(script) as server:
+        client = FinnhubClient('secret', retries=2, backoff=0, base_url=server.url)
+        assert client.get('quote', symbol='AAPL') == {'c': 1.0}
+
+    assert len(server.requests) == 3
+    assert all(params == {'symbol': 'AAPL', 'token': 'secret'} for _, params in server.requests)
+
+
+def test_client_marks_errors_once_retries_run_out():
+    with Scripted([(503, {}, {})] * 3) as server:
+        client = FinnhubClient('secret', retries=2, backoff=0, base_url=server.url)
+        with pytest.raises(requests.exceptions.HTTPError) as error:
+            client.get('quote', symbol='AAPL')
+
+    assert len(server.requests) == 3
+    assert error.value.retried
+
+    client = FinnhubClient('secret', retries=1, backoff=0, base_url='http://127.0.0.1:9', timeout=1)
+    with pytest.raises(requests.exceptions.ConnectionError) as error:
+        client.get('quote', symbol='AAPL')
+    assert error.value.retried
+
+
+def test_client_does_not_retry_client_errors():
+    with Scripted([(401, {'error': 'invalid token'}, {})]) as server:
+        client = FinnhubClient('secret', retries=3, backoff=0, base_url=server.url)
+        with pytest.raises(requests.exceptions.HTTPError) as error:
+            client.get('quote', symbol='AAPL')
+
+    assert len(server.requests) == 1
+    assert not getattr(error.value, 'retried', False)
+
+
+# ----------------- CANDLES -----------------
+def bars(params, step=60, cap=MAX_BARS, no_data_from=None):
+    """
+    Candle response for a provider with a bar every `step` seconds, returning at most `cap` bars
+    """
+
+    f, t = int(params['from']), int(params['to'])
+    if no_data_from is not None and f >= no_data_from:
+        return {'s': 'no_data'}
+
+    times = list(range(f - f % step, t + 1, step))[:cap]
+    return {'s': 'ok', 't': times, 'o': times, 'h': times, 'l': times, 'c': times, 'v': [1] * len(times)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Register a client for the 'candles' key against a Scripted server
+    """
+
+    def register(server):
+        client_ = FinnhubClient('candles', retries=0, backoff=0, base_url=server.url)
+        monkeypatch.setitem(finnhub._clients, 'candles', client_)
+        return client_
+
+    return register
+
+
+def test_candle_chunks_measure_stock_ranges_in_trading_time():
+    f, t = 1609718400, 1609718400 + 5 * 86400
+
+    # ---> five days of stock minute bars fit one request; crypto trades around the clock
+    assert candle_chunks(f, t, '1', type_='stock') == [(f, t)]
+    crypto = candle_chunks(f, t, '1', type_='crypto')
+    assert len(crypto) == 2
+    assert crypto[0][0] == f and crypto[-1][1] == t
+    assert all(a[1] == b[0] for a, b in zip(crypto, crypto[1:]))
+
+
+def test_capped_chunks_are_split_and_stitched(client):
+    f = 1609718400
+    t = f + (2 * MAX_BARS - 4) * 60
+    with Scripted(respond=bars) as server:
+        client(server)
+        df, gaps = fetch_candles('candles', 'BTC', f, t, '1', type_='crypto', chunk_bars=10 ** 6)
+
+    # ---> the first request came back at the cap, so each half was requested again
+    assert [int(params['from']) for _, params in server.requests] == [f, f, f + (MAX_BARS - 2) * 60]
+    assert gaps == []
+    assert list(df['t']) == list(range(f, t + 1, 60))
+
+
+def test_a_capped_single_step_is_reported_truncated(client):
+    def full(params):
+        # ---> every request comes back at the cap, however narrow
+        return bars({'from': params['from'], 'to': int(params['from']) + MAX_BARS}, step=1)
+
+    f = 1609718400
+    with Scripted(respond=full) as server:
+        client(server)
+        df, gaps = fetch_candles('candles', 'BTC', f, f + 120, '1', type_='crypto')
+
+    assert len(server.requests) == 3
+    assert [(g['from'], g['to'], g['reason']) for g in gaps] == [
+        (f, f + 60, 'truncated'), (f + 60, f + 120, 'truncated')
+    ]
+    assert len(df) > 0
+
+
+def test_no_data_gaps_are_merged(client):
+    f = 1609718400
+    t = f + 50 * 86400
+    with Scripted(respond=lambda params: bars(params, step=86400, no_data_from=f + 20 * 86400)) as server:
+        client(server)
+        df, gaps = fetch_candles('candles', 'BTC', f, t, 'D', type_='crypto', chunk_bars=10)
+
+    assert len(server.requests) == 5
+    assert [(g['from'], g['to'], g['reason']) for g in gaps] == [(f + 20 * 86400, t, 'no_data')]
+    assert list(df['t']) == list(range(f, f + 20 * 86400 + 1, 86400))
+
+
+def test_failed_chunks_are_reported_with_their_error(client):
+    f = 1609718400
+    with Scripted([(403, {'error': 'no access'}, {})]) as server:
+        client(server)
+        df, gaps = fetch_candles('candles', 'AAPL', f, f + 10 * 86400)
+
+    assert df is None
+    assert len(gaps) == 1
+    assert (gaps[0]['from'], gaps[0]['to'], gaps[0]['reason']) == (f, f + 10 * 86400, 'error')
+    assert isinstance(gaps[0]['error'], requests.exceptions.HTTPError)
+
+
+def test_shared_pool_grows_but_never_shrinks(client):
+    with Scripted() as server:
+        client(server)
+        assert get_client('candles').pool_size == 10
+        assert get_client('candles', pool_size=16).pool_size == 16
+        assert get_client('candles', pool_size=4).pool_size == 16
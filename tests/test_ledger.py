@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from ledger import OrderLedger, STOCK_ORDERS_URL, ORDER_COLUMNS
+from types import SimpleNamespace
+
+
+def order(id_, updated_at, state='filled', quantity='10.0', price='100.0'):
+    return {
+        'id': id_, 'instrument': f'https://api.robinhood.com/instruments/{id_[0]}/', 'updated_at': updated_at,
+        'state': state, 'executions': [], 'cancel': None, 'type': 'market', 'side': 'buy', 'fees': '0.00',
+        'last_transaction_at': updated_at, 'quantity': quantity, 'average_price': price
+    }
+
+
+class Broker:
+    """
+    Order endpoints of robin_stocks.robinhood: stock orders honour the updated_at[gte] filter
+    """
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.payloads = []
+        self.lookups = []
+        self.fail = False
+        self.helper = SimpleNamespace(request_get=self.request_get)
+        self.stocks = SimpleNamespace(get_symbol_by_url=self.symbol)
+
+    def request_get(self, url, data_type=None, payload=None):
+        if url != STOCK_ORDERS_URL:
+            return []
+        self.payloads.append(payload)
+        if self.fail:
+            return [None]
+        since = (payload or {}).get('updated_at[gte]', '')
+        return [o for o in self.orders if o['updated_at'] >= since]
+
+    def symbol(self, url):
+        self.lookups.append(url)
+        return {'a': 'AAPL', 'm': 'MSFT'}[url.rstrip('/').rsplit('/', 1)[1]]
+
+
+def test_sync_asks_only_for_orders_updated_since_the_cursor(tmp_path):
+    broker = Broker([
+        order('a1', '2021-01-04T15:00:00Z'),
+        order('m1', '2021-01-05T15:00:00Z', state='queued')
+    ])
+    ledger = OrderLedger('iain', root=str(tmp_path))
+
+    stock, _, _ = ledger.sync(broker)
+    assert list(stock.columns) == ORDER_COLUMNS
+    assert stock['symbol'].tolist() == ['AAPL']
+    assert ledger.read('stock')[1] == '2021-01-05T15:00:00Z'
+
+    # ---> the queued order fills; only orders updated since the cursor come back, and AAPL's symbol is reused
+    broker.orders[1] = order('m1', '2021-01-06T15:00:00Z', price='200.0')
+    broker.orders.append(order('a2', '2021-01-06T16:00:00Z', quantity='5.0'))
+    stock, _, _ = OrderLedger('iain', root=str(tmp_path)).sync(broker)
+
+    assert broker.payloads == [None, {'updated_at[gte]': '2021-01-05T15:00:00Z'}]
+    assert stock['symbol'].tolist() == ['AAPL', 'MSFT', 'AAPL']
+    assert stock['average_price'].tolist() == [100.0, 200.0, 100.0]
+    assert broker.lookups.count('https://api.robinhood.com/instruments/a/') == 1
+    assert ledger.read('stock')[1] == '2021-01-06T16:00:00Z'
+
+
+def test_resent_order_replaces_the_stored_one(tmp_path):
+    broker = Broker([order('a1', '2021-01-04T15:00:00Z')])
+    ledger = OrderLedger('iain', root=str(tmp_path))
+    ledger.sync(broker)
+
+    broker.orders = [order('a1', '2021-01-04T15:00:00Z', quantity='12.0')]
+    stock, _, _ = ledger.sync(broker)
+
+    assert stock['quantity'].tolist() == [12.0]
+
+
+def test_failed_sync_keeps_the_stored_ledger(tmp_path):
+    broker = Broker([order('a1', '2021-01-04T15:00:00Z')])
+    ledger = OrderLedger('iain', root=str(tmp_path))
+    ledger.sync(broker)
+
+    broker.fail = True
+    stock, _, _ = ledger.sync(broker)
+
+    assert stock['symbol'].tolist() == ['AAPL']
+    assert ledger.read('stock')[1] == '2021-01-04T15:00:00Z'
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from mark_to_market import MarkToMarket, kpis
+from streaming import QuoteStream
+import numpy as np
+import pytest
+import json
+
+
+def holdings():
+    return {
+        'tickers': [['AAPL'], ['SPY'], ['BTC']],
+        'quantities': [[10.0], [2.0], [0.5]],
+        'prices': [[100.0], [400.0], [float('nan')]],
+        'cash': 1000.0
+    }
+
+
+def test_updates_adjust_the_totals():
+    live = MarkToMarket.from_holdings(holdings(), interval=300)
+    assert live.values() == {
+        'Cash': 1000.0, 'Total Portfolio Value': 2800.0, 'Equity Value': 1800.0, 'Crypto Value': 0.0
+    }
+
+    # ---> BTC counts once priced; unknown symbols are ignored
+    live.update('BTC', 20000.0, t=0)
+    live.update('AAPL', 110.0, t=10)
+    live.update('TSLA', 1.0, t=20)
+
+    values = live.values()
+    assert (values['Equity Value'], values['Crypto Value']) == (1900.0, 10000.0)
+    assert values['Total Portfolio Value'] == 12900.0
+
+
+def test_running_totals_match_a_full_revaluation():
+    live = MarkToMarket.from_holdings(holdings(), interval=10 ** 9)
+    rng = np.random.default_rng(0)
+    for i, symbol in enumerate(rng.choice(['AAPL', 'SPY', 'BTC'], 10000)):
+        live.update(symbol, float(rng.uniform(1, 1000)), t=i)
+
+    expected = np.nan_to_num(live.quantity * live.price)
+    assert live.values()['Equity Value'] == pytest.approx(expected[~live.crypto].sum())
+    assert live.values()['Crypto Value'] == pytest.approx(expected[live.crypto].sum())
+
+
+def test_trades_move_cash_and_add_positions():
+    live = MarkToMarket.from_holdings(holdings())
+    live.trade('ETH', 2.0, 1500.0, crypto=True, t=0)
+    live.trade('AAPL', -5.0, 120.0, t=1)
+
+    values = live.values()
+    assert values['Cash'] == 1000.0 - 3000.0 + 600.0
+    assert values['Crypto Value'] == 3000.0
+    assert values['Equity Value'] == 5 * 120.0 + 2 * 400.0
+
+
+def test_snapshots_follow_the_interval():
+    live = MarkToMarket.from_holdings(holdings(), interval=300)
+    for t in [0, 100, 299, 300, 450, 601, 602]:
+        live.update('AAPL', 100.0 + t, t=t)
+
+    assert [t for t, *_ in live.snapshots] == [0, 300, 601]
+    assert list(live.intraday().columns) == ['Cash', 'Total Portfolio Value', 'Equity Value', 'Crypto Value']
+
+
+def test_kpis_against_the_previous_close():
+    current = {'Cash': 0.0, 'Total Portfolio Value': 110.0, 'Equity Value': 110.0, 'Crypto Value': 0.0}
+    previous = {'Cash': 0.0, 'Total Portfolio Value': 100.0, 'Equity Value': 100.0, 'Crypto Value': 0.0}
+
+    result = kpis(current, previous)
+    assert result['Equity Value Change'] == pytest.approx(10.0)
+    assert result['Crypto Value Change'] == 0.0
+
+
+def test_attached_stream_updates_positions():
+    stream = QuoteStream('test', ['AAPL', 'BINANCE:BTCUSDT'])
+    live = MarkToMarket.from_holdings(holdings()).attach(stream, {'BINANCE:BTCUSDT': 'BTC'})
+
+    stream._on_message(json.dumps({'type': 'trade', 'data': [
+        {'s': 'BINANCE:BTCUSDT', 'p': 30000.0, 'v': 0.1, 't': 1600000000000},
+        {'s': 'AAPL', 'p': 120.0, 'v': 5.0, 't': 1600000001000}
+    ]}))
+
+    assert live.values()['Crypto Value'] == 15000.0
+    assert live.values()['Equity Value'] == 1200.0 + 800.0
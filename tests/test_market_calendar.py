@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from market_calendar import TradingCalendar, easter, rule_is_open
+from datetime import date
+import datetime
+import pytest
+
+
+# NYSE full-day closures (weekdays only), as published by the exchange
+CLOSED = {
+    2004: [
+        (1, 1), (1, 19), (2, 16), (4, 9), (5, 31), (6, 11), (7, 5), (9, 6), (11, 25), (12, 24)
+    ],
+    2012: [
+        (1, 2), (1, 16), (2, 20), (4, 6), (5, 28), (7, 4), (9, 3), (10, 29), (10, 30), (11, 22), (12, 25)
+    ],
+    2021: [
+        (1, 1), (1, 18), (2, 15), (4, 2), (5, 31), (7, 5), (9, 6), (11, 25), (12, 24)
+    ],
+    2022: [
+        (1, 17), (2, 21), (4, 15), (5, 30), (6, 20), (7, 4), (9, 5), (11, 24), (12, 26)
+    ],
+    2023: [
+        (1, 2), (1, 16), (2, 20), (4, 7), (5, 29), (6, 19), (7, 4), (9, 4), (11, 23), (12, 25)
+    ],
+    2025: [
+        (1, 1), (1, 9), (1, 20), (2, 17), (4, 18), (5, 26), (6, 19), (7, 4), (9, 1), (11, 27), (12, 25)
+    ]
+}
+
+# Trading days per year
+SESSIONS = {2021: 252, 2022: 251, 2023: 250, 2024: 252}
+
+
+@pytest.mark.parametrize('year', sorted(CLOSED))
+def test_closed_weekdays(year):
+    days = [date(year, 1, 1) + datetime.timedelta(days=i) for i in range(366)]
+    closed = [
+        (d.month, d.day) for d in days if d.year == year and d.weekday() < 5 and not rule_is_open(d)
+    ]
+
+    assert closed == CLOSED[year]
+
+
+@pytest.mark.parametrize('year, sessions', sorted(SESSIONS.items()))
+def test_sessions_per_year(tmp_path, year, sessions):
+    calendar = TradingCalendar(str(tmp_path / 'market_open.csv'))
+
+    assert calendar.trading_days_between(date(year, 1, 1), date(year, 12, 31)) == sessions
+
+
+@pytest.mark.parametrize('year, sunday', [(2000, (4, 23)), (2019, (4, 21)), (2024, (3, 31)), (2038, (4, 25))])
+def test_easter(year, sunday):
+    assert easter(year) == date(year, *sunday)
+
+
+def test_calendar_is_persisted(tmp_path):
+    path = str(tmp_path / 'market_open.csv')
+    TradingCalendar(path).trading_days(date(2022, 12, 20), date(2023, 1, 6))
+
+    calendar = TradingCalendar(path)
+    assert (calendar.first, calendar.last) == (date(2022, 12, 20), date(2023, 1, 6))
+    assert not calendar.is_open(date(2023, 1, 2))
+    assert calendar.trading_days(date(2022, 12, 23), date(2022, 12, 28)) == [
+        date(2022, 12, 23), date(2022, 12, 27), date(2022, 12, 28)
+    ]
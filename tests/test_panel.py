@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from panel import PricePanel
+import pandas as pd
+import numpy as np
+import datetime
+
+
+def candles(dates, closes):
+    return pd.DataFrame({
+        't': [int(datetime.datetime(*d, tzinfo=datetime.timezone.utc).timestamp()) for d in dates],
+        'c': closes
+    })
+
+
+def panel():
+    # ---> ETH lists a day later than AAPL, and trades on the weekend AAPL does not
+    return PricePanel.from_candles({
+        'AAPL': candles([(2021, 1, 1), (2021, 1, 4), (2021, 1, 5)], [10.0, 11.0, 12.0]),
+        'ETH': candles([(2021, 1, 2), (2021, 1, 3), (2021, 1, 4), (2021, 1, 5)], [1.0, 2.0, 3.0, 4.0]),
+        'DELISTED': None
+    })
+
+
+def test_closes_are_placed_by_date():
+    p = panel()
+
+    assert p.shape == (5, 3)
+    assert p.symbols == ['AAPL', 'ETH', 'DELISTED']
+    np.testing.assert_array_equal(p.column('AAPL'), [10.0, np.nan, np.nan, 11.0, 12.0])
+    np.testing.assert_array_equal(p.column('ETH'), [np.nan, 1.0, 2.0, 3.0, 4.0])
+    assert np.isnan(p.column('DELISTED')).all()
+    assert p.frame().index[0] == datetime.date(2021, 1, 1)
+
+
+def test_insert_merges_dates_and_symbols():
+    p = panel().insert('BTC', ['2020-12-31', '2021-01-05'], [5.0, 6.0])
+
+    assert p.shape == (6, 4)
+    assert p.dates[0] == np.datetime64('2020-12-31')
+    np.testing.assert_array_equal(p.column('AAPL'), [np.nan, 10.0, np.nan, np.nan, 11.0, 12.0])
+    np.testing.assert_array_equal(p.column('BTC')[[0, -1]], [5.0, 6.0])
+
+
+def test_ffill_and_last():
+    p = panel()
+    p.ffill()
+
+    np.testing.assert_array_equal(p.column('AAPL'), [10.0, 10.0, 10.0, 11.0, 12.0])
+    assert np.isnan(p.column('ETH')[0])
+    assert p.last()[['AAPL', 'ETH']].tolist() == [12.0, 4.0]
+
+
+def test_views_share_the_matrix():
+    p = panel()
+    window = p.between(datetime.date(2021, 1, 3), datetime.date(2021, 1, 4))
+    sub = p.select(['AAPL', 'ETH'])
+
+    assert len(window) == 2 and window.column('ETH').tolist() == [2.0, 3.0]
+    window.values[0, 0] = 99.0
+    assert p.column('AAPL')[2] == 99.0 and np.shares_memory(sub.values, p.values)
+
+
+def test_to_candles_round_trips():
+    p = panel()
+    again = PricePanel.from_candles({'ETH': p.to_candles('ETH')})
+
+    np.testing.assert_array_equal(again.column('ETH'), [1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(again.dates, p.dates[1:])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from quote_provider import QuoteProvider
+import pandas as pd
+import threading
+import finnhub
+import time
+
+
+class Blocking:
+    """
+    Quote source that holds each request until `release` is set
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, symbol, kind):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [100.0, 1.0, 1.0, None, None, None, 99.0, 0]
+
+
+def race(provider, source, symbol='AAPL'):
+    """
+    One caller fetches `symbol` while a second waits on it; returns each caller's (quote, error)
+    """
+
+    provider._fetch = source
+    outcomes = [None, None]
+
+    def call(i):
+        try:
+            outcomes[i] = (provider.quote(symbol), None)
+        except BaseException as e:
+            outcomes[i] = (None, e)
+
+    owner = threading.Thread(target=call, args=(0,))
+    owner.start()
+    while source.calls == 0:
+        time.sleep(0.001)
+    waiter = threading.Thread(target=call, args=(1,))
+    waiter.start()
+    while provider.coalesced == 0:
+        time.sleep(0.001)
+
+    source.release.set()
+    owner.join(5)
+    waiter.join(5)
+    return outcomes
+
+
+def test_concurrent_requests_are_coalesced():
+    provider = QuoteProvider()
+    source = Blocking()
+    (first, _), (second, _) = race(provider, source)
+
+    assert first == second and first[0] == 100.0
+    assert source.calls == 1
+    assert provider.quote('AAPL') == first and provider.hits == 1
+
+
+def test_errors_reach_waiters():
+    provider = QuoteProvider()
+    (_, first), (_, second) = race(provider, Blocking(ValueError('no quote')))
+
+    assert isinstance(first, ValueError) and second is first
+    assert provider._inflight == {}
+
+
+def test_interrupted_fetch_releases_waiters():
+    provider = QuoteProvider()
+    (_, first), (_, second) = race(provider, Blocking(KeyboardInterrupt()))
+
+    assert isinstance(first, KeyboardInterrupt)
+    assert isinstance(second, RuntimeError)
+    assert provider._inflight == {}
+
+
+def test_expired_entries_are_swept():
+    provider = QuoteProvider(ttl=0.05)
+    provider._fetch = lambda symbol, kind: [1.0]
+    provider.quote('AAPL')
+    time.sleep(0.06)
+    provider.quote('MSFT')
+
+    assert list(provider._cache) == [('stock', 'MSFT')]
+
+
+def test_candles_are_copied_for_each_caller(monkeypatch):
+    calls = []
+
+    def candles(key, symbol, years, resolution, type_, cache):
+        calls.append(symbol)
+        return pd.DataFrame({'t': [1600000000], 'c': [100.0]})
+
+    monkeypatch.setattr(finnhub, 'candles', candles)
+    provider = QuoteProvider('test')
+    first = provider.candles('AAPL')
+    first['t'] = pd.to_datetime(first['t'], unit='s')
+
+    assert provider.candles('AAPL')['t'].tolist() == [1600000000]
+    assert calls == ['AAPL']
+
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from replay import replay, replay_loop, check_parity
+from benchmarks import synthetic
+import pandas as pd
+import numpy as np
+import datetime
+
+
+COLUMNS = ['symbol', 'date', 'type', 'direction', 'fees', 'quantity', 'average_price']
+
+
+def day(n):
+    return datetime.date(2021, 3, 1) + datetime.timedelta(days=n)
+
+
+def transactions():
+    rows = [
+        ['Cash', day(0), None, 'deposit', 0.0, 1.0, 10000.0],                # transfer in
+        ['AAPL', day(1), 'market', 'buy', 0.0, 10.0, 120.0],
+        ['MSFT', day(1), 'limit', 'buy', 0.0, 5.0, 230.0],
+        ['AAPL', day(3), 'market', 'sell', 0.0, 4.0, 125.0],
+        ['TSLA', day(4), '', 'buy', 0.0, 1.0, 600.0],                        # stock referral (no cash)
+        ['Cash', day(4), None, 'deposit', 0.0, 1.0, 5.0],                    # cash referral
+        ['AAPL', day(6), 'market', 'buy', 0.0, 2.0, 119.0],                  # same-day duplicates
+        ['AAPL', day(6), 'market', 'buy', 0.0, 2.0, 119.0],
+        ['Cash', day(8), None, 'withdraw', 0.0, 1.0, 750.0],                 # transfer out
+        ['MSFT', day(9), 'market', 'sell', 0.0, 5.0, 240.0],
+        ['BTC', day(10), 'market', 'buy', 0.0, 0.015, 45000.0],
+        ['BTC', day(12), 'market', 'sell', 0.0, 0.005, 47000.0]
+    ]
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def test_replay_matches_loop():
+    t = transactions()
+    fast = replay(t, day(0), day(15))
+    slow = replay_loop(t, day(0), day(15))
+
+    assert list(fast.columns) == list(slow.columns)
+    assert fast.index.equals(slow.index)
+    np.testing.assert_allclose(fast.values, slow.values, rtol=1e-9, atol=1e-6)
+    assert check_parity(t, day(0), day(15))
+
+
+def test_replay_positions():
+    last = replay(transactions(), day(0), day(15)).iloc[-1]
+
+    assert last['AAPL'] == 10.0
+    assert last['MSFT'] == 0.0
+    assert last['TSLA'] == 1.0
+    assert np.isclose(last['BTC'], 0.01)
+    assert np.isclose(
+        last['Cash'],
+        10000 - 1200 - 1150 + 500 + 5 - 2 * 238 - 750 + 1200 - 675 + 235
+    )
+
+
+def test_replay_matches_loop_on_synthetic_history():
+    t = synthetic.transactions(trades=300, years=1, seed_=3)
+
+    assert check_parity(t)
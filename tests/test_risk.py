@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from risk import risk_metrics, returns_matrix, BENCHMARK, TRADING_DAYS
+import pandas as pd
+import numpy as np
+
+
+def matrix(days=60, seed=0):
+    """
+    Benchmark returns, and two holdings moving exactly 2x and 0.5x with it
+    """
+
+    bench = np.random.default_rng(seed).normal(0.0, 0.01, days)
+    return pd.DataFrame(
+        {'A': 2 * bench, 'B': 0.5 * bench, BENCHMARK: bench},
+        index=pd.bdate_range('2021-01-04', periods=days)
+    )
+
+
+def test_metrics_of_exact_multiples():
+    returns = matrix()
+    holdings, correlation, portfolio = risk_metrics(returns, {'A': 300.0, 'B': 100.0})
+
+    bench = returns[BENCHMARK].values
+    np.testing.assert_allclose(holdings['weight'], [0.75, 0.25])
+    np.testing.assert_allclose(holdings['beta'], [2.0, 0.5])
+    np.testing.assert_allclose(holdings['volatility'], np.array([2.0, 0.5]) * bench.std(ddof=1) * np.sqrt(252))
+    np.testing.assert_allclose(correlation.values, 1.0)
+
+    simple = np.expm1(returns[['A', 'B']].values) @ [0.75, 0.25]
+    cutoff = np.quantile(simple, 0.05)
+    assert np.isclose(portfolio['beta'], 1.625)
+    assert np.isclose(portfolio['volatility'], 1.625 * bench.std(ddof=1) * np.sqrt(TRADING_DAYS))
+    assert np.isclose(portfolio['var'], -cutoff)
+    assert np.isclose(portfolio['cvar'], -simple[simple <= cutoff].mean())
+    assert portfolio['days'] == 60 and portfolio['unpriced'] == []
+
+
+def test_missing_returns_are_left_out():
+    returns = matrix()
+    rng = np.random.default_rng(1)
+
+    # ---> C trades for 30 days, but the benchmark is missing for half of them: too few shared days for a beta
+    returns['C'] = np.nan
+    returns.iloc[:30, returns.columns.get_loc('C')] = rng.normal(0.0, 0.02, 30)
+    bench = returns.columns.get_loc(BENCHMARK)
+    returns.iloc[15:30, bench] = np.nan
+    returns.iloc[15:30, returns.columns.get_loc('A')] = rng.normal(0.0, 0.02, 15)
+    returns.iloc[15:30, returns.columns.get_loc('B')] = rng.normal(0.0, 0.02, 15)
+
+    # ---> E listed ten days ago: too little history for any statistic
+    returns['E'] = np.nan
+    returns.iloc[-10:, returns.columns.get_loc('E')] = rng.normal(0.0, 0.02, 10)
+
+    holdings, _, portfolio = risk_metrics(returns, {'A': 300.0, 'B': 100.0, 'C': 100.0, 'E': 100.0})
+
+    np.testing.assert_allclose(holdings.loc[['A', 'B'], 'beta'], [2.0, 0.5])
+    assert np.isnan(holdings.loc['C', 'beta']) and holdings.loc['E'].drop('weight').isna().all()
+
+    # ---> weights renormalised over the holdings with a beta
+    assert np.isclose(portfolio['beta'], 1.625)
+    assert portfolio['unpriced'] == ['E']
+    assert portfolio['days'] == 15
+    assert portfolio['window'] == (returns.index[0], returns.index[14])
+    assert np.isfinite(portfolio['volatility'])
+
+
+def test_returns_matrix_aligns_on_benchmark_days():
+    days = pd.date_range('2021-01-01', periods=10)
+    benchmark = pd.Series(100.0 * 1.01 ** np.arange(10), index=days).loc[days.dayofweek < 5]
+    prices = pd.DataFrame({'BTC': 50.0 * 1.02 ** np.arange(10)}, index=days.date)
+
+    returns = returns_matrix(prices, benchmark)
+
+    assert list(returns.index) == list(benchmark.index[1:])
+    # ---> the weekend's crypto moves fold into Monday's return
+    assert np.isclose(returns.loc['2021-01-04', 'BTC'], 3 * np.log(1.02))
+    assert np.allclose(returns[BENCHMARK].loc['2021-01-05':], np.log(1.01))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from runner import run_reports
+
+
+def build(user):
+    # ---> generate_report returns None when the Robinhood login fails
+    return None if user == 'locked' else 'COMPLETE'
+
+
+def test_failed_build_is_logged_as_an_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    summary = run_reports(['iain', 'locked', 'alex'], build, max_workers=2)
+
+    assert summary['iain'][0] == summary['alex'][0] == 'COMPLETE'
+    assert summary['locked'][:2] == ['ERROR', 'Report returned None']
+
+    log = (tmp_path / 'run_log.txt').read_text().splitlines()
+    assert len(log) == 3
+    assert sum("Unable to Generate locked's Report (Report returned None)" in line for line in log) == 1
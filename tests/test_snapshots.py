@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from market_calendar import TradingCalendar
+from snapshots import SnapshotStore
+import pandas as pd
+import datetime
+
+
+class Closes:
+    """
+    Daily AAPL closes, as the candle store serves them: once `split`, the whole history is re-adjusted to half
+    the old close (the store rewrites it when its overlapping bar shows the revision)
+    """
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.split = False
+        self.calls = []
+
+    def load(self, start, end):
+        self.calls.append((start, end))
+        days = self.calendar.trading_days(start, end)
+        close = 50.0 if self.split else 100.0
+        return pd.DataFrame({'AAPL': close}, index=days)
+
+
+def transactions():
+    return pd.DataFrame(
+        [
+            ['Cash', datetime.date(2020, 2, 3), None, 'deposit', 0.0, 1.0, 5000.0],
+            ['AAPL', datetime.date(2020, 2, 4), 'market', 'buy', 0.0, 10.0, 100.0]
+        ],
+        columns=['symbol', 'date', 'type', 'direction', 'fees', 'quantity', 'average_price']
+    )
+
+
+def test_revised_close_forces_a_full_rebuild(tmp_path):
+    calendar = TradingCalendar(str(tmp_path / 'market_open.csv'))
+    closes = Closes(calendar)
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+
+    def update(present):
+        return store.update('iain', transactions(), closes.load, calendar.trading_days, ['AAPL'], [], present)
+
+    values, reason = update(datetime.date(2020, 3, 2))
+    assert reason == 'no snapshot'
+    assert values['Equity Value'].iloc[-1] == 1000.0
+
+    # ---> an incremental run downloads closes once, from the last snapshot day
+    closes.calls.clear()
+    values, reason = update(datetime.date(2020, 3, 4))
+    assert reason is None
+    assert closes.calls == [(datetime.date(2020, 2, 28), datetime.date(2020, 3, 4))]
+
+    closes.split = True
+    closes.calls.clear()
+    values, reason = update(datetime.date(2020, 3, 6))
+    assert reason == 'price revision'
+    assert (values['Equity Value'].loc[datetime.date(2020, 2, 4):] == 500.0).all()
+    assert closes.calls[0] == (datetime.date(2020, 3, 3), datetime.date(2020, 3, 6))
+    assert len(closes.calls) == 2
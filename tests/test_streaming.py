@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from streaming import QuoteStream
+import threading
+import json
+
+
+def trades(*prices, symbol='AAPL', t=1600000000):
+    return json.dumps({
+        'type': 'trade',
+        'data': [{'s': symbol, 'p': p, 'v': 1.0, 't': (t + i) * 1000} for i, p in enumerate(prices)]
+    })
+
+
+def test_listeners_may_read_the_stream():
+    stream = QuoteStream('test', ['AAPL'])
+    seen = []
+    stream.listeners.append(lambda symbol, price, t: seen.append((price, stream.quote(symbol)[0])))
+
+    # ---> a listener reading the stream under its lock would deadlock the feed thread
+    thread = threading.Thread(target=stream._on_message, args=(trades(100.0, 101.0),), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert seen == [(100.0, 101.0), (101.0, 101.0)]
+    assert stream.trades == 2
+
+
+def test_failing_listener_does_not_stop_the_others(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stream = QuoteStream('test', ['AAPL'])
+    seen = []
+    stream.listeners += [lambda *args: 1 / 0, lambda symbol, price, t: seen.append(price)]
+
+    stream._on_message(trades(100.0, 101.0))
+
+    assert seen == [100.0, 101.0]
+    assert stream.errors == 2
+    assert len((tmp_path / 'run_log.txt').read_text().splitlines()) == 1
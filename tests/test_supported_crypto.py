@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import supported_crypto
+import pandas as pd
+import time
+
+
+def test_concurrent_first_use_builds_one_catalog(monkeypatch):
+    built = []
+
+    class Catalog:
+        def __init__(self, key):
+            built.append(key)
+            time.sleep(0.05)
+
+    monkeypatch.setattr(supported_crypto, 'CryptoCatalog', Catalog)
+    monkeypatch.setattr(supported_crypto, '_catalogs', {})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        catalogs = list(pool.map(supported_crypto.get_catalog, ['key'] * 8))
+
+    assert built == ['key']
+    assert all(catalog is catalogs[0] for catalog in catalogs)
+
+
+def test_best_pair_prefers_exchange_then_quote_currency(tmp_path):
+    path = str(tmp_path / 'supported_crypto.csv')
+    pd.DataFrame(
+        [
+            ['KRAKEN', 'KRAKEN:XBTUSD', 'BTC/USD', 'Bitcoin'],
+            ['BINANCE', 'BINANCE:BTCUSDC', 'BTC/USDC', 'Bitcoin'],
+            ['BINANCE', 'BINANCE:BTCUSDT', 'BTC/USDT', 'Bitcoin'],
+            ['COINBASE', 'COINBASE:DOGE-USD', 'DOGE/USD', 'Dogecoin'],
+        ],
+        columns=supported_crypto.COLUMNS
+    ).to_csv(path, index=False)
+    catalog = supported_crypto.CryptoCatalog('key', path=path)
+
+    assert catalog.best_pair('BTC') == catalog.best_pair('btcusd') == 'BINANCE:BTCUSDT'
+    assert catalog.best_pair('DOGE') == 'COINBASE:DOGE-USD'
+    assert catalog.best_pair('SHIB') is None
+    assert catalog.exists('KRAKEN:XBTUSD')
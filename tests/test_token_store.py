@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from token_store import TokenStore, REFRESH_MARGIN
+from types import SimpleNamespace
+import token_store
+import robinhood
+import threading
+import pytest
+import types
+import time
+import stat
+import sys
+import os
+
+
+def response(access_token, expires_in=86400):
+    return {'token_type': 'Bearer', 'access_token': access_token, 'refresh_token': f'{access_token}-refresh',
+            'expires_in': expires_in}
+
+
+class Broker:
+    """
+    robin_stocks.robinhood's login calls: refresh and password grants, counted
+    """
+
+    def __init__(self, refresh_ok=True, mfa=False):
+        self.refresh_ok = refresh_ok
+        self.mfa = mfa
+        self.grants = []
+        self.authorization = None
+        self.helper = SimpleNamespace(
+            request_post=self.request_post,
+            update_session=lambda key, value: setattr(self, 'authorization', value),
+            set_login_state=lambda state: None
+        )
+        self.urls = SimpleNamespace(login_url=lambda: 'https://api.robinhood.com/oauth2/token/')
+        self.authentication = SimpleNamespace(generate_device_token=lambda: 'device')
+
+    def request_post(self, url, payload, jsonify_data=True):
+        self.grants.append(payload['grant_type'])
+        time.sleep(0.05)
+        if payload['grant_type'] == 'refresh_token':
+            return response('refreshed') if self.refresh_ok else {'detail': 'invalid refresh token'}
+        return {'mfa_required': True} if self.mfa else response('password')
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = TokenStore(str(tmp_path / 'tokens'))
+    monkeypatch.setattr(token_store, '_store', store)
+    return store
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker()
+    package = types.ModuleType('robin_stocks')
+    package.robinhood = broker
+    monkeypatch.setitem(sys.modules, 'robin_stocks', package)
+    monkeypatch.setitem(sys.modules, 'robin_stocks.robinhood', broker)
+    return broker
+
+
+def stored(store, expires_in):
+    return store.write('iain', response('stored', expires_in), 'device', 'internal')
+
+
+def test_written_tokens_are_private_and_expire(store):
+    token = store.write('iain', response('abc', 600), 'device', 'internal', now=1000.0)
+
+    assert store.read('iain') == token
+    assert (token['issued_at'], token['expires_at']) == (1000.0, 1600.0)
+    assert stat.S_IMODE(os.stat(store.path('iain')).st_mode) == 0o600
+    assert TokenStore.fresh(token, now=1600.0 - REFRESH_MARGIN - 1)
+    assert not TokenStore.fresh(token, now=1600.0 - REFRESH_MARGIN)
+
+
+def test_fresh_token_is_used_without_a_request(store, broker):
+    stored(store, 2 * REFRESH_MARGIN)
+
+    info = robinhood.login('iain@example.com', 'password', interactive=False)
+
+    assert broker.grants == []
+    assert broker.authorization == 'Bearer stored'
+    assert info['detail'] == 'logged in using stored authentication.'
+
+
+def test_expiring_token_is_refreshed_once_across_concurrent_logins(store, broker):
+    stored(store, REFRESH_MARGIN // 2)
+
+    threads = [
+        threading.Thread(target=robinhood.login, args=('iain@example.com', 'password'), kwargs={'interactive': False})
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    # ---> the first login refreshes under the account lock; the others then find a fresh token
+    assert broker.grants == ['refresh_token']
+    assert store.read('iain')['access_token'] == 'refreshed'
+
+
+def test_failed_refresh_falls_back_to_the_password(store, broker):
+    stored(store, 0)
+    broker.refresh_ok = False
+
+    robinhood.login('iain@example.com', 'password', interactive=False)
+
+    assert broker.grants == ['refresh_token', 'password']
+    assert store.read('iain')['access_token'] == 'password'
+
+
+def test_batch_login_never_prompts(store, broker):
+    broker.mfa = True
+
+    with pytest.raises(Exception, match='needs a verification code'):
+        robinhood.login('iain@example.com', 'password', interactive=False)
+    assert store.read('iain') is None
+
+
+def test_lock_is_exclusive(store):
+    events = []
+
+    def hold():
+        with store.lock('iain'):
+            events.append('first in')
+            time.sleep(0.1)
+            events.append('first out')
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    while len(events) == 0:
+        time.sleep(0.001)
+    with store.lock('iain'):
+        events.append('second in')
+    thread.join()
+
+    assert events == ['first in', 'first out', 'second in']
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+"""
+    Author: Iain Muir, iam9ez@virginia.edu
+    Date:
+    Project:
+"""
+
+from contextlib import contextmanager
+from constants import ROOT
+import pickle
+import fcntl
+import json
+import time
+import os
+
+
+# Access tokens are refreshed this many seconds before they expire
+REFRESH_MARGIN = 3600
+
+TOKEN_FIELDS = ['token_type', 'access_token', 'refresh_token', 'device_token', 'scope', 'issued_at', 'expires_at']
+
+
+class TokenStore:
+    """
+    Robinhood tokens per account, with the time each was issued and expires
+    ---> Input/tokens/<name>.json (owner read/write only), written atomically
+    ---> `lock(name)` is an exclusive file lock, so concurrent runs for one account refresh or log in once
+         and the others pick up the new token
+    ---> tokens saved by the old login (Input/robinhood_<name>.pickle) are imported with an unknown
+         expiry, so their refresh token is used instead of a password login
+
+    :param root
+    """
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else os.path.join(ROOT, 'Input', 'tokens')
+
+    def path(self, name):
+        return os.path.join(self.root, f'{name}.json')
+
+    @contextmanager
+    def lock(self, name):
+        """
+        Hold the account's lock (blocks while another process holds it)
+
+        :param name
+        :return:
+        """
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f'{name}.lock'), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read(self, name):
+        """
+        Stored token of an account
+
+        :param name
+        :return: dict of TOKEN_FIELDS, or None
+        """
+
+        if os.path.exists(self.path(name)):
+            with open(self.path(name)) as f:
+                return json.loads(f.read())
+
+        return self._legacy(name)
+
+    def write(self, name, data, device_token, scope, now=None):
+        """
+        Save a token response from the login endpoint
+
+        :param name
+        :param data: response with token_type, access_token, refresh_token, expires_in
+        :param device_token
+        :param scope
+        :param now
+        :return: the stored token
+        """
+
+        now = now if now is not None else time.time()
+        token = {
+            'token_type': data['token_type'],
+            'access_token': data['access_token'],
+            'refresh_token': data['refresh_token'],
+            'device_token': device_token,
+            'scope': scope,
+            'issued_at': now,
+            'expires_at': now + float(data['expires_in'])
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f'{self.path(name)}.{os.getpid()}.tmp'
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(json.dumps(token))
+        os.replace(tmp, self.path(name))
+
+        return token
+
+    def remove(self, name):
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+    @staticmethod
+    def fresh(token, margin=REFRESH_MARGIN, now=None):
+        """
+        Whether a token is known to be valid for at least `margin` more seconds
+
+        :param token
+        :param margin
+        :param now
+        :return:
+        """
+
+        now = now if now is not None else time.time()
+        return token is not None and token['expires_at'] - now > margin
+
+    def _legacy(self, name):
+        for directory in [os.path.dirname(os.path.realpath(__file__)), ROOT]:
+            path = os.path.join(directory, 'Input', f'robinhood_{name}.pickle')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                return dict(data, scope=None, issued_at=0, expires_at=0)
+
+        return None
+
+
+_store = None
+
+
+def get_store():
+    """
+    Shared store under ROOT/Input/tokens (created on first use)
+
+    :return:
+    """
+
+    global _store
+    if _store is None:
+        _store = TokenStore()
+    return _store